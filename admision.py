@@ -0,0 +1,118 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from metricas import ACTIVAS_ADMISION, COLA_ADMISION, ESPERA_ADMISION, RECHAZOS_ADMISION
+from servidor_reportes import TAMANO_POOL
+
+
+# Configuración del control de admisión de reportes (por worker)
+ADMISION_CAPACIDAD = int(os.environ.get("LUCIA_ADMISION_CAPACIDAD", str(TAMANO_POOL)))
+ADMISION_COLA = int(os.environ.get("LUCIA_ADMISION_COLA", "2"))
+ADMISION_ESPERA = float(os.environ.get("LUCIA_ADMISION_ESPERA", "15"))
+DURACION_INICIAL = 1.0
+
+
+class SobrecargaError(Exception):
+    """No hay lugar para generar otro reporte; `reintentar` son los segundos sugeridos para Retry-After."""
+
+    def __init__(self, mensaje, reintentar):
+        super().__init__(mensaje)
+        self.reintentar = reintentar
+
+
+class ControlAdmision:
+    """
+    Limita cuántos reportes se generan a la vez en el worker.
+
+    - Hasta `capacidad` generaciones en curso (por defecto, una por JVM del
+      pool) y hasta `max_cola` peticiones esperando turno.
+    - Con la cola llena, o si el turno no llega en `espera_maxima` segundos,
+      se rechaza enseguida con SobrecargaError en lugar de lanzar otra JVM
+      o de ocupar un hilo más: así quedan hilos libres para el chat.
+    - Los lotes y trabajos en segundo plano (sin_limite=True) esperan su
+      turno sin ser rechazados; ya tienen su propia concurrencia acotada.
+    - Las cuentas son por PID: cada worker de gunicorn tiene las suyas.
+    """
+
+    def __init__(self, capacidad=ADMISION_CAPACIDAD, max_cola=ADMISION_COLA, espera_maxima=ADMISION_ESPERA):
+        self.capacidad = max(1, capacidad)
+        self.max_cola = max(0, max_cola)
+        self.espera_maxima = espera_maxima
+        self.admitidas = 0
+        self.rechazadas = 0
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _inicializar(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._condicion = threading.Condition()
+            self.en_curso = 0
+            self.en_cola = 0
+            self._duracion_media = DURACION_INICIAL
+            self._pid = os.getpid()
+
+    @contextmanager
+    def turno(self, sin_limite=False):
+        """Espera un lugar para generar un reporte; lanza SobrecargaError si no lo hay."""
+        self._inicializar()
+        inicio = time.monotonic()
+        with self._condicion:
+            if self.en_curso >= self.capacidad:
+                if not sin_limite and self.en_cola >= self.max_cola:
+                    self._rechazar("cola_llena")
+                self.en_cola += 1
+                COLA_ADMISION.inc()
+                try:
+                    limite = inicio + self.espera_maxima
+                    while self.en_curso >= self.capacidad:
+                        restante = None if sin_limite else limite - time.monotonic()
+                        if restante is not None and restante <= 0:
+                            self._rechazar("espera")
+                        self._condicion.wait(restante)
+                finally:
+                    self.en_cola -= 1
+                    COLA_ADMISION.dec()
+            self.en_curso += 1
+            self.admitidas += 1
+        ACTIVAS_ADMISION.inc()
+        ESPERA_ADMISION.observe(time.monotonic() - inicio)
+
+        comienzo = time.monotonic()
+        try:
+            yield
+        finally:
+            duracion = time.monotonic() - comienzo
+            ACTIVAS_ADMISION.dec()
+            with self._condicion:
+                self.en_curso -= 1
+                self._duracion_media = 0.8 * self._duracion_media + 0.2 * duracion
+                self._condicion.notify()
+
+    def _rechazar(self, motivo):
+        # Se llama con la condición tomada
+        self.rechazadas += 1
+        RECHAZOS_ADMISION.labels(motivo).inc()
+        reintentar = max(1, math.ceil(self._duracion_media * (self.en_cola + self.en_curso) / self.capacidad))
+        raise SobrecargaError("Demasiados reportes en generación, reintente en unos segundos.", reintentar)
+
+    def estadisticas(self):
+        self._inicializar()
+        return {
+            "capacidad": self.capacidad,
+            "max_cola": self.max_cola,
+            "en_curso": self.en_curso,
+            "en_cola": self.en_cola,
+            "admitidas": self.admitidas,
+            "rechazadas": self.rechazadas,
+            "duracion_media": round(self._duracion_media, 3),
+        }
+
+
+control_admision = ControlAdmision()
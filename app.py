@@ -1,9 +1,31 @@
+import io
 import subprocess
 import sys
 import os
+import zipfile
 from flask import Flask, Response, abort, request, jsonify
 import mysql.connector
-from generar_pdf import JAVA_WORKING_DIR, ReportGenerationError, generate_and_get_pdf_path
+from admision import SobrecargaError, control_admision
+from archivo_historial import iterar_con_archivo
+from cache_conversaciones import cache_conversaciones
+from conexion_db import pool
+from datos_reporte import DatosReporteError, filas_por_celular, version_de_filas
+from directorio_trabajadores import directorio_trabajadores
+from entrega_pdf import enviar_pdf, etiqueta_reporte, respuesta_no_modificada
+from generacion_unica import generacion_unica
+from generar_pdf import JAVA_WORKING_DIR, ReportGenerationError
+from metricas import etapa, exportar, finalizar_peticion, iniciar_peticion, registrar_error_reporte
+from historial_chat import (LIMITE_STREAMING, SIN_CONVERSACIONES, CursorInvalidoError, formatear_conversaciones,
+                            iterar_recientes, obtener_pagina, obtener_recientes)
+from lotes_reportes import LoteError, cedulas_por_departamento, pdf_combinado, validar_cedulas, zip_en_streaming
+from prerenderizado import leer_estado
+from registro_conversaciones import (REGISTRO_MAX_LOTE, RegistroError, guardar_conversacion,
+                                     insertar_conversaciones, validar_registro)
+from reportes import (PeriodoSinDatosError, cache_reportes, interpretar_rango, obtener_filas, obtener_reporte,
+                      obtener_reporte_periodos, periodos_del_rango)
+from reutilizacion_respuestas import REUTILIZACION_UMBRAL, indice_respuestas
+from servicio_firma import FirmaError, firmar_lote
+from trabajos_reportes import TERMINADO, ColaLlenaError, cola_trabajos
 
 
 
@@ -11,16 +33,6 @@ app = Flask(__name__)
 
 
 
-# Configuración de la base de datos
-db_config = {
-    "host": "127.0.0.1",
-    "user": "lucia",
-    "password": "admin123",
-    "database": "lucia_database"
-}
-
-
-
 
 from flask import Response
 
@@ -32,6 +44,10 @@ def obtener_conversaciones(limit, celular):
     Parámetros en path:
     - limit (int): cantidad máxima de registros
     - celular (str): número de teléfono a filtrar
+
+    Parámetros en query:
+    - archivo=1 (opcional): si la base no tiene `limit` conversaciones, sigue
+      con el historial archivado (ver archivo_historial.py)
     
     Formato de salida:
     - "Pregunta..."
@@ -45,41 +61,67 @@ def obtener_conversaciones(limit, celular):
         if not celular.isdigit() or len(celular) < 8:
             return Response("Formato de celular inválido", status=400, mimetype='text/plain')
         
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor(dictionary=True)
-        
-        # Consulta con parámetros
-        cursor.execute("""
-            SELECT pregunta, respuesta
-            FROM historial_chat
-            WHERE celular = %s
-            ORDER BY fecha_registro DESC
-            LIMIT %s
-        """, (celular, limit))
-        
-        registros = cursor.fetchall()
-        
+        archivo = request.args.get('archivo') == '1'
+        if limit > LIMITE_STREAMING or archivo:
+            # Listas grandes (o con historial archivado): se envían por lotes sin armar todo el texto en memoria
+            lotes = iterar_con_archivo(celular, limit) if archivo else iterar_recientes(celular, limit)
+            primero = next(lotes, None)
+            if primero is None:
+                return Response(SIN_CONVERSACIONES, mimetype='text/plain')
+
+            def generar():
+                yield formatear_conversaciones(primero)
+                for lote in lotes:
+                    yield "\n\n" + formatear_conversaciones(lote)
+
+            return Response(generar(), mimetype='text/plain')
+
+        registros = cache_conversaciones.obtener(celular, limit, obtener_recientes)
+
         if not registros:
-            return Response(f"No existen conversacines anteriores.", mimetype='text/plain')
-        
-        # Formatear respuesta en el nuevo estilo
-        respuesta_texto = ""
-        for registro in registros:
-            respuesta_texto += (
-                f'- "{registro["pregunta"]}"\n'
-                f'  Respuesta: "{registro["respuesta"]}"\n\n'
-            )
-        
-        return Response(respuesta_texto.strip(), mimetype='text/plain')
-        
+            return Response(SIN_CONVERSACIONES, mimetype='text/plain')
+
+        return Response(formatear_conversaciones(registros), mimetype='text/plain')
+
     except mysql.connector.Error as err:
         return Response(f"Error de base de datos: {err}", status=500, mimetype='text/plain')
     except Exception as err:
         return Response(f"Error inesperado: {err}", status=500, mimetype='text/plain')
-    finally:
-        if 'conn' in locals() and conn.is_connected():
-            cursor.close()
-            conn.close()
+
+
+
+
+@app.route('/api/conversaciones/pagina/<int:limit>/<string:celular>', methods=['GET'])
+def obtener_conversaciones_pagina(limit, celular):
+    """
+    Variante paginada de obtener_conversaciones (paginación por cursor).
+
+    Parámetros en query:
+    - cursor (str, opcional): valor de X-Cursor-Siguiente de la página anterior
+
+    Devuelve el mismo texto plano que obtener_conversaciones y, si hay más
+    conversaciones, el cursor de la página siguiente en X-Cursor-Siguiente.
+    """
+    if limit <= 0:
+        return Response("El límite debe ser mayor a 0", status=400, mimetype='text/plain')
+
+    if not celular.isdigit() or len(celular) < 8:
+        return Response("Formato de celular inválido", status=400, mimetype='text/plain')
+
+    try:
+        registros, siguiente = obtener_pagina(celular, limit, request.args.get('cursor'))
+    except CursorInvalidoError as err:
+        return Response(str(err), status=400, mimetype='text/plain')
+    except mysql.connector.Error as err:
+        return Response(f"Error de base de datos: {err}", status=500, mimetype='text/plain')
+
+    if not registros:
+        return Response(SIN_CONVERSACIONES, mimetype='text/plain')
+
+    response = Response(formatear_conversaciones(registros), mimetype='text/plain')
+    if siguiente:
+        response.headers['X-Cursor-Siguiente'] = siguiente
+    return response
 
 
 
@@ -118,106 +160,199 @@ def registrar_conversacion():
     pregunta = data['pregunta']
     respuesta = data['respuesta']
 
-    # Conexión a la base de datos
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        
-        # Insertar registro completo
-        cursor.execute("""
-            INSERT INTO historial_chat (celular, pregunta, respuesta)
-            VALUES (%s, %s, %s)
-        """, (celular, pregunta, respuesta))
-        
-        conn.commit()
+        registro_id = guardar_conversacion(celular, pregunta, respuesta)
+        cache_conversaciones.agregar(celular, pregunta, respuesta)
+        indice_respuestas.agregar(pregunta, respuesta)
+
         return jsonify({
             "message": "Conversación registrada exitosamente",
-            "id": cursor.lastrowid
+            "id": registro_id
         }), 201
-        
+
+    except RegistroError as err:
+        return jsonify({"error": str(err)}), 503
     except mysql.connector.Error as err:
         return jsonify({"error": f"Error de base de datos: {err}"}), 500
-    finally:
-        if 'conn' in locals() and conn.is_connected():
-            cursor.close()
-            conn.close()
 
 
 
 
+@app.route('/api/conversaciones/registro/lote', methods=['POST'])
+def registrar_conversaciones_lote():
+    """
+    Registra varias conversaciones con un solo INSERT y un solo commit.
 
+    Recibe un arreglo JSON de objetos {celular, pregunta, respuesta} y
+    devuelve los ids en el mismo orden. El lote se guarda completo o no se
+    guarda (máximo LUCIA_REGISTRO_MAX_LOTE registros).
+    """
+    if not request.is_json:
+        return jsonify({"error": "Se requiere JSON"}), 400
 
+    data = request.get_json()
+    if not isinstance(data, list) or not data:
+        return jsonify({"error": "Se requiere un arreglo JSON con al menos un registro"}), 400
+    if len(data) > REGISTRO_MAX_LOTE:
+        return jsonify({"error": f"El lote supera el máximo de {REGISTRO_MAX_LOTE} registros"}), 400
 
+    for indice, registro in enumerate(data):
+        error = validar_registro(registro)
+        if error:
+            return jsonify({"error": f"Registro {indice}: {error}"}), 400
 
-def obtener_trabajador_por_celular(celular):
-    """Obtiene los datos del trabajador por número de celular."""
+    registros = [(r['celular'], r['pregunta'], r['respuesta']) for r in data]
     try:
-        conexion = mysql.connector.connect(**db_config)
-        cursor = conexion.cursor(dictionary=True) #obtiene los datos en formato de diccionario
-        consulta = """
-            SELECT cedula, nombres, apellidos, celular
-            FROM trabajador
-            WHERE celular = %s
-        """
-        cursor.execute(consulta, (celular,))
-        resultado = cursor.fetchone() #fetchone() obtiene un solo resultado
-        return resultado
-    except mysql.connector.Error as error:
-        print(f"Error al conectar a la base de datos: {error}")
-        return None
-    finally:
-        if conexion.is_connected():
-            cursor.close()
-            conexion.close()
+        ids = insertar_conversaciones(registros)
+    except mysql.connector.Error as err:
+        return jsonify({"error": f"Error de base de datos: {err}"}), 500
+
+    for celular, pregunta, respuesta in registros:
+        cache_conversaciones.agregar(celular, pregunta, respuesta)
+        indice_respuestas.agregar(pregunta, respuesta)
 
+    return jsonify({
+        "message": f"{len(ids)} conversaciones registradas exitosamente",
+        "ids": ids
+    }), 201
 
 
 
 
+@app.route('/api/conversaciones/respuesta_previa', methods=['POST'])
+def buscar_respuesta_previa():
+    """
+    Busca una respuesta ya dada a una pregunta igual o parecida.
+
+    JSON de entrada: {"pregunta": "¿Cuándo cobramos?", "umbral": 0.9}
+    (umbral opcional, entre 0 y 1; por defecto LUCIA_REUTILIZACION_UMBRAL).
+
+    Devuelve {"encontrada": true, "pregunta", "respuesta", "similitud"} o
+    {"encontrada": false}. Quien llama decide si la usa en lugar de
+    consultar al modelo.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Se requiere JSON"}), 400
+
+    data = request.get_json()
+    pregunta = data.get('pregunta') if isinstance(data, dict) else None
+    if not isinstance(pregunta, str) or not pregunta.strip():
+        return jsonify({"error": "El campo 'pregunta' es obligatorio"}), 400
+    try:
+        umbral = float(data.get('umbral', REUTILIZACION_UMBRAL))
+    except (TypeError, ValueError):
+        return jsonify({"error": "El umbral debe ser un número"}), 400
+    if not 0 < umbral <= 1:
+        return jsonify({"error": "El umbral debe estar entre 0 y 1"}), 400
+
+    with etapa("reutilizacion"):
+        encontrada = indice_respuestas.buscar(pregunta, umbral)
+    if encontrada is None:
+        return jsonify({"encontrada": False})
+    return jsonify({"encontrada": True, **encontrada})
+
+
+@app.route('/api/conversaciones/respuesta_previa/estadisticas', methods=['GET'])
+def estadisticas_respuesta_previa():
+    """Tamaño y tasa de aciertos del índice de respuestas de este worker."""
+    return jsonify(indice_respuestas.estadisticas())
+
+
+
+
+
+
+
+def obtener_trabajador_y_filas(celular):
+    """
+    Trabajador y filas de su extracto con una sola consulta.
+
+    Si el directorio conoce el celular, las filas se leen después por cédula
+    (en obtener_reporte); si no, una consulta con JOIN trae el trabajador y
+    sus filas juntos y el resultado queda en el directorio.
+    """
+    with etapa("trabajador"):
+        conocido, trabajador = directorio_trabajadores.buscar_en_memoria(celular)
+    if conocido:
+        return trabajador, None
+    try:
+        with etapa("db_filas"):
+            trabajador, filas = filas_por_celular(celular)
+    except DatosReporteError as e:
+        registrar_error_reporte("db")
+        raise ReportGenerationError(f"No se pudieron obtener los datos del reporte: {e}") from e
+    directorio_trabajadores.recordar(celular, trabajador)
+    return trabajador, filas
+
+
+@app.route('/api/trabajadores/directorio/invalidar', methods=['POST'])
+def invalidar_directorio_trabajadores():
+    """
+    Invalida el directorio celular → trabajador en todos los workers.
+
+    Con {"celular": "..."} se olvida solo ese celular; sin cuerpo se fuerza
+    la recarga completa del directorio.
+    """
+    data = request.get_json(silent=True) or {}
+    directorio_trabajadores.invalidar(data.get('celular'))
+    return jsonify({"message": "Directorio invalidado"})
+
+
+@app.route('/api/trabajadores/directorio/estadisticas', methods=['GET'])
+def estadisticas_directorio_trabajadores():
+    """Tamaño, recargas y aciertos del directorio de trabajadores de este worker."""
+    return jsonify(directorio_trabajadores.estadisticas())
+
+
+
+
+
+
+
+def respuesta_sobrecarga(error):
+    """503 inmediato con Retry-After cuando el control de admisión rechaza un reporte."""
+    response = jsonify({"error": str(error), "reintentar": error.reintentar})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.reintentar)
+    return response
 
 
 @app.route('/api/reporte/celular/<string:celular>', methods=['GET'])
 def servir_reporte_por_celular(celular):
     """Ruta API para generar y servir el reporte PDF usando número de celular."""
-    pdf_path = None 
     try:
-        # Primero obtener la cédula asociada al celular
-        trabajador = obtener_trabajador_por_celular(celular)
+        # Primero obtener la cédula asociada al celular (y, si hubo que consultarla, sus filas)
+        trabajador, filas = obtener_trabajador_y_filas(celular)
         
         if not trabajador:
             abort(404, description="No se encontró trabajador con ese número de celular")
         
         cedula = trabajador['cedula']
-        
-        # Llamar a la función que ejecuta Java y obtiene la ruta del PDF
-        pdf_path = generate_and_get_pdf_path(cedula)
+        firmado = request.args.get('firmado') == '1'
+        if filas is None:
+            filas = obtener_filas(cedula)
 
-        with open(pdf_path, 'rb') as f:
-            pdf_data = f.read()
+        # Si el cliente ya tiene esta versión de los datos, 304 sin generar nada
+        etiqueta = etiqueta_reporte(cedula, version_de_filas(filas), "firmado" if firmado else None)
+        no_modificada = respuesta_no_modificada(etiqueta)
+        if no_modificada is not None:
+            return no_modificada
 
-        if not pdf_data:
-            abort(500, description="El reporte generado está vacío.")
+        # Obtener el PDF desde la cache o generarlo con Java (?firmado=1 para la versión firmada)
+        pdf_path = obtener_reporte(cedula, firmado=firmado, filas=filas)
 
         # Usar los datos del trabajador para el nombre del archivo
         filename = f"estracto_sueldo_{trabajador['nombres']}_{trabajador['apellidos']}.pdf"
-        
-        response = Response(pdf_data, mimetype='application/pdf')
-        response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
-        return response
 
+        return enviar_pdf(pdf_path, filename, etiqueta)
+
+    except SobrecargaError as e:
+        return respuesta_sobrecarga(e)
     except ReportGenerationError as e:
         abort(500, description=f"Error al generar el reporte PDF: {e}")
     except Exception as e:
         abort(500, description=f"Error inesperado: {e}")
 
-    finally:
-        # Limpiar el archivo PDF temporal si existe
-        if pdf_path and os.path.exists(pdf_path):
-            try:
-                os.remove(pdf_path)
-            except OSError:
-                pass
-
 
 
 
@@ -226,34 +361,296 @@ def servir_reporte_por_celular(celular):
 
 @app.route('/api/reporte/<int:cedula>', methods=['GET'])
 def servir_reporte_api(cedula):
-    """Ruta API para generar y servir el reporte PDF."""
-    pdf_path = None 
+    """
+    Ruta API para generar y servir el reporte PDF.
+
+    Con ?desde=AAAA-MM&hasta=AAAA-MM devuelve solo esos períodos en un
+    documento armado con las partes mensuales de la cache.
+    """
+    firmado = request.args.get('firmado') == '1'
+    desde, hasta = request.args.get('desde'), request.args.get('hasta')
     try:
-        # Llamar a la función que ejecuta Java y obtiene la ruta del PDF
-        pdf_path = generate_and_get_pdf_path(cedula)
+        if desde or hasta:
+            try:
+                inicio, fin = interpretar_rango(desde, hasta)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+        filas = obtener_filas(cedula)
+        if desde or hasta:
+            clave, version, _ = periodos_del_rango(cedula, filas, inicio, fin)
+        else:
+            clave, version = cedula, version_de_filas(filas)
+
+        # Si el cliente ya tiene esta versión de los datos, 304 sin generar nada
+        etiqueta = etiqueta_reporte(clave, version, "firmado" if firmado else None)
+        no_modificada = respuesta_no_modificada(etiqueta)
+        if no_modificada is not None:
+            return no_modificada
+
+        if desde or hasta:
+            pdf_path = obtener_reporte_periodos(cedula, inicio, fin, firmado=firmado, filas=filas)
+            return enviar_pdf(pdf_path, f"estracto_sueldo_{cedula}_{inicio}_{fin}.pdf", etiqueta)
+
+        # Obtener el PDF desde la cache o generarlo con Java (?firmado=1 para la versión firmada)
+        pdf_path = obtener_reporte(cedula, firmado=firmado, filas=filas)
+
+        return enviar_pdf(pdf_path, f"estracto_sueldo_{cedula}.pdf", etiqueta)
+
+    except PeriodoSinDatosError as e:
+        return jsonify({"error": str(e)}), 404
+    except SobrecargaError as e:
+        return respuesta_sobrecarga(e)
+    except ReportGenerationError as e:
+        abort(500, description=f"Error al generar el reporte PDF: {e}")
+    except Exception as e:
+        abort(500, description=f"Error inesperado: {e}")
 
-        with open(pdf_path, 'rb') as f:
-            pdf_data = f.read()
 
-        if not pdf_data:
-            abort(500, description="El reporte generado está vacío.")
 
-        response = Response(pdf_data, mimetype='application/pdf')
-        response.headers['Content-Disposition'] = f'inline; filename="estracto_sueldo_{cedula}.pdf"'
+
+
+
+@app.route('/api/reporte/lote', methods=['POST'])
+def servir_reporte_lote():
+    """
+    Genera los extractos de varias cédulas en paralelo.
+
+    JSON de entrada, con una lista de cédulas o un filtro por departamento:
+    {"cedulas": [1234567, 2345678], "formato": "zip"}
+    {"cdpto": 12, "cinsti": 3, "formato": "pdf"}
+
+    - formato "zip" (por defecto): un PDF por cédula, enviado en streaming.
+      Con "firmado": true cada PDF va firmado digitalmente.
+    - formato "pdf": un único PDF con todos los extractos en orden.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Se requiere JSON"}), 400
+
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Se requiere un objeto JSON"}), 400
+    formato = data.get('formato', 'zip')
+    if formato not in ('zip', 'pdf'):
+        return jsonify({"error": "El formato debe ser 'zip' o 'pdf'"}), 400
+
+    try:
+        if 'cedulas' in data:
+            cedulas = data['cedulas']
+            if not isinstance(cedulas, list) or not all(
+                isinstance(cedula, int) and not isinstance(cedula, bool) for cedula in cedulas
+            ):
+                return jsonify({"error": "'cedulas' debe ser una lista de números enteros"}), 400
+            cedulas = list(dict.fromkeys(cedulas))
+        elif 'cdpto' in data:
+            cedulas = cedulas_por_departamento(int(data['cdpto']), data.get('cinsti'))
+        else:
+            return jsonify({"error": "Se requiere 'cedulas' o 'cdpto'"}), 400
+        validar_cedulas(cedulas, formato)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Las cédulas y el departamento deben ser numéricos"}), 400
+    except LoteError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if formato == 'zip':
+        response = Response(zip_en_streaming(cedulas, bool(data.get('firmado'))), mimetype='application/zip')
+        response.headers['Content-Disposition'] = 'attachment; filename="estractos_sueldo.zip"'
         return response
 
+    try:
+        pdf_data, errores = pdf_combinado(cedulas)
+    except LoteError as e:
+        return jsonify({"error": str(e)}), 500
+
+    response = Response(pdf_data, mimetype='application/pdf')
+    response.headers['Content-Disposition'] = 'inline; filename="estractos_sueldo.pdf"'
+    if errores:
+        response.headers['X-Reportes-Fallidos'] = str(len(errores))
+    return response
+
+
+
+
+
+
+@app.route('/api/firma/lote', methods=['POST'])
+def firmar_documentos_lote():
+    """
+    Firma digitalmente varios PDFs en una sola petición.
+
+    Requiere multipart/form-data con uno o más archivos en el campo 'archivos'.
+    Devuelve un ZIP con los PDFs firmados, con los mismos nombres.
+    """
+    archivos = request.files.getlist('archivos')
+    if not archivos:
+        return jsonify({"error": "Se requiere al menos un archivo en el campo 'archivos'"}), 400
+
+    nombres = [archivo.filename or f"documento_{i}.pdf" for i, archivo in enumerate(archivos, start=1)]
+    try:
+        firmados = firmar_lote([archivo.read() for archivo in archivos])
+    except FirmaError as e:
+        return jsonify({"error": str(e)}), 500
+
+    salida = io.BytesIO()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED) as archivo_zip:
+        for nombre, pdf_data in zip(nombres, firmados):
+            archivo_zip.writestr(os.path.basename(nombre), pdf_data)
+
+    response = Response(salida.getvalue(), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename="documentos_firmados.zip"'
+    return response
+
+
+
+
+
+
+@app.route('/api/reporte/trabajos', methods=['POST'])
+def crear_trabajo_reporte():
+    """
+    Encola la generación de un reporte y responde de inmediato con el id del trabajo.
+
+    Ejemplo de JSON:
+    {"cedula": 1234567}
+    """
+    if not request.is_json:
+        return jsonify({"error": "Se requiere JSON"}), 400
+
+    data = request.get_json()
+    try:
+        cedula = int(data['cedula'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "El campo 'cedula' es obligatorio y numérico"}), 400
+
+    try:
+        trabajo_id = cola_trabajos.encolar(cedula)
+    except ColaLlenaError as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    return jsonify({
+        "id": trabajo_id,
+        "estado": "pendiente",
+        "url_estado": f"/api/reporte/trabajos/{trabajo_id}",
+        "url_descarga": f"/api/reporte/trabajos/{trabajo_id}/descarga"
+    }), 202
+
+
+
+
+@app.route('/api/reporte/trabajos/<string:trabajo_id>', methods=['GET'])
+def estado_trabajo_reporte(trabajo_id):
+    """Estado de un trabajo: pendiente (con posición en la cola), en_proceso, terminado o error."""
+    trabajo = cola_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo inexistente"}), 404
+
+    respuesta = {
+        "id": trabajo['id'],
+        "cedula": trabajo['cedula'],
+        "estado": trabajo['estado'],
+    }
+    if 'posicion' in trabajo:
+        respuesta['posicion'] = trabajo['posicion']
+    if trabajo['error']:
+        respuesta['error'] = trabajo['error']
+    if trabajo['estado'] == TERMINADO:
+        respuesta['url_descarga'] = f"/api/reporte/trabajos/{trabajo_id}/descarga"
+    return jsonify(respuesta)
+
+
+
+
+@app.route('/api/reporte/trabajos/<string:trabajo_id>/descarga', methods=['GET'])
+def descargar_trabajo_reporte(trabajo_id):
+    """Descarga el PDF de un trabajo terminado."""
+    trabajo = cola_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo inexistente"}), 404
+    if trabajo['estado'] != TERMINADO:
+        return jsonify({"error": f"El trabajo está en estado {trabajo['estado']}"}), 409
+
+    try:
+        pdf_path = trabajo['ruta']
+        if not pdf_path or not os.path.exists(pdf_path):
+            # La cache pudo desalojar el archivo; se vuelve a obtener por la misma vía
+            pdf_path = obtener_reporte(trabajo['cedula'])
+    except SobrecargaError as e:
+        return respuesta_sobrecarga(e)
     except ReportGenerationError as e:
         abort(500, description=f"Error al generar el reporte PDF: {e}")
-    except Exception as e:
-        abort(500, description=f"Error inesperado: {e}")
 
-    finally:
-        # Limpiar el archivo PDF temporal si existe
-        if pdf_path and os.path.exists(pdf_path):
-            try:
-                os.remove(pdf_path)
-            except OSError:
-                pass
+    return enviar_pdf(pdf_path, f"estracto_sueldo_{trabajo['cedula']}.pdf")
+
+
+
+
+
+
+@app.route('/api/reporte/cache/estadisticas', methods=['GET'])
+def estadisticas_cache_reportes():
+    """Aciertos, fallos y ocupación de la cache de reportes de este worker."""
+    estadisticas = cache_reportes.estadisticas()
+    estadisticas["coalescencia"] = generacion_unica.estadisticas()
+    estadisticas["admision"] = control_admision.estadisticas()
+    return jsonify(estadisticas)
+
+
+
+
+
+
+@app.route('/api/reporte/prerenderizado/estado', methods=['GET'])
+def estado_prerenderizado():
+    """Avance del pre-renderizado del último período (ver prerenderizado.py)."""
+    estado = leer_estado()
+    if estado is None:
+        return jsonify({"error": "Todavía no se ejecutó el pre-renderizado"}), 404
+    return jsonify(estado)
+
+
+
+
+
+
+@app.route('/api/conversaciones/cache/estadisticas', methods=['GET'])
+def estadisticas_cache_conversaciones():
+    """Aciertos y fallos de la cache de conversaciones recientes de este worker."""
+    return jsonify(cache_conversaciones.estadisticas())
+
+
+
+
+
+
+@app.before_request
+def medir_inicio_peticion():
+    iniciar_peticion()
+
+
+@app.after_request
+def medir_fin_peticion(response):
+    """Histograma por ruta y cabecera Server-Timing con las etapas del reporte."""
+    ruta = request.url_rule.rule if request.url_rule else None
+    return finalizar_peticion(response, ruta, request.method)
+
+
+@app.route('/metrics', methods=['GET'])
+def metricas_prometheus():
+    """Métricas de Prometheus sumadas entre todos los workers de gunicorn."""
+    datos, tipo = exportar()
+    return Response(datos, mimetype=tipo)
+
+
+
+
+
+
+@app.route('/api/estado/pool', methods=['GET'])
+def estadisticas_pool_db():
+    """Conexiones en uso y tiempos de espera del pool MySQL de este worker."""
+    return jsonify(pool.estadisticas())
 
 
 
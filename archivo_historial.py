@@ -0,0 +1,372 @@
+"""
+Retención de historial_chat: particiones mensuales y archivo comprimido.
+
+historial_chat está particionada por mes de fecha_registro (migración
+0002, que se aplica a mano en una ventana de mantenimiento con
+`python3 migraciones.py --mantenimiento` y ya crea las particiones de los
+meses con datos). Mientras no se aplique, este proceso no hace nada. Pensado
+para un timer diario de systemd:
+
+1. Crea por adelantado las particiones de los próximos meses dividiendo
+   p_futuro, que está vacía, así que es inmediato. Si p_futuro tiene filas
+   (el timer no corrió en meses), dividirla las copia y bloquea las
+   escrituras: solo se hace con --mantenimiento.
+2. Exporta cada partición más vieja que LUCIA_HISTORIAL_RETENCION_MESES a
+   datos/archivo_historial/historial_chat_AAAAMM.ndjson.gz, verifica la
+   cantidad de filas y recién entonces la borra con DROP PARTITION.
+
+El archivo tiene un miembro gzip por celular (concatenados, sigue siendo un
+.gz válido) y un índice JSON con la posición de cada uno, así leer la
+historia de un celular no descomprime el mes entero.
+
+    python archivo_historial.py                # particiones + archivo
+    python archivo_historial.py --meses 6      # retener solo 6 meses en la base
+    python archivo_historial.py --estado       # particiones y meses archivados
+    python archivo_historial.py --mantenimiento  # dividir p_futuro aunque tenga filas
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import sys
+from datetime import date
+from functools import lru_cache
+
+import mysql.connector
+
+from conexion_db import conectar
+from historial_chat import TAMANO_LOTE, iterar_recientes
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Configuración de la retención del historial
+ARCHIVO_DIR = os.environ.get("LUCIA_HISTORIAL_ARCHIVO_DIR", os.path.join(BASE_DIR, "datos", "archivo_historial"))
+HISTORIAL_RETENCION_MESES = int(os.environ.get("LUCIA_HISTORIAL_RETENCION_MESES", "12"))
+PARTICIONES_ADELANTE = 3
+
+PARTICION_FUTURO = "p_futuro"
+_PARTICION_MENSUAL = re.compile(r"p(\d{4})(\d{2})")
+
+
+class ArchivoError(Exception):
+    pass
+
+
+def _sumar_meses(mes, cantidad):
+    anio, numero = mes
+    total = anio * 12 + numero - 1 + cantidad
+    return total // 12, total % 12 + 1
+
+
+def _nombre_particion(mes):
+    return f"p{mes[0]}{mes[1]:02d}"
+
+
+def _ruta_datos(mes):
+    return os.path.join(ARCHIVO_DIR, f"historial_chat_{mes[0]}{mes[1]:02d}.ndjson.gz")
+
+
+def _ruta_indice(mes):
+    return os.path.join(ARCHIVO_DIR, f"historial_chat_{mes[0]}{mes[1]:02d}.indice.json")
+
+
+def particiones(cursor):
+    """Particiones de historial_chat en orden, como [(nombre, filas aproximadas)]."""
+    cursor.execute("""
+        SELECT PARTITION_NAME, TABLE_ROWS
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'historial_chat'
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    return [(nombre, filas) for nombre, filas in cursor.fetchall()]
+
+
+def particionada(cursor):
+    return PARTICION_FUTURO in (nombre for nombre, _ in particiones(cursor))
+
+
+def _meses_particionados(cursor):
+    nombres = [nombre for nombre, _ in particiones(cursor)]
+    if PARTICION_FUTURO not in nombres:
+        raise ArchivoError("historial_chat no está particionada; aplicar en una ventana de mantenimiento: "
+                           "python3 migraciones.py --mantenimiento")
+    return [(int(m.group(1)), int(m.group(2))) for m in map(_PARTICION_MENSUAL.fullmatch, nombres) if m]
+
+
+def _definiciones(desde, hasta):
+    """Una partición por mes de `desde` a `hasta` inclusive, más p_futuro."""
+    definiciones = []
+    mes = desde
+    while mes <= hasta:
+        siguiente = _sumar_meses(mes, 1)
+        definiciones.append(
+            f"PARTITION {_nombre_particion(mes)} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{siguiente[0]}-{siguiente[1]:02d}-01 00:00:00'))"
+        )
+        mes = siguiente
+    definiciones.append(f"PARTITION {PARTICION_FUTURO} VALUES LESS THAN MAXVALUE")
+    return definiciones
+
+
+def _primer_mes(cursor, hoy):
+    cursor.execute("SELECT MIN(fecha_registro) FROM historial_chat")
+    minimo = cursor.fetchall()[0][0]
+    return (minimo.year, minimo.month) if minimo else (hoy.year, hoy.month)
+
+
+def particionado_inicial(cursor, hoy=None):
+    """
+    Cláusula PARTITION BY de la migración 0002: un mes por partición desde la
+    conversación más vieja hasta PARTICIONES_ADELANTE meses después del actual.
+    """
+    hoy = hoy or date.today()
+    hasta = _sumar_meses((hoy.year, hoy.month), PARTICIONES_ADELANTE)
+    definiciones = _definiciones(_primer_mes(cursor, hoy), hasta)
+    return f"PARTITION BY RANGE (UNIX_TIMESTAMP(fecha_registro)) ({', '.join(definiciones)})"
+
+
+def asegurar_particiones(conn, hoy=None, copiar=False):
+    """
+    Crea las particiones mensuales que falten hasta PARTICIONES_ADELANTE meses
+    después del actual. Con p_futuro vacía no copia filas; si tiene, solo
+    divide con copiar=True (ventana de mantenimiento).
+    """
+    hoy = hoy or date.today()
+    cursor = conn.cursor(buffered=True)
+    meses = _meses_particionados(cursor)
+    desde = _sumar_meses(meses[-1], 1) if meses else _primer_mes(cursor, hoy)
+    hasta = _sumar_meses((hoy.year, hoy.month), PARTICIONES_ADELANTE)
+
+    nuevas = []
+    if desde <= hasta:
+        if not copiar:
+            cursor.execute(f"SELECT 1 FROM historial_chat PARTITION ({PARTICION_FUTURO}) LIMIT 1")
+            if cursor.fetchall():
+                cursor.close()
+                raise ArchivoError(
+                    f"{PARTICION_FUTURO} tiene conversaciones: dividirla copia esas filas y bloquea "
+                    "las escrituras; hacerlo en una ventana de mantenimiento con: "
+                    "python3 archivo_historial.py --solo-particiones --mantenimiento"
+                )
+        definiciones = _definiciones(desde, hasta)
+        cursor.execute(
+            f"ALTER TABLE historial_chat REORGANIZE PARTITION {PARTICION_FUTURO} INTO ({', '.join(definiciones)})"
+        )
+        nuevas = [definicion.split()[1] for definicion in definiciones[:-1]]
+    cursor.close()
+    return nuevas
+
+
+def archivar(conn, meses_retencion=HISTORIAL_RETENCION_MESES, hoy=None):
+    """
+    Exporta y borra las particiones anteriores a los últimos `meses_retencion` meses.
+
+    Devuelve [(particion, filas)]. Una partición solo se borra si el archivo
+    (y su índice) quedaron escritos con la misma cantidad de filas que tiene
+    en la base; si un archivo ya existía de una ejecución interrumpida, se
+    reutiliza cuando coincide.
+    """
+    if meses_retencion < 1:
+        raise ArchivoError("La retención debe ser de al menos un mes")
+    hoy = hoy or date.today()
+    corte = _sumar_meses((hoy.year, hoy.month), -(meses_retencion - 1))
+
+    cursor = conn.cursor(buffered=True)
+    vencidos = [mes for mes in _meses_particionados(cursor) if mes < corte]
+    os.makedirs(ARCHIVO_DIR, exist_ok=True)
+    archivadas = []
+    for mes in vencidos:
+        nombre = _nombre_particion(mes)
+        cursor.execute(f"SELECT COUNT(*) FROM historial_chat PARTITION ({nombre})")
+        esperadas = cursor.fetchone()[0]
+
+        indice = {"filas": 0} if esperadas == 0 else _leer_indice(mes)
+        if indice is None or indice["filas"] != esperadas:
+            indice = _exportar(conn, mes)
+        if indice["filas"] != esperadas:
+            raise ArchivoError(f"{nombre}: se exportaron {indice['filas']} filas de {esperadas}; no se borra")
+
+        cursor.execute(f"ALTER TABLE historial_chat DROP PARTITION {nombre}")
+        archivadas.append((nombre, esperadas))
+        destino = _ruta_datos(mes) if esperadas else "(vacía)"
+        print(f"📦 {nombre}: {esperadas} conversaciones archivadas {destino}", flush=True)
+    cursor.close()
+    return archivadas
+
+
+def _exportar(conn, mes):
+    """Escribe la partición en NDJSON comprimido, un miembro gzip por celular, y su índice."""
+    nombre = _nombre_particion(mes)
+    ruta, ruta_indice = _ruta_datos(mes), _ruta_indice(mes)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    celulares = {}
+    filas = 0
+
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT id, celular, pregunta, respuesta, fecha_registro
+        FROM historial_chat PARTITION ({nombre})
+        ORDER BY celular, fecha_registro DESC, id DESC
+    """)
+    with open(temporal, "wb") as f:
+        actual, lineas = None, []
+
+        def volcar():
+            nonlocal filas
+            if not lineas:
+                return
+            inicio = f.tell()
+            f.write(gzip.compress(("\n".join(lineas) + "\n").encode("utf-8")))
+            celulares[actual] = [inicio, f.tell() - inicio]
+            filas += len(lineas)
+            lineas.clear()
+
+        while True:
+            lote = cursor.fetchmany(TAMANO_LOTE)
+            if not lote:
+                break
+            for registro in lote:
+                if registro["celular"] != actual:
+                    volcar()
+                    actual = registro["celular"]
+                registro["fecha_registro"] = registro["fecha_registro"].isoformat()
+                lineas.append(json.dumps(registro, ensure_ascii=False))
+        volcar()
+        f.flush()
+        os.fsync(f.fileno())
+    cursor.close()
+
+    # Primero los datos y después el índice: un índice presente implica archivo completo
+    os.replace(temporal, ruta)
+    indice = {"particion": nombre, "filas": filas, "celulares": celulares}
+    temporal = f"{ruta_indice}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(indice, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta_indice)
+    return indice
+
+
+def _leer_indice(mes):
+    try:
+        with open(_ruta_indice(mes), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def meses_archivados():
+    """Meses con archivo completo (datos e índice), del más nuevo al más viejo."""
+    meses = []
+    for ruta in glob.glob(os.path.join(ARCHIVO_DIR, "historial_chat_*.indice.json")):
+        coincidencia = re.search(r"historial_chat_(\d{4})(\d{2})\.indice\.json$", ruta)
+        if coincidencia:
+            meses.append((int(coincidencia.group(1)), int(coincidencia.group(2))))
+    return sorted(meses, reverse=True)
+
+
+@lru_cache(maxsize=24)
+def _celulares_del_mes(mes, modificado):
+    # `modificado` forma parte de la clave: si el archivo se rehace, se vuelve a leer
+    indice = _leer_indice(mes)
+    return indice["celulares"] if indice else {}
+
+
+def iterar_archivo(celular, limit):
+    """Conversaciones archivadas del celular, de la más nueva a la más vieja, por mes."""
+    restantes = limit
+    for mes in meses_archivados():
+        if restantes <= 0:
+            return
+        try:
+            tramo = _celulares_del_mes(mes, os.path.getmtime(_ruta_indice(mes))).get(celular)
+        except FileNotFoundError:
+            continue
+        if not tramo:
+            continue
+        inicio, largo = tramo
+        with open(_ruta_datos(mes), "rb") as f:
+            f.seek(inicio)
+            contenido = gzip.decompress(f.read(largo))
+        registros = [json.loads(linea) for linea in contenido.splitlines()[:restantes]]
+        restantes -= len(registros)
+        yield registros
+
+
+def iterar_con_archivo(celular, limit):
+    """Como iterar_recientes, y si la base no alcanza para `limit`, sigue con el archivo."""
+    restantes = limit
+    for lote in iterar_recientes(celular, limit):
+        restantes -= len(lote)
+        yield lote
+    if restantes > 0:
+        yield from iterar_archivo(celular, restantes)
+
+
+def mostrar_estado():
+    conn = conectar()
+    try:
+        cursor = conn.cursor(buffered=True)
+        for nombre, filas in particiones(cursor):
+            print(f"{nombre}: ~{filas} filas")
+        cursor.close()
+    finally:
+        conn.close()
+    for mes in meses_archivados():
+        indice = _leer_indice(mes) or {}
+        print(f"archivado {mes[0]}-{mes[1]:02d}: {indice.get('filas', '?')} filas, "
+              f"{len(indice.get('celulares', {}))} celulares, "
+              f"{os.path.getsize(_ruta_datos(mes)) // 1024} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Particiona y archiva el historial de conversaciones.")
+    parser.add_argument("--meses", type=int, default=HISTORIAL_RETENCION_MESES,
+                        help="Meses que se conservan en la base (incluye el actual)")
+    parser.add_argument("--solo-particiones", action="store_true", help="Solo crea las particiones futuras")
+    parser.add_argument("--estado", action="store_true", help="Muestra particiones y meses archivados")
+    parser.add_argument("--mantenimiento", action="store_true",
+                        help="Divide p_futuro aunque tenga filas (copia y bloquea escrituras)")
+    args = parser.parse_args()
+
+    try:
+        if args.estado:
+            mostrar_estado()
+            return
+
+        conn = conectar()
+        cursor = conn.cursor(buffered=True)
+        try:
+            # Una sola ejecución a la vez, como las migraciones
+            cursor.execute("SELECT GET_LOCK('lucia_archivo_historial', 0)")
+            if cursor.fetchone()[0] != 1:
+                print("Ya hay un archivado del historial en curso.")
+                return
+            if not particionada(cursor):
+                # El timer se instala antes de que se aplique la migración 0002
+                print("ℹ️ historial_chat todavía no está particionada; nada que hacer hasta aplicar "
+                      "en una ventana de mantenimiento: python3 migraciones.py --mantenimiento")
+                return
+            nuevas = asegurar_particiones(conn, copiar=args.mantenimiento)
+            if nuevas:
+                print(f"🗂️ Particiones creadas: {', '.join(nuevas)}")
+            if not args.solo_particiones:
+                archivadas = archivar(conn, args.meses)
+                print(f"✅ {len(archivadas)} particiones archivadas." if archivadas else "✅ Nada que archivar.")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('lucia_archivo_historial')")
+            cursor.fetchall()
+            cursor.close()
+            conn.close()
+    except (mysql.connector.Error, ArchivoError) as err:
+        print(f"❌ {err}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
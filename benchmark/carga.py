@@ -0,0 +1,360 @@
+"""
+Prueba de carga de las rutas de app.py.
+
+Ejecuta cada escenario durante `--duracion` segundos con `--concurrencia`
+clientes y guarda en JSON latencias p50/p95/p99, throughput, códigos de
+respuesta y el pico de memoria (VmHWM) de gunicorn y sus hijos (JVM incluidas).
+
+Con --iniciar levanta gunicorn con la configuración indicada; si no, mide un
+servidor ya levantado en --url (pasar --pid para medir su memoria).
+
+Ejemplos:
+
+    LUCIA_DB_NAME=lucia_benchmark python benchmark/sembrar_datos.py --reiniciar
+    LUCIA_DB_NAME=lucia_benchmark python benchmark/carga.py --iniciar --java falso
+    LUCIA_DB_NAME=lucia_benchmark python benchmark/carga.py --iniciar --java real --modo servidor
+    python benchmark/comparar.py benchmark/resultados/antes.json benchmark/resultados/despues.json
+
+Con --java real se usa GenerarReporte/ServidorReportes del jar, que se conecta
+con su propia configuración (MySqlConnection): la base sembrada debe ser la
+que usa el jar.
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from sembrar_datos import cedula, celular
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.join(BASE_DIR, "benchmark")
+RESULTADOS_DIR = os.path.join(BENCHMARK_DIR, "resultados")
+DOCUMENTO_PDF = os.path.join(BASE_DIR, "documento.pdf")
+TIMEOUT_PETICION = 300
+
+
+class Escenarios:
+    """Una petición (o secuencia de peticiones) por método; devuelve (estado, bytes recibidos)."""
+
+    def __init__(self, url, indices):
+        self.url = url.rstrip("/")
+        self.indices = indices
+        with open(DOCUMENTO_PDF, "rb") as archivo:
+            self.documento = archivo.read()
+
+    def _indice(self, azar):
+        return azar.randrange(self.indices)
+
+    def _get(self, sesion, ruta):
+        respuesta = sesion.get(self.url + ruta, timeout=TIMEOUT_PETICION)
+        return respuesta.status_code, len(respuesta.content)
+
+    def _post(self, sesion, ruta, **kwargs):
+        respuesta = sesion.post(self.url + ruta, timeout=TIMEOUT_PETICION, **kwargs)
+        return respuesta.status_code, len(respuesta.content)
+
+    def conversaciones_obtener(self, sesion, azar):
+        return self._get(sesion, f"/api/conversaciones/obtener/10/{celular(self._indice(azar))}")
+
+    def conversaciones_pagina(self, sesion, azar):
+        return self._get(sesion, f"/api/conversaciones/pagina/20/{celular(self._indice(azar))}")
+
+    def conversaciones_registro(self, sesion, azar):
+        return self._post(sesion, "/api/conversaciones/registro", json={
+            "celular": celular(self._indice(azar)),
+            "pregunta": "¿Cuándo cobro el aguinaldo?",
+            "respuesta": "El aguinaldo se paga en diciembre.",
+        })
+
+    def conversaciones_registro_lote(self, sesion, azar):
+        return self._post(sesion, "/api/conversaciones/registro/lote", json=[
+            {"celular": celular(self._indice(azar)), "pregunta": f"Pregunta {n}", "respuesta": f"Respuesta {n}"}
+            for n in range(50)
+        ])
+
+    def reporte_cedula(self, sesion, azar):
+        return self._get(sesion, f"/api/reporte/{cedula(self._indice(azar))}")
+
+    def reporte_cedula_firmado(self, sesion, azar):
+        return self._get(sesion, f"/api/reporte/{cedula(self._indice(azar))}?firmado=1")
+
+    def reporte_celular(self, sesion, azar):
+        return self._get(sesion, f"/api/reporte/celular/{celular(self._indice(azar))}")
+
+    def reporte_lote_zip(self, sesion, azar):
+        cedulas = [cedula(self._indice(azar)) for _ in range(10)]
+        return self._post(sesion, "/api/reporte/lote", json={"cedulas": cedulas, "formato": "zip"})
+
+    def reporte_lote_pdf(self, sesion, azar):
+        cedulas = [cedula(self._indice(azar)) for _ in range(10)]
+        return self._post(sesion, "/api/reporte/lote", json={"cedulas": cedulas, "formato": "pdf"})
+
+    def firma_lote(self, sesion, azar):
+        archivos = [("archivos", (f"documento_{n}.pdf", self.documento, "application/pdf")) for n in range(5)]
+        return self._post(sesion, "/api/firma/lote", files=archivos)
+
+    def reporte_trabajo(self, sesion, azar):
+        """Encola, consulta el estado hasta que termina y descarga."""
+        respuesta = sesion.post(self.url + "/api/reporte/trabajos", json={"cedula": cedula(self._indice(azar))},
+                                timeout=TIMEOUT_PETICION)
+        if respuesta.status_code != 202:
+            return respuesta.status_code, len(respuesta.content)
+        trabajo = respuesta.json()
+        limite = time.monotonic() + TIMEOUT_PETICION
+        while time.monotonic() < limite:
+            estado = sesion.get(self.url + trabajo["url_estado"], timeout=TIMEOUT_PETICION).json()
+            if estado.get("estado") in ("terminado", "error"):
+                break
+            time.sleep(0.05)
+        return self._get(sesion, trabajo["url_descarga"])
+
+    def estadisticas(self, sesion, azar):
+        ruta = azar.choice([
+            "/test",
+            "/api/estado/pool",
+            "/api/reporte/cache/estadisticas",
+            "/api/conversaciones/cache/estadisticas",
+            "/api/trabajadores/directorio/estadisticas",
+        ])
+        return self._get(sesion, ruta)
+
+
+ESCENARIOS = [
+    "conversaciones_obtener",
+    "conversaciones_pagina",
+    "conversaciones_registro",
+    "conversaciones_registro_lote",
+    "reporte_celular",
+    "reporte_cedula",
+    "reporte_cedula_firmado",
+    "reporte_lote_zip",
+    "reporte_lote_pdf",
+    "firma_lote",
+    "reporte_trabajo",
+    "estadisticas",
+]
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista ordenada."""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+
+def ejecutar_escenario(escenarios, nombre, concurrencia, duracion, semilla):
+    funcion = getattr(escenarios, nombre)
+    fin = time.monotonic() + duracion
+    local = threading.local()
+    lock = threading.Lock()
+    latencias, estados = [], Counter()
+    total_bytes = 0
+
+    def cliente(numero):
+        nonlocal total_bytes
+        local.sesion = requests.Session()
+        azar = random.Random(semilla * 1000 + numero)
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            try:
+                estado, recibidos = funcion(local.sesion, azar)
+            except requests.RequestException as e:
+                estado, recibidos = type(e).__name__, 0
+            transcurrido = (time.perf_counter() - inicio) * 1000
+            with lock:
+                latencias.append(transcurrido)
+                estados[str(estado)] += 1
+                total_bytes += recibidos
+        local.sesion.close()
+
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        list(executor.map(cliente, range(concurrencia)))
+    segundos = time.monotonic() - inicio
+
+    latencias.sort()
+    errores = sum(cantidad for estado, cantidad in estados.items() if not estado.startswith(("2", "3")))
+    return {
+        "peticiones": len(latencias),
+        "errores": errores,
+        "estados": dict(estados),
+        "segundos": round(segundos, 3),
+        "peticiones_por_segundo": round(len(latencias) / segundos, 2) if segundos else 0.0,
+        "bytes_por_segundo": round(total_bytes / segundos) if segundos else 0,
+        "p50_ms": _redondear(percentil(latencias, 50)),
+        "p95_ms": _redondear(percentil(latencias, 95)),
+        "p99_ms": _redondear(percentil(latencias, 99)),
+        "max_ms": _redondear(latencias[-1] if latencias else None),
+        "media_ms": _redondear(sum(latencias) / len(latencias) if latencias else None),
+    }
+
+
+def _redondear(valor):
+    return round(valor, 2) if valor is not None else None
+
+
+def _descendientes(pid):
+    pids = [pid]
+    pendientes = [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            tareas = os.listdir(f"/proc/{actual}/task")
+        except OSError:
+            continue
+        for tarea in tareas:
+            try:
+                with open(f"/proc/{actual}/task/{tarea}/children") as archivo:
+                    hijos = [int(hijo) for hijo in archivo.read().split()]
+            except OSError:
+                continue
+            pids.extend(hijos)
+            pendientes.extend(hijos)
+    return pids
+
+
+def memoria_pico(pid):
+    """VmHWM (pico de RSS) del proceso y de todos sus descendientes, en MB."""
+    procesos = {}
+    for actual in _descendientes(pid):
+        try:
+            with open(f"/proc/{actual}/status") as archivo:
+                campos = dict(linea.split(":", 1) for linea in archivo if ":" in linea)
+        except OSError:
+            continue
+        if "VmHWM" in campos:
+            procesos[str(actual)] = {
+                "nombre": campos.get("Name", "").strip(),
+                "pico_mb": round(int(campos["VmHWM"].split()[0]) / 1024, 1),
+            }
+    return {
+        "procesos": procesos,
+        "total_pico_mb": round(sum(proceso["pico_mb"] for proceso in procesos.values()), 1),
+    }
+
+
+def iniciar_servidor(args):
+    entorno = dict(os.environ)
+    entorno["LUCIA_MODO_REPORTE"] = args.modo
+    if args.java == "falso":
+        entorno["LUCIA_JAVA_BIN"] = os.path.join(BENCHMARK_DIR, "java_falso.py")
+    comando = [
+        sys.executable, "-m", "gunicorn", "wsgi:app",
+        "--bind", f"127.0.0.1:{args.puerto}",
+        "--workers", str(args.workers),
+        "--threads", str(args.hilos),
+        "--timeout", "300",
+        "--log-level", "warning",
+    ]
+    proceso = subprocess.Popen(comando, cwd=BASE_DIR, env=entorno)
+    url = f"http://127.0.0.1:{args.puerto}"
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            sys.exit(f"gunicorn terminó al iniciar (código {proceso.returncode})")
+        try:
+            requests.get(url + "/test", timeout=1)
+            return proceso, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proceso.terminate()
+    sys.exit("gunicorn no respondió en 30 segundos")
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de las rutas de app.py.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--pid", type=int, help="PID del gunicorn a medir (si no se usa --iniciar)")
+    parser.add_argument("--iniciar", action="store_true", help="Levanta gunicorn para la prueba")
+    parser.add_argument("--java", choices=["falso", "real"], default="falso")
+    parser.add_argument("--modo", choices=["nativo", "servidor", "subprocess"], default="servidor")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--hilos", type=int, default=4)
+    parser.add_argument("--puerto", type=int, default=5055)
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--duracion", type=float, default=20, help="Segundos por escenario")
+    parser.add_argument("--calentamiento", type=float, default=3, help="Segundos de calentamiento por escenario")
+    parser.add_argument("--trabajadores", type=int, default=2000,
+                        help="Cédulas/celulares distintos a usar (los primeros N sembrados)")
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS))
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--salida", help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    nombres = [nombre.strip() for nombre in args.escenarios.split(",") if nombre.strip()]
+    desconocidos = [nombre for nombre in nombres if nombre not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+
+    servidor = None
+    url, pid = args.url, args.pid
+    if args.iniciar:
+        servidor, url = iniciar_servidor(args)
+        pid = servidor.pid
+
+    escenarios = Escenarios(url, args.trabajadores)
+    resultados = {}
+    try:
+        for nombre in nombres:
+            if args.calentamiento:
+                ejecutar_escenario(escenarios, nombre, args.concurrencia, args.calentamiento, args.semilla + 1)
+            resultado = ejecutar_escenario(escenarios, nombre, args.concurrencia, args.duracion, args.semilla)
+            resultados[nombre] = resultado
+            print(f"{nombre:32} {resultado['peticiones_por_segundo']:>9.1f} req/s  "
+                  f"p50 {resultado['p50_ms']} ms  p95 {resultado['p95_ms']} ms  "
+                  f"p99 {resultado['p99_ms']} ms  errores {resultado['errores']}", flush=True)
+        memoria = memoria_pico(pid) if pid else None
+    finally:
+        if servidor is not None:
+            servidor.send_signal(signal.SIGTERM)
+            servidor.wait(timeout=30)
+
+    informe = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _commit_actual(),
+        "configuracion": {
+            "url": url,
+            "java": args.java if args.iniciar else None,
+            "modo": args.modo if args.iniciar else None,
+            "workers": args.workers if args.iniciar else None,
+            "hilos": args.hilos if args.iniciar else None,
+            "concurrencia": args.concurrencia,
+            "duracion": args.duracion,
+            "trabajadores": args.trabajadores,
+            "entorno": {clave: valor for clave, valor in os.environ.items()
+                        if clave.startswith("LUCIA_") and "PASSWORD" not in clave},
+        },
+        "escenarios": resultados,
+        "memoria": memoria,
+    }
+
+    salida = args.salida or os.path.join(RESULTADOS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(informe, archivo, indent=2, ensure_ascii=False)
+    if memoria:
+        print(f"Pico de memoria total: {memoria['total_pico_mb']} MB")
+    print(f"Resultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Compara dos resultados de benchmark/carga.py.
+
+    python benchmark/comparar.py antes.json despues.json
+"""
+import argparse
+import json
+
+
+METRICAS = ["peticiones_por_segundo", "p50_ms", "p95_ms", "p99_ms"]
+
+
+def _cambio(antes, despues):
+    if antes in (None, 0) or despues is None:
+        return "     -"
+    return f"{(despues - antes) / antes * 100:+6.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos resultados de carga.py.")
+    parser.add_argument("antes")
+    parser.add_argument("despues")
+    args = parser.parse_args()
+
+    with open(args.antes, encoding="utf-8") as archivo:
+        antes = json.load(archivo)
+    with open(args.despues, encoding="utf-8") as archivo:
+        despues = json.load(archivo)
+
+    print(f"{antes.get('commit')} ({antes['fecha']})  →  {despues.get('commit')} ({despues['fecha']})\n")
+    print(f"{'escenario':32}" + "".join(f"{metrica:>28}" for metrica in METRICAS))
+    for nombre, resultado in despues["escenarios"].items():
+        anterior = antes["escenarios"].get(nombre)
+        if anterior is None:
+            continue
+        columnas = "".join(
+            f"{anterior[metrica]!s:>10} → {resultado[metrica]!s:>8} {_cambio(anterior[metrica], resultado[metrica])}"
+            for metrica in METRICAS
+        )
+        print(f"{nombre:32}{columnas}")
+
+    if antes.get("memoria") and despues.get("memoria"):
+        total_antes = antes["memoria"]["total_pico_mb"]
+        total_despues = despues["memoria"]["total_pico_mb"]
+        print(f"\nPico de memoria: {total_antes} MB → {total_despues} MB {_cambio(total_antes, total_despues)}")
+
+
+if __name__ == "__main__":
+    main()
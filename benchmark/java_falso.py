@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Reemplazo de `java` para las pruebas de carga (LUCIA_JAVA_BIN=benchmark/java_falso.py).
+
+Imita los dos modos de generar_pdf.py sin JVM ni base de datos:
+- ServidorReportes.java: imprime LISTO y responde a "PDF <cédula>" (o a
+  "CSV <cédula> <n>" seguido de n bytes de datos) con "PDF <tamaño>" y los
+  bytes, o a "<cédula>" con "OK <ruta>".
+- GenerarReporte (subprocess): genera un PDF e imprime su ruta.
+
+Los PDFs son válidos (una página con PyMuPDF), así que también sirven para
+la firma y el PDF combinado. Las demoras imitan el costo de la JVM:
+LUCIA_JAVA_FALSO_ARRANQUE_MS (arranque) y LUCIA_JAVA_FALSO_DEMORA_MS (cada reporte).
+"""
+import os
+import sys
+import tempfile
+import time
+
+import fitz
+
+
+ARRANQUE_MS = float(os.environ.get("LUCIA_JAVA_FALSO_ARRANQUE_MS", "800"))
+DEMORA_MS = float(os.environ.get("LUCIA_JAVA_FALSO_DEMORA_MS", "40"))
+
+
+def generar_bytes(cedula):
+    time.sleep(DEMORA_MS / 1000)
+    with fitz.open() as documento:
+        pagina = documento.new_page(width=595, height=842)
+        pagina.insert_text((72, 72), f"Extracto de sueldo (benchmark) - cédula {cedula}", fontsize=12)
+        return documento.tobytes()
+
+
+def generar(cedula):
+    fd, ruta = tempfile.mkstemp(prefix=f"estracto_sueldo_{cedula}_", suffix=".pdf", dir=os.getcwd())
+    with os.fdopen(fd, "wb") as f:
+        f.write(generar_bytes(cedula))
+    return ruta
+
+
+def main():
+    time.sleep(ARRANQUE_MS / 1000)
+    if sys.argv[-1].endswith("ServidorReportes.java"):
+        entrada, salida = sys.stdin.buffer, sys.stdout.buffer
+        salida.write(b"LISTO\n")
+        salida.flush()
+        for linea in iter(entrada.readline, b""):
+            pedido = linea.decode("utf-8").strip()
+            if not pedido:
+                continue
+            try:
+                if pedido.startswith("CSV "):
+                    cedula, tamano = pedido[4:].split()
+                    entrada.read(int(tamano))
+                    pdf = generar_bytes(int(cedula))
+                    salida.write(f"PDF {len(pdf)}\n".encode("utf-8") + pdf)
+                elif pedido.startswith("PDF "):
+                    pdf = generar_bytes(int(pedido[4:]))
+                    salida.write(f"PDF {len(pdf)}\n".encode("utf-8") + pdf)
+                else:
+                    salida.write(f"OK {generar(int(pedido))}\n".encode("utf-8"))
+            except Exception as e:
+                salida.write(f"ERROR {e}\n".replace("\n", " ").strip().encode("utf-8") + b"\n")
+            salida.flush()
+        return
+    print(generar(int(sys.argv[-1])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Carga datos sintéticos en MySQL para las pruebas de carga.
+
+Crea (si no existen) las tablas trabajador, sueldo_inicial e historial_chat
+y las llena con datos deterministas: el trabajador i tiene la cédula
+CEDULA_BASE + i y el celular CELULAR_BASE + i, que es lo que usa carga.py.
+
+Usa la misma configuración que la aplicación (LUCIA_DB_HOST, LUCIA_DB_NAME...).
+Para no tocar datos reales conviene una base aparte, por ejemplo:
+
+    LUCIA_DB_NAME=lucia_benchmark python benchmark/sembrar_datos.py --reiniciar
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conexion_db import conectar, db_config
+from migraciones import aplicar_migraciones
+
+
+CEDULA_BASE = 9000000
+CELULAR_BASE = 981000000
+SEMILLA = 20240601
+
+NOMBRES = ["MARIA", "JOSE", "ANA", "JUAN", "CARLOS", "ROSA", "LUIS", "CARMEN", "JORGE", "LIZ"]
+APELLIDOS = ["GONZALEZ", "BENITEZ", "MARTINEZ", "LOPEZ", "GIMENEZ", "VERA", "ROMERO", "DUARTE"]
+RUBROS = [("111", "Sueldos"), ("133", "Bonificaciones"), ("123", "Remuneración extraordinaria")]
+
+TABLAS = [
+    """
+    CREATE TABLE IF NOT EXISTS trabajador (
+        cedula BIGINT PRIMARY KEY,
+        nombres VARCHAR(100),
+        apellidos VARCHAR(100),
+        celular VARCHAR(20),
+        KEY idx_trabajador_celular (celular)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sueldo_inicial (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        cedula_id BIGINT NOT NULL,
+        CNIVEL BIGINT, CINSTI BIGINT, CDPTO BIGINT, AA_PLAN BIGINT, MM_PLAN BIGINT,
+        DIGITO_ID VARCHAR(2), APEL_NOMB VARCHAR(120), CATEGO_PSP VARCHAR(10),
+        CANT_RUBRO BIGINT, TURNO VARCHAR(2), TIPO_RUBRO VARCHAR(10), CCARGO BIGINT,
+        PRESUP_ACT BIGINT, DEVENG_ACT BIGINT, DCTO_JUB BIGINT, CAPOR_IPS BIGINT,
+        STATUS_CRG BIGINT, CCORRES BIGINT, id_presup VARCHAR(20), visible BIGINT,
+        aa_pago INT, mm_pago INT, capor_bnt INT, linea INT, orden INT, dto_3506 INT,
+        KEY idx_sueldo_cedula (cedula_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS historial_chat (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        celular VARCHAR(20) NOT NULL,
+        pregunta TEXT,
+        respuesta TEXT,
+        fecha_registro TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+def cedula(indice):
+    return CEDULA_BASE + indice
+
+
+def celular(indice):
+    return f"0{CELULAR_BASE + indice}"
+
+
+def _insertar(cursor, tabla, columnas, filas):
+    marcadores = ", ".join(["%s"] * len(columnas))
+    cursor.executemany(
+        f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({marcadores})", filas
+    )
+
+
+def sembrar(trabajadores, periodos, conversaciones, reiniciar=False):
+    azar = random.Random(SEMILLA)
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        if reiniciar:
+            for tabla in ("historial_chat", "sueldo_inicial", "trabajador"):
+                cursor.execute(f"DROP TABLE IF EXISTS {tabla}")
+        for sentencia in TABLAS:
+            cursor.execute(sentencia)
+        conn.commit()
+
+        for inicio in range(0, trabajadores, 500):
+            fin = min(inicio + 500, trabajadores)
+            filas_trabajador, filas_sueldo, filas_chat = [], [], []
+            for i in range(inicio, fin):
+                nombres, apellidos = azar.choice(NOMBRES), azar.choice(APELLIDOS)
+                filas_trabajador.append((cedula(i), nombres, apellidos, celular(i)))
+
+                cdpto, cinsti = 1 + i % 17, 1 + i % 5
+                for periodo in range(periodos):
+                    anio, mes = 2024 + periodo // 12, 1 + periodo % 12
+                    for linea, (objeto, _) in enumerate(RUBROS[:1 + azar.randrange(len(RUBROS))], start=1):
+                        presupuesto = azar.randrange(2000000, 9000000, 1000)
+                        filas_sueldo.append((
+                            cedula(i), 12, cinsti, cdpto, anio, mes, "1", f"{apellidos}, {nombres}",
+                            objeto, 1, "M", "P", 100 + linea, presupuesto, presupuesto,
+                            presupuesto * 16 // 100, presupuesto * 9 // 100, 1, 0, f"{objeto}-{linea}", 1,
+                            anio, mes, 0, linea, linea,
+                        ))
+
+                for numero in range(conversaciones):
+                    filas_chat.append((celular(i), f"Pregunta {numero} del trabajador {i}",
+                                       f"Respuesta {numero} " + "texto " * azar.randrange(5, 60)))
+
+            _insertar(cursor, "trabajador", ("cedula", "nombres", "apellidos", "celular"), filas_trabajador)
+            _insertar(cursor, "sueldo_inicial", (
+                "cedula_id", "CNIVEL", "CINSTI", "CDPTO", "AA_PLAN", "MM_PLAN", "DIGITO_ID", "APEL_NOMB",
+                "CATEGO_PSP", "CANT_RUBRO", "TURNO", "TIPO_RUBRO", "CCARGO", "PRESUP_ACT", "DEVENG_ACT",
+                "DCTO_JUB", "CAPOR_IPS", "STATUS_CRG", "CCORRES", "id_presup", "visible",
+                "aa_pago", "mm_pago", "capor_bnt", "linea", "orden",
+            ), filas_sueldo)
+            if filas_chat:
+                _insertar(cursor, "historial_chat", ("celular", "pregunta", "respuesta"), filas_chat)
+            conn.commit()
+            print(f"{fin}/{trabajadores} trabajadores", flush=True)
+        cursor.close()
+    finally:
+        conn.close()
+
+    # Base de pruebas sin tráfico: también las migraciones de mantenimiento
+    aplicar_migraciones(mantenimiento=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga datos sintéticos para las pruebas de carga.")
+    parser.add_argument("--trabajadores", type=int, default=2000)
+    parser.add_argument("--periodos", type=int, default=12, help="Meses de sueldo_inicial por trabajador")
+    parser.add_argument("--conversaciones", type=int, default=30, help="Conversaciones por celular")
+    parser.add_argument("--reiniciar", action="store_true", help="Borra y recrea las tablas")
+    args = parser.parse_args()
+
+    print(f"Base de datos: {db_config['database']} en {db_config['host']}")
+    sembrar(args.trabajadores, args.periodos, args.conversaciones, args.reiniciar)
+
+
+if __name__ == "__main__":
+    main()
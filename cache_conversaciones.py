@@ -0,0 +1,260 @@
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+# Configuración de la cache de conversaciones recientes
+CACHE_ULTIMAS = int(os.environ.get("LUCIA_CACHE_CONVERSACIONES_ULTIMAS", "50"))
+CACHE_MAX_CELULARES = int(os.environ.get("LUCIA_CACHE_CONVERSACIONES_MAX", "10000"))
+CACHE_TTL = int(os.environ.get("LUCIA_CACHE_CONVERSACIONES_TTL", "600"))
+# "memoria" (por worker, invalidada entre workers) o "redis" (compartida entre workers)
+CACHE_BACKEND = os.environ.get("LUCIA_CACHE_CONVERSACIONES_BACKEND", "memoria")
+REDIS_URL = os.environ.get("LUCIA_REDIS_URL", "redis://127.0.0.1:6379/0")
+# Contadores de escrituras compartidos por los workers con el backend "memoria"
+CACHE_GENERACIONES = os.environ.get(
+    "LUCIA_CACHE_CONVERSACIONES_GENERACIONES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos", "conversaciones.gen"),
+)
+CACHE_RANURAS = 65536
+_CONTADOR = struct.Struct("<Q")
+
+
+class GeneracionesCompartidas:
+    """
+    Contador de escrituras por celular, compartido entre procesos.
+
+    Es un archivo de `ranuras` contadores de 64 bits mapeado en memoria; cada
+    celular cae en una ranura por hash. Dos celulares en la misma ranura solo
+    provocan invalidaciones de más, nunca una lectura vieja. El incremento
+    toma un lock de registro (lockf) sobre la ranura; la lectura no bloquea.
+    """
+
+    def __init__(self, ruta=CACHE_GENERACIONES, ranuras=CACHE_RANURAS):
+        self.ranuras = ranuras
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self._fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o660)
+        tamano = ranuras * _CONTADOR.size
+        if os.fstat(self._fd).st_size < tamano:
+            os.ftruncate(self._fd, tamano)
+        self._mapa = mmap.mmap(self._fd, tamano)
+
+    def _posicion(self, celular):
+        return zlib.crc32(str(celular).encode("utf-8")) % self.ranuras * _CONTADOR.size
+
+    def actual(self, celular):
+        return _CONTADOR.unpack_from(self._mapa, self._posicion(celular))[0]
+
+    def incrementar(self, celular):
+        """Suma una escritura; devuelve (anterior, nuevo)."""
+        posicion = self._posicion(celular)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _CONTADOR.size, posicion)
+        try:
+            anterior = _CONTADOR.unpack_from(self._mapa, posicion)[0]
+            _CONTADOR.pack_into(self._mapa, posicion, anterior + 1)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _CONTADOR.size, posicion)
+        return anterior, anterior + 1
+
+
+class BackendMemoria:
+    """
+    Backend en memoria del proceso: LRU acotado a max_celulares con TTL.
+
+    Cada entrada guarda las últimas conversaciones (la más nueva primero), si
+    la lista contiene todo el historial del celular y el contador de
+    escrituras del celular (GeneracionesCompartidas) con el que se cargó.
+    Cualquier worker que registra una conversación incrementa el contador,
+    así los demás descartan su entrada en la lectura siguiente; y una lectura
+    lenta de MySQL no guarda una lista que ya no incluye una conversación
+    registrada mientras tanto.
+    """
+
+    def __init__(self, max_celulares=CACHE_MAX_CELULARES, ttl=CACHE_TTL, generaciones=None):
+        self.max_celulares = max_celulares
+        self.ttl = ttl
+        self._generaciones = generaciones or GeneracionesCompartidas()
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def generacion(self, celular):
+        return self._generaciones.actual(celular)
+
+    def obtener(self, celular):
+        with self._lock:
+            entrada = self._entradas.get(celular)
+            if entrada is None:
+                return None
+            if (time.monotonic() - entrada["creada"] > self.ttl
+                    or entrada["generacion"] != self._generaciones.actual(celular)):
+                del self._entradas[celular]
+                return None
+            self._entradas.move_to_end(celular)
+            return entrada["registros"], entrada["completo"]
+
+    def guardar(self, celular, registros, completo, generacion):
+        with self._lock:
+            if self._generaciones.actual(celular) != generacion:
+                return
+            self._entradas[celular] = {
+                "registros": list(registros),
+                "completo": completo,
+                "generacion": generacion,
+                "creada": time.monotonic(),
+            }
+            self._entradas.move_to_end(celular)
+            while len(self._entradas) > self.max_celulares:
+                self._entradas.popitem(last=False)
+
+    def agregar(self, celular, registro, ultimas):
+        with self._lock:
+            anterior, nuevo = self._generaciones.incrementar(celular)
+            entrada = self._entradas.get(celular)
+            if entrada is None:
+                return
+            if entrada["generacion"] != anterior:
+                # Otro worker registró algo que esta entrada no tiene
+                del self._entradas[celular]
+                return
+            entrada["registros"].insert(0, registro)
+            del entrada["registros"][ultimas:]
+            entrada["generacion"] = nuevo
+
+    def invalidar(self, celular):
+        with self._lock:
+            self._entradas.pop(celular, None)
+
+
+class BackendRedis:
+    """
+    Backend compartido en Redis, coherente entre todos los workers de gunicorn.
+
+    Cada celular es una lista cuyo primer elemento es la marca de historial
+    completo ("1"/"0") seguida de los registros en JSON; así una entrada sin
+    conversaciones también queda cacheada. Las escrituras son scripts Lua
+    atómicos.
+
+    Requiere el paquete `redis` (no está en requirements.txt porque es opcional).
+    """
+
+    _AGREGAR = """
+        redis.call('INCR', KEYS[2])
+        redis.call('EXPIRE', KEYS[2], ARGV[3])
+        if redis.call('EXISTS', KEYS[1]) == 1 then
+            local marca = redis.call('LPOP', KEYS[1])
+            redis.call('LPUSH', KEYS[1], ARGV[1])
+            redis.call('LPUSH', KEYS[1], marca)
+            redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[2]))
+        end
+    """
+    _GUARDAR = """
+        if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1]) then
+            return 0
+        end
+        redis.call('DEL', KEYS[1])
+        redis.call('RPUSH', KEYS[1], ARGV[3], unpack(ARGV, 4))
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+        return 1
+    """
+
+    def __init__(self, url=REDIS_URL, ttl=CACHE_TTL):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("El backend 'redis' requiere: pip install redis") from e
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(url)
+        self._agregar = self._redis.register_script(self._AGREGAR)
+        self._guardar = self._redis.register_script(self._GUARDAR)
+
+    @staticmethod
+    def _claves(celular):
+        return f"lucia:conversaciones:{celular}", f"lucia:conversaciones:{celular}:escrituras"
+
+    def generacion(self, celular):
+        return int(self._redis.get(self._claves(celular)[1]) or 0)
+
+    def obtener(self, celular):
+        valores = self._redis.lrange(self._claves(celular)[0], 0, -1)
+        if not valores:
+            return None
+        completo = valores[0] == b"1"
+        return [json.loads(valor) for valor in valores[1:]], completo
+
+    def guardar(self, celular, registros, completo, generacion):
+        valores = [json.dumps(registro, ensure_ascii=False) for registro in registros]
+        self._guardar(keys=self._claves(celular),
+                      args=[generacion, self.ttl, "1" if completo else "0", *valores])
+
+    def agregar(self, celular, registro, ultimas):
+        self._agregar(keys=self._claves(celular),
+                      args=[json.dumps(registro, ensure_ascii=False), ultimas, self.ttl])
+
+    def invalidar(self, celular):
+        self._redis.delete(self._claves(celular)[0])
+
+
+class CacheConversaciones:
+    """
+    Cache de lectura para las últimas conversaciones de cada celular.
+
+    - Lectura: si la entrada tiene suficientes registros se responde sin ir a
+      MySQL; si no, se consulta y se guarda la lista (read-through).
+    - Registro: la conversación nueva se agrega al frente de la entrada
+      existente (write-through), así el GET siguiente de una conversación
+      activa no toca la base.
+    """
+
+    def __init__(self, backend=None, ultimas=CACHE_ULTIMAS):
+        self.backend = backend
+        self.ultimas = ultimas
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _backend(self):
+        if self.backend is None:
+            self.backend = BackendRedis() if CACHE_BACKEND == "redis" else BackendMemoria()
+        return self.backend
+
+    def obtener(self, celular, limit, cargar):
+        """Devuelve las últimas `limit` conversaciones; `cargar(celular, n)` consulta MySQL."""
+        if limit > self.ultimas:
+            self.fallos += 1
+            return cargar(celular, limit)
+
+        backend = self._backend()
+        entrada = backend.obtener(celular)
+        if entrada is not None:
+            registros, completo = entrada
+            if len(registros) >= limit or completo:
+                self.aciertos += 1
+                return registros[:limit]
+
+        self.fallos += 1
+        generacion = backend.generacion(celular)
+        registros = [
+            {"pregunta": registro["pregunta"], "respuesta": registro["respuesta"]}
+            for registro in cargar(celular, self.ultimas)
+        ]
+        backend.guardar(celular, registros, len(registros) < self.ultimas, generacion)
+        return registros[:limit]
+
+    def agregar(self, celular, pregunta, respuesta):
+        self._backend().agregar(celular, {"pregunta": pregunta, "respuesta": respuesta}, self.ultimas)
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            "backend": CACHE_BACKEND,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+        }
+
+
+cache_conversaciones = CacheConversaciones()
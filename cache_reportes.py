@@ -0,0 +1,223 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Configuración de la cache de reportes en disco
+CACHE_DIR = os.environ.get("LUCIA_CACHE_REPORTES", os.path.join(BASE_DIR, "datos", "cache_reportes"))
+CACHE_MAX_MB = int(os.environ.get("LUCIA_CACHE_MAX_MB", "512"))
+CACHE_MAX_DIAS = int(os.environ.get("LUCIA_CACHE_MAX_DIAS", "45"))
+# Archivo junto a cada PDF con su SHA-256 (ver huella)
+SUFIJO_HUELLA = ".sha256"
+
+
+def huella(ruta):
+    """
+    SHA-256 de un PDF y su fecha de publicación, como (resumen, fecha).
+
+    Se guardan en <ruta>.sha256 junto con el inode del PDF. Los PDFs no se
+    reescriben en el lugar (se publican con os.replace), así que mientras el
+    inode coincida el resumen corresponde a esos bytes; si no coincide o falta,
+    se recalcula. La fecha es la del .sha256: la del PDF cambia con cada
+    acierto de la cache (orden LRU).
+    """
+    inode = os.stat(ruta).st_ino
+    lateral = ruta + SUFIJO_HUELLA
+    try:
+        with open(lateral, encoding="ascii") as f:
+            resumen, inode_guardado = f.read().split()
+        if int(inode_guardado) == inode:
+            return resumen, _fecha_utc(os.path.getmtime(lateral))
+    except (OSError, ValueError):
+        pass
+    return _escribir_huella(ruta, inode, lateral)
+
+
+def _escribir_huella(ruta, inode, lateral):
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(262144), b""):
+            digest.update(bloque)
+    resumen = digest.hexdigest()
+    temporal = f"{lateral}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporal, "w", encoding="ascii") as f:
+            f.write(f"{resumen} {inode}\n")
+        os.replace(temporal, lateral)
+        return resumen, _fecha_utc(os.path.getmtime(lateral))
+    except OSError:
+        return resumen, _fecha_utc(time.time())
+
+
+def _fecha_utc(marca):
+    return datetime.fromtimestamp(int(marca), tz=timezone.utc)
+
+
+class CacheReportes:
+    """
+    Cache de PDFs en disco con clave (cédula, versión de datos).
+
+    La fecha de modificación de cada archivo se actualiza en cada acierto y
+    se usa como orden LRU; así el orden se comparte entre los workers de
+    gunicorn sin coordinación extra. Los archivos más viejos que max_dias se
+    eliminan y, si el total supera max_bytes, se eliminan los menos usados.
+    Cada PDF se publica con su huella (<ruta>.sha256), que se borra con él.
+    """
+
+    def __init__(self, directorio=CACHE_DIR, max_bytes=CACHE_MAX_MB * 1024 * 1024,
+                 max_dias=CACHE_MAX_DIAS):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.max_edad = max_dias * 24 * 3600
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def ruta(self, cedula, version, variante=None):
+        sufijo = f"_{variante}" if variante else ""
+        return os.path.join(self.directorio, f"estracto_sueldo_{cedula}_{version}{sufijo}.pdf")
+
+    def obtener(self, cedula, version, variante=None):
+        """Devuelve la ruta del PDF en cache o None si no está o expiró."""
+        ruta = self.ruta(cedula, version, variante)
+        try:
+            edad = time.time() - os.path.getmtime(ruta)
+            if edad > self.max_edad:
+                os.remove(ruta)
+                self._eliminar_huella(ruta)
+                raise FileNotFoundError(ruta)
+            os.utime(ruta)
+        except FileNotFoundError:
+            with self._lock:
+                self.fallos += 1
+            return None
+        with self._lock:
+            self.aciertos += 1
+        return ruta
+
+    def guardar(self, cedula, version, ruta_origen, variante=None):
+        """Mueve el PDF generado a la cache y devuelve su ruta definitiva."""
+        ruta = self.ruta(cedula, version, variante)
+        temporal = self._temporal(ruta)
+        shutil.move(ruta_origen, temporal)
+        return self._publicar(cedula, version, temporal, ruta)
+
+    def guardar_bytes(self, cedula, version, datos, variante=None):
+        """Escribe el PDF en la cache y devuelve su ruta definitiva."""
+        ruta = self.ruta(cedula, version, variante)
+        temporal = self._temporal(ruta)
+        with open(temporal, "wb") as f:
+            f.write(datos)
+        return self._publicar(cedula, version, temporal, ruta)
+
+    def _temporal(self, ruta):
+        return f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _publicar(self, cedula, version, temporal, ruta):
+        # La huella se escribe antes de publicar el PDF, con el inode que tendrá
+        _escribir_huella(temporal, os.stat(temporal).st_ino, ruta + SUFIJO_HUELLA)
+        os.replace(temporal, ruta)
+        self._eliminar_versiones_anteriores(cedula, version)
+        self.desalojar()
+        return ruta
+
+    def desalojar(self):
+        """Elimina las entradas expiradas y las menos usadas hasta respetar el tamaño máximo."""
+        entradas = []
+        huellas = []
+        ahora = time.time()
+        with os.scandir(self.directorio) as it:
+            for entrada in it:
+                if entrada.name.endswith(".pdf" + SUFIJO_HUELLA):
+                    huellas.append(entrada.path)
+                    continue
+                if not entrada.name.endswith(".pdf"):
+                    continue
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                if ahora - info.st_mtime > self.max_edad:
+                    self._eliminar(entrada.path)
+                else:
+                    entradas.append((info.st_mtime, info.st_size, entrada.path))
+
+        total = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            self._eliminar(ruta)
+            total -= tamano
+
+        # Huellas que quedaron sin su PDF
+        for lateral in huellas:
+            if not os.path.exists(lateral[:-len(SUFIJO_HUELLA)]):
+                self._eliminar_huella(lateral[:-len(SUFIJO_HUELLA)])
+
+    def limpiar_temporales(self, edad_minima):
+        """Borra los .tmp que dejó un worker caído a mitad de una escritura."""
+        borrados = 0
+        limite = time.time() - edad_minima
+        with os.scandir(self.directorio) as it:
+            for entrada in it:
+                if not entrada.name.endswith(".tmp"):
+                    continue
+                try:
+                    if entrada.stat().st_mtime < limite:
+                        os.remove(entrada.path)
+                        borrados += 1
+                except FileNotFoundError:
+                    pass
+        return borrados
+
+    def estadisticas(self):
+        archivos = 0
+        total = 0
+        with os.scandir(self.directorio) as it:
+            for entrada in it:
+                if entrada.name.endswith(".pdf"):
+                    archivos += 1
+                    total += entrada.stat().st_size
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "desalojos": self.desalojos,
+            "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+            "archivos": archivos,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _eliminar_versiones_anteriores(self, cedula, version):
+        """Borra los PDFs de la cédula generados con otra versión de datos (de cualquier variante)."""
+        prefijo = f"estracto_sueldo_{cedula}_"
+        actuales = (f"{prefijo}{version}.", f"{prefijo}{version}_")
+        with os.scandir(self.directorio) as it:
+            for entrada in it:
+                if (entrada.name.startswith(prefijo) and entrada.name.endswith(".pdf")
+                        and not entrada.name.startswith(actuales)):
+                    self._eliminar(entrada.path)
+
+    def _eliminar(self, ruta):
+        self._eliminar_huella(ruta)
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self.desalojos += 1
+
+    @staticmethod
+    def _eliminar_huella(ruta):
+        try:
+            os.remove(ruta + SUFIJO_HUELLA)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,173 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errors
+
+
+# Configuración de la base de datos
+db_config = {
+    "host": os.environ.get("LUCIA_DB_HOST", "127.0.0.1"),
+    "user": os.environ.get("LUCIA_DB_USER", "lucia"),
+    "password": os.environ.get("LUCIA_DB_PASSWORD", "admin123"),
+    "database": os.environ.get("LUCIA_DB_NAME", "lucia_database")
+}
+
+# Configuración del pool de conexiones
+POOL_TAMANO = int(os.environ.get("LUCIA_DB_POOL", "5"))
+POOL_TIMEOUT = float(os.environ.get("LUCIA_DB_POOL_TIMEOUT", "10"))
+POOL_RECICLAR_SEGUNDOS = int(os.environ.get("LUCIA_DB_POOL_RECICLAR", "1800"))
+POOL_VERIFICAR_SEGUNDOS = int(os.environ.get("LUCIA_DB_POOL_VERIFICAR", "30"))
+
+
+def conectar():
+    """Abre una conexión nueva a la base de datos, fuera del pool."""
+    return mysql.connector.connect(**db_config)
+
+
+class _ConexionPool:
+    def __init__(self):
+        self.conn = conectar()
+        self.creada = time.monotonic()
+        self.ultimo_uso = self.creada
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones MySQL compartido por todos los endpoints del proceso.
+
+    - A lo sumo `tamano` conexiones abiertas; si todas están en uso se espera
+      hasta `timeout` segundos y luego se lanza PoolError.
+    - Al entregar una conexión inactiva por más de `verificar` segundos se
+      hace un ping; las que superan `reciclar` segundos de vida se reemplazan.
+    - Al devolverla se hace rollback para no arrastrar transacciones abiertas.
+    - El pool se recrea por PID: tras el fork de gunicorn cada worker abre las
+      suyas y nunca comparte sockets con el proceso padre.
+    """
+
+    def __init__(self, tamano=POOL_TAMANO, timeout=POOL_TIMEOUT,
+                 reciclar=POOL_RECICLAR_SEGUNDOS, verificar=POOL_VERIFICAR_SEGUNDOS):
+        self.tamano = tamano
+        self.timeout = timeout
+        self.reciclar = reciclar
+        self.verificar = verificar
+        self._lock = threading.Lock()
+        self._pid = None
+        # Un hilo del proceso padre pudo tener el lock tomado en el momento del fork
+        os.register_at_fork(after_in_child=self._recrear_lock)
+
+    def _recrear_lock(self):
+        self._lock = threading.Lock()
+
+    def _inicializar(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._libres = queue.LifoQueue()
+            self._permisos = threading.BoundedSemaphore(self.tamano)
+            self._en_uso = 0
+            self._esperas = 0
+            self._espera_total = 0.0
+            self._espera_max = 0.0
+            self._agotado = 0
+            self._creadas = 0
+            self._recicladas = 0
+            self._pid = os.getpid()
+
+    @contextmanager
+    def conexion(self):
+        """Presta una conexión del pool durante el bloque `with`."""
+        self._inicializar()
+        inicio = time.monotonic()
+        if not self._permisos.acquire(timeout=self.timeout):
+            with self._lock:
+                self._agotado += 1
+            raise errors.PoolError(
+                f"No hay conexiones libres en el pool después de {self.timeout} s")
+        espera = time.monotonic() - inicio
+        with self._lock:
+            self._esperas += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+            self._en_uso += 1
+
+        entrada = None
+        try:
+            entrada = self._obtener()
+            yield entrada.conn
+        finally:
+            if entrada is not None:
+                self._devolver(entrada)
+            with self._lock:
+                self._en_uso -= 1
+            self._permisos.release()
+
+    def estadisticas(self):
+        self._inicializar()
+        with self._lock:
+            return {
+                "pid": self._pid,
+                "tamano": self.tamano,
+                "en_uso": self._en_uso,
+                "libres": self._libres.qsize(),
+                "prestamos": self._esperas,
+                "espera_promedio_ms": round(1000 * self._espera_total / self._esperas, 3) if self._esperas else 0.0,
+                "espera_max_ms": round(1000 * self._espera_max, 3),
+                "agotado": self._agotado,
+                "conexiones_creadas": self._creadas,
+                "conexiones_recicladas": self._recicladas,
+            }
+
+    def _obtener(self):
+        while True:
+            try:
+                entrada = self._libres.get_nowait()
+            except queue.Empty:
+                entrada = _ConexionPool()
+                with self._lock:
+                    self._creadas += 1
+                return entrada
+
+            ahora = time.monotonic()
+            if ahora - entrada.creada > self.reciclar:
+                self._descartar(entrada)
+                continue
+            if ahora - entrada.ultimo_uso > self.verificar:
+                try:
+                    entrada.conn.ping(reconnect=False)
+                except mysql.connector.Error:
+                    self._descartar(entrada)
+                    continue
+            return entrada
+
+    def _devolver(self, entrada):
+        try:
+            if not entrada.conn.is_connected():
+                raise mysql.connector.Error("conexión cerrada")
+            entrada.conn.rollback()
+        except mysql.connector.Error:
+            self._descartar(entrada)
+            return
+        entrada.ultimo_uso = time.monotonic()
+        self._libres.put(entrada)
+
+    def _descartar(self, entrada):
+        try:
+            entrada.conn.close()
+        except mysql.connector.Error:
+            pass
+        with self._lock:
+            self._recicladas += 1
+
+
+pool = PoolConexiones()
+
+
+def conexion():
+    """Atajo para `with conexion() as conn:` sobre el pool del proceso."""
+    return pool.conexion()
@@ -1,5 +1,29 @@
+"""
+Sincroniza la carpeta jasper del proyecto con el proyecto luciajasper.
+
+Copia la carpeta lib, el archivo JAR y la carpeta reports, pero solo los
+archivos cuyo contenido cambió: compara el SHA-256 de cada archivo de
+origen con el del destino, que se toma del manifiesto (jasper/.manifiesto.json)
+mientras el archivo de destino conserve el tamaño y la fecha registrados.
+Los archivos que ya no están en el origen se eliminan del destino.
+
+Después compila cada .jrxml de reports a .jasper (CompilarReportes.java),
+si cambió el .jrxml o la versión de JasperReports (lib o JAR), y deja al
+lado el SHA-256 del .jrxml compilado (<plantilla>.jasper.sha256). Así
+ServidorReportes carga la plantilla compilada en lugar de compilarla al
+arrancar cada JVM, y sabe si está al día sin depender de las fechas (que
+tras un git clone son las del checkout).
+
+    python copiar_jasper.py                  # sincronizar y compilar lo que cambió
+    python copiar_jasper.py --forzar         # copiar y compilar todo de nuevo
+    python copiar_jasper.py --solo-compilar  # compilar lo que hay en jasper/ (despliegue)
+"""
+import argparse
+import hashlib
+import json
 import os
 import shutil
+import subprocess
 
 # --- Configuración de rutas ---
 RUTA_ORIGEN_LIB = "/home/hugo/NetBeansProjects/luciajasper/dist/lib"
@@ -8,66 +32,260 @@ RUTA_ORIGEN_REPORTS = "/home/hugo/NetBeansProjects/luciajasper/reports"
 RUTA_DESTINO_JASPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jasper")
 RUTA_DESTINO_LIB = os.path.join(RUTA_DESTINO_JASPER, "lib")
 RUTA_DESTINO_REPORTS = os.path.join(RUTA_DESTINO_JASPER, "reports")
+MANIFIESTO_PATH = os.path.join(RUTA_DESTINO_JASPER, ".manifiesto.json")
+COMPILADOR_FUENTE = os.path.join(RUTA_DESTINO_JASPER, "CompilarReportes.java")
+JAVA_BIN = os.environ.get("LUCIA_JAVA_BIN", "java")
+TIMEOUT_COMPILACION = 300
+TAMANO_BLOQUE = 1024 * 1024
+
+
+def hash_archivo(ruta):
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def leer_manifiesto():
+    try:
+        with open(MANIFIESTO_PATH, encoding="utf-8") as f:
+            manifiesto = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"archivos": {}, "compilados": {}}
+    manifiesto.setdefault("archivos", {})
+    manifiesto.setdefault("compilados", {})
+    return manifiesto
+
+
+def guardar_manifiesto(manifiesto):
+    temporal = f"{MANIFIESTO_PATH}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2, sort_keys=True)
+    os.replace(temporal, MANIFIESTO_PATH)
+
+
+def _registro(ruta, sha):
+    estado = os.stat(ruta)
+    return {"sha256": sha, "tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns}
+
+
+def _hash_destino(ruta, registro):
+    """Hash del archivo de destino; sin releerlo si tamaño y fecha coinciden con el manifiesto."""
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    if registro and registro["tamano"] == estado.st_size and registro["mtime_ns"] == estado.st_mtime_ns:
+        return registro["sha256"]
+    return hash_archivo(ruta)
+
+
+def _copiar(origen, destino):
+    """Copia con archivo temporal y os.replace: una JVM que arranca nunca ve un archivo a medias."""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    shutil.copy2(origen, temporal)
+    os.replace(temporal, destino)
+
+
+def _archivos(origen, destino):
+    """Pares (origen, destino) de un archivo o de todos los archivos de una carpeta."""
+    if os.path.isfile(origen):
+        return [(origen, destino)]
+    pares = []
+    for raiz, _, nombres in os.walk(origen):
+        for nombre in sorted(nombres):
+            ruta = os.path.join(raiz, nombre)
+            pares.append((ruta, os.path.join(destino, os.path.relpath(ruta, origen))))
+    return pares
+
+
+def sincronizar(origen, destino, manifiesto, forzar=False):
+    """
+    Deja `destino` igual a `origen` (archivo o carpeta) copiando solo lo que cambió.
+
+    Devuelve (copiados, sin_cambios, eliminados).
+    """
+    archivos = manifiesto["archivos"]
+    copiados = sin_cambios = eliminados = 0
+    presentes = set()
+    for ruta_origen, ruta_destino in _archivos(origen, destino):
+        relativa = os.path.relpath(ruta_destino, RUTA_DESTINO_JASPER)
+        presentes.add(relativa)
+        sha = hash_archivo(ruta_origen)
+        if not forzar and _hash_destino(ruta_destino, archivos.get(relativa)) == sha:
+            sin_cambios += 1
+        else:
+            _copiar(ruta_origen, ruta_destino)
+            copiados += 1
+            print(f"  copiado: {relativa}")
+        archivos[relativa] = _registro(ruta_destino, sha)
+
+    if os.path.isdir(origen):
+        # Lo que ya no está en el origen (los .jasper se manejan en compilar_reportes)
+        for raiz, _, nombres in os.walk(destino):
+            for nombre in nombres:
+                ruta = os.path.join(raiz, nombre)
+                relativa = os.path.relpath(ruta, RUTA_DESTINO_JASPER)
+                if relativa in presentes or nombre.endswith((".jasper", ".jasper.sha256", ".tmp")):
+                    continue
+                os.remove(ruta)
+                archivos.pop(relativa, None)
+                eliminados += 1
+                print(f"  eliminado: {relativa}")
+        prefijo = os.path.relpath(destino, RUTA_DESTINO_JASPER) + os.sep
+        for relativa in [r for r in archivos if r.startswith(prefijo) and r not in presentes]:
+            del archivos[relativa]
+    return copiados, sin_cambios, eliminados
+
+
+def registrar_destino(manifiesto):
+    """Registra en el manifiesto lo que ya está en jasper/ (lib, JAR y reports), sin origen."""
+    archivos = {}
+    destinos = [RUTA_DESTINO_LIB, os.path.join(RUTA_DESTINO_JASPER, os.path.basename(ARCHIVO_ORIGEN_JAR)),
+                RUTA_DESTINO_REPORTS]
+    for destino in destinos:
+        if not os.path.exists(destino):
+            continue
+        for _, ruta in _archivos(destino, destino):
+            if ruta.endswith((".jasper", ".jasper.sha256", ".tmp")):
+                continue
+            relativa = os.path.relpath(ruta, RUTA_DESTINO_JASPER)
+            archivos[relativa] = _registro(ruta, _hash_destino(ruta, manifiesto["archivos"].get(relativa)))
+    manifiesto["archivos"] = archivos
+
 
-def copiar_archivos_jasper():
-    """Copia la carpeta lib, el archivo JAR y la carpeta reports a la carpeta jasper del proyecto."""
+def _hash_motor(manifiesto):
+    """Hash del JAR y de lib: si cambia la versión de JasperReports hay que recompilar los .jasper."""
+    sha = hashlib.sha256()
+    for relativa in sorted(manifiesto["archivos"]):
+        if relativa.startswith("lib" + os.sep) or relativa == "luciajasper.jar":
+            sha.update(f"{relativa}:{manifiesto['archivos'][relativa]['sha256']}\n".encode("utf-8"))
+    return sha.hexdigest()
+
+
+def compilar_reportes(manifiesto, forzar=False):
+    """Compila a .jasper los .jrxml de reports que cambiaron; devuelve (compilados, errores)."""
+    archivos, compilados = manifiesto["archivos"], manifiesto["compilados"]
+    motor = _hash_motor(manifiesto)
+    pendientes = []
+    vigentes = set()
+    for relativa in sorted(archivos):
+        if not relativa.startswith("reports" + os.sep) or not relativa.endswith(".jrxml"):
+            continue
+        relativa_jasper = relativa[:-len(".jrxml")] + ".jasper"
+        vigentes.add(relativa_jasper)
+        ruta_jasper = os.path.join(RUTA_DESTINO_JASPER, relativa_jasper)
+        previo = compilados.get(relativa_jasper)
+        if (forzar or previo is None or not os.path.exists(ruta_jasper)
+                or previo["fuente"] != archivos[relativa]["sha256"] or previo["motor"] != motor):
+            pendientes.append((relativa, relativa_jasper))
+
+    # .jasper de plantillas que ya no existen
+    for relativa_jasper in [r for r in compilados if r not in vigentes]:
+        ruta = os.path.join(RUTA_DESTINO_JASPER, relativa_jasper)
+        for archivo in (ruta, f"{ruta}.sha256"):
+            if os.path.exists(archivo):
+                os.remove(archivo)
+        print(f"  eliminado: {relativa_jasper}")
+        del compilados[relativa_jasper]
+
+    if not pendientes:
+        return 0, 0
+
+    # Una sola JVM para todas las plantillas; cada una se escribe en un temporal
+    argumentos = []
+    for relativa, relativa_jasper in pendientes:
+        argumentos += [relativa, f"{relativa_jasper}.{os.getpid()}.tmp"]
+    classpath = f"{os.path.join(RUTA_DESTINO_JASPER, 'luciajasper.jar')}:{os.path.join(RUTA_DESTINO_LIB, '*')}"
+    try:
+        resultado = subprocess.run(
+            [JAVA_BIN, "-cp", classpath, COMPILADOR_FUENTE] + argumentos,
+            cwd=RUTA_DESTINO_JASPER, capture_output=True, text=True, timeout=TIMEOUT_COMPILACION,
+        )
+        salida = resultado.stdout.splitlines()
+        if resultado.stderr.strip():
+            print(resultado.stderr.strip())
+    except (OSError, subprocess.TimeoutExpired) as e:
+        salida = [f"ERROR {relativa} {e}" for relativa, _ in pendientes]
+
+    hechos = {linea[3:].strip() for linea in salida if linea.startswith("OK ")}
+    errores = 0
+    for relativa, relativa_jasper in pendientes:
+        ruta_jasper = os.path.join(RUTA_DESTINO_JASPER, relativa_jasper)
+        temporal = f"{ruta_jasper}.{os.getpid()}.tmp"
+        if relativa in hechos and os.path.exists(temporal):
+            os.replace(temporal, ruta_jasper)
+            # ServidorReportes compara este hash con el del .jrxml antes de usar el .jasper
+            with open(f"{ruta_jasper}.sha256.tmp", "w", encoding="ascii") as f:
+                f.write(archivos[relativa]["sha256"] + "\n")
+            os.replace(f"{ruta_jasper}.sha256.tmp", f"{ruta_jasper}.sha256")
+            compilados[relativa_jasper] = {"fuente": archivos[relativa]["sha256"], "motor": motor}
+            print(f"  compilado: {relativa_jasper}")
+            continue
+        # Sin .jasper vigente ServidorReportes vuelve a compilar el .jrxml al arrancar
+        errores += 1
+        for ruta in (temporal, ruta_jasper, f"{ruta_jasper}.sha256"):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        compilados.pop(relativa_jasper, None)
+        mensaje = next((linea for linea in salida if linea.startswith(f"ERROR {relativa} ")), "sin respuesta del compilador")
+        print(f"Error al compilar '{relativa}': {mensaje}")
+    return len(pendientes) - errores, errores
+
+
+def compilar_jasper(forzar=False):
+    """Compila los .jrxml de jasper/reports tal como están (p. ej. tras un git clone en el despliegue)."""
+    manifiesto = leer_manifiesto()
+    registrar_destino(manifiesto)
+    compilados, errores = compilar_reportes(manifiesto, forzar)
+    print(f"Reportes: {compilados} compilados, {errores} errores.")
+    guardar_manifiesto(manifiesto)
+
+
+def copiar_archivos_jasper(forzar=False):
+    """Sincroniza la carpeta lib, el archivo JAR y la carpeta reports, y compila los .jrxml que cambiaron."""
 
     # 1. Crear la carpeta jasper si no existe
     if not os.path.exists(RUTA_DESTINO_JASPER):
         os.makedirs(RUTA_DESTINO_JASPER)
         print(f"Carpeta '{RUTA_DESTINO_JASPER}' creada.")
-    else:
-        print(f"Carpeta '{RUTA_DESTINO_JASPER}' ya existe.")
-
-    # 2. Copiar la carpeta lib
-    if os.path.exists(RUTA_ORIGEN_LIB):
-        if os.path.exists(RUTA_DESTINO_LIB):
-            try:
-                shutil.rmtree(RUTA_DESTINO_LIB)
-                print(f"Carpeta '{RUTA_DESTINO_LIB}' existente eliminada.")
-            except OSError as e:
-                print(f"Error al eliminar '{RUTA_DESTINO_LIB}': {e}")
-                return
 
-        try:
-            shutil.copytree(RUTA_ORIGEN_LIB, RUTA_DESTINO_LIB)
-            print(f"Carpeta '{RUTA_ORIGEN_LIB}' copiada a '{RUTA_DESTINO_LIB}'.")
-        except OSError as e:
-            print(f"Error al copiar '{RUTA_ORIGEN_LIB}' a '{RUTA_DESTINO_LIB}': {e}")
-            return
-    else:
-        print(f"La carpeta de origen '{RUTA_ORIGEN_LIB}' no existe.")
+    manifiesto = leer_manifiesto()
 
-    # 3. Copiar el archivo JAR
-    if os.path.exists(ARCHIVO_ORIGEN_JAR):
-        try:
-            shutil.copy2(ARCHIVO_ORIGEN_JAR, RUTA_DESTINO_JASPER)
-            print(f"Archivo '{ARCHIVO_ORIGEN_JAR}' copiado a '{RUTA_DESTINO_JASPER}'.")
-        except OSError as e:
-            print(f"Error al copiar '{ARCHIVO_ORIGEN_JAR}' a '{RUTA_DESTINO_JASPER}': {e}")
-            return
-    else:
-        print(f"El archivo de origen '{ARCHIVO_ORIGEN_JAR}' no existe.")
-
-    # 4. Copiar la carpeta reports
-    if os.path.exists(RUTA_ORIGEN_REPORTS):
-        if os.path.exists(RUTA_DESTINO_REPORTS):
-            try:
-                shutil.rmtree(RUTA_DESTINO_REPORTS)
-                print(f"Carpeta '{RUTA_DESTINO_REPORTS}' existente eliminada.")
-            except OSError as e:
-                print(f"Error al eliminar '{RUTA_DESTINO_REPORTS}': {e}")
-                return
+    # 2-4. Copiar la carpeta lib, el archivo JAR y la carpeta reports
+    origenes = [
+        (RUTA_ORIGEN_LIB, RUTA_DESTINO_LIB),
+        (ARCHIVO_ORIGEN_JAR, os.path.join(RUTA_DESTINO_JASPER, os.path.basename(ARCHIVO_ORIGEN_JAR))),
+        (RUTA_ORIGEN_REPORTS, RUTA_DESTINO_REPORTS),
+    ]
+    for origen, destino in origenes:
+        if not os.path.exists(origen):
+            print(f"El origen '{origen}' no existe.")
+            continue
         try:
-            shutil.copytree(RUTA_ORIGEN_REPORTS, RUTA_DESTINO_REPORTS)
-            print(f"Carpeta '{RUTA_ORIGEN_REPORTS}' copiada a '{RUTA_DESTINO_REPORTS}'.")
+            copiados, sin_cambios, eliminados = sincronizar(origen, destino, manifiesto, forzar)
         except OSError as e:
-            print(f"Error al copiar '{RUTA_ORIGEN_REPORTS}' a '{RUTA_DESTINO_REPORTS}': {e}")
+            print(f"Error al copiar '{origen}' a '{destino}': {e}")
+            guardar_manifiesto(manifiesto)
             return
-    else:
-        print(f"La carpeta de origen '{RUTA_ORIGEN_REPORTS}' no existe.")
+        print(f"'{origen}': {copiados} copiados, {sin_cambios} sin cambios, {eliminados} eliminados.")
 
-if __name__ == "__main__":
-    copiar_archivos_jasper()
-    print("Proceso de copia completado.")
+    # 5. Compilar los .jrxml que cambiaron
+    compilados, errores = compilar_reportes(manifiesto, forzar)
+    print(f"Reportes: {compilados} compilados, {errores} errores.")
+    guardar_manifiesto(manifiesto)
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sincroniza jasper/ con el proyecto luciajasper.")
+    parser.add_argument("--forzar", action="store_true", help="Copia y compila todo aunque no haya cambios")
+    parser.add_argument("--solo-compilar", action="store_true",
+                        help="No copia desde luciajasper; solo compila los .jrxml de jasper/reports")
+    args = parser.parse_args()
+    if args.solo_compilar:
+        compilar_jasper(args.forzar)
+    else:
+        copiar_archivos_jasper(args.forzar)
+        print("Proceso de copia completado.")
@@ -0,0 +1,133 @@
+import csv
+import io
+import zlib
+
+import mysql.connector
+
+from conexion_db import conexion
+
+
+# Columnas de sueldo_inicial que usa estracto_sueldo.jrxml (los nombres de sus fields)
+COLUMNAS = [
+    "id", "cedula_id", "CNIVEL", "CINSTI", "CDPTO", "AA_PLAN", "MM_PLAN", "DIGITO_ID",
+    "APEL_NOMB", "CATEGO_PSP", "CANT_RUBRO", "TURNO", "TIPO_RUBRO", "CCARGO", "PRESUP_ACT",
+    "DEVENG_ACT", "DCTO_JUB", "CAPOR_IPS", "STATUS_CRG", "CCORRES", "id_presup", "visible",
+    "aa_pago", "mm_pago", "capor_bnt", "linea", "orden", "dto_3506",
+]
+TAMANO_BLOQUE_CEDULAS = 500
+
+_SELECT_FILAS = ", ".join(f"s.{columna}" for columna in COLUMNAS)
+
+
+class DatosReporteError(Exception):
+    pass
+
+
+def filas_por_cedula(cedula):
+    """Filas de sueldo_inicial de la cédula, en el orden en que las recorre el reporte."""
+    try:
+        with conexion() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT {_SELECT_FILAS}
+                FROM sueldo_inicial s
+                WHERE s.cedula_id = %s
+                ORDER BY s.id
+            """, (cedula,))
+            filas = cursor.fetchall()
+            cursor.close()
+    except mysql.connector.Error as error:
+        raise DatosReporteError(f"Error de base de datos: {error}") from error
+    return filas
+
+
+def filas_por_celular(celular):
+    """
+    Trabajador y filas de su extracto en una sola consulta.
+
+    Devuelve (trabajador, filas); trabajador es None si no hay trabajador con
+    ese celular y filas es una lista vacía si no tiene datos cargados.
+    """
+    try:
+        with conexion() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT t.cedula AS t_cedula, t.nombres AS t_nombres, t.apellidos AS t_apellidos,
+                       {_SELECT_FILAS}
+                FROM trabajador t
+                LEFT JOIN sueldo_inicial s ON s.cedula_id = t.cedula
+                WHERE t.celular = %s
+                ORDER BY t.cedula, s.id
+            """, (celular,))
+            resultado = cursor.fetchall()
+            cursor.close()
+    except mysql.connector.Error as error:
+        raise DatosReporteError(f"Error de base de datos: {error}") from error
+
+    if not resultado:
+        return None, []
+    # Si el celular está repetido se toma el primer trabajador, como antes
+    primera = resultado[0]
+    trabajador = {
+        "cedula": primera["t_cedula"],
+        "nombres": primera["t_nombres"],
+        "apellidos": primera["t_apellidos"],
+        "celular": celular,
+    }
+    filas = [
+        {columna: fila[columna] for columna in COLUMNAS}
+        for fila in resultado
+        if fila["t_cedula"] == trabajador["cedula"] and fila["id"] is not None
+    ]
+    return trabajador, filas
+
+
+def filas_por_cedulas(cedulas):
+    """Filas de varias cédulas con una consulta por bloque; devuelve {cedula: filas}."""
+    filas = {int(cedula): [] for cedula in cedulas}
+    lista = list(filas)
+    try:
+        with conexion() as conn:
+            cursor = conn.cursor(dictionary=True)
+            for inicio in range(0, len(lista), TAMANO_BLOQUE_CEDULAS):
+                bloque = lista[inicio:inicio + TAMANO_BLOQUE_CEDULAS]
+                marcadores = ", ".join(["%s"] * len(bloque))
+                cursor.execute(f"""
+                    SELECT {_SELECT_FILAS}
+                    FROM sueldo_inicial s
+                    WHERE s.cedula_id IN ({marcadores})
+                    ORDER BY s.cedula_id, s.id
+                """, tuple(bloque))
+                for fila in cursor.fetchall():
+                    filas[int(fila["cedula_id"])].append(fila)
+            cursor.close()
+    except mysql.connector.Error as error:
+        raise DatosReporteError(f"Error de base de datos: {error}") from error
+    return filas
+
+
+def version_de_filas(filas):
+    """
+    Versión de los datos del extracto: último período, checksum y cantidad de filas.
+
+    Se calcula sobre las mismas filas que se van a imprimir, así cualquier
+    corrección (aun dentro del mismo período) cambia la versión.
+    """
+    periodo = 0
+    checksum = 0
+    for fila in filas:
+        if fila["AA_PLAN"] is not None and fila["MM_PLAN"] is not None:
+            periodo = max(periodo, int(fila["AA_PLAN"]) * 100 + int(fila["MM_PLAN"]))
+        texto = "|".join("" if fila[columna] is None else str(fila[columna]) for columna in COLUMNAS)
+        checksum = zlib.crc32(texto.encode("utf-8"), checksum)
+    return f"{periodo}-{checksum:08x}-{len(filas)}"
+
+
+def filas_a_csv(filas):
+    """CSV (UTF-8, con encabezado) para el JRCsvDataSource de ServidorReportes; NULL va vacío."""
+    salida = io.StringIO()
+    escritor = csv.writer(salida, lineterminator="\n")
+    escritor.writerow(COLUMNAS)
+    for fila in filas:
+        escritor.writerow(["" if fila[columna] is None else fila[columna] for columna in COLUMNAS])
+    return salida.getvalue().encode("utf-8")
@@ -0,0 +1,263 @@
+import os
+import sys
+import threading
+import time
+
+import mysql.connector
+
+from cache_conversaciones import CACHE_RANURAS, GeneracionesCompartidas
+from conexion_db import conectar, conexion
+
+
+# Configuración del directorio celular → trabajador
+DIRECTORIO_REFRESCO = int(os.environ.get("LUCIA_DIRECTORIO_REFRESCO", "300"))
+DIRECTORIO_TTL_NEGATIVO = int(os.environ.get("LUCIA_DIRECTORIO_TTL_NEGATIVO", "60"))
+DIRECTORIO_MAX_NEGATIVOS = 10000
+# Contadores de invalidaciones compartidos por los workers (ver invalidar)
+DIRECTORIO_GENERACIONES = os.environ.get(
+    "LUCIA_DIRECTORIO_GENERACIONES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos", "directorio.gen"),
+)
+# Clave del contador de la recarga completa
+TODOS = "*"
+TAMANO_LOTE = 5000
+
+CONSULTA_HUELLA = """
+    SELECT COUNT(*),
+           COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', celular, cedula, nombres, apellidos))), 0)
+    FROM trabajador
+"""
+
+
+class DirectorioTrabajadores:
+    """
+    Directorio en memoria de celular → (cedula, nombres, apellidos).
+
+    - Se carga completo en el proceso maestro de gunicorn (precargar) o, si
+      no, en un hilo al iniciar cada worker; mientras tanto, o si la base no
+      está disponible, las búsquedas consultan MySQL como antes.
+    - Cada `refresco` segundos se calcula una huella de la tabla trabajador
+      (cantidad de filas y checksum); solo si cambió se vuelve a cargar.
+    - Un celular que no está en el directorio se busca en la base (puede ser un
+      alta reciente) y el resultado negativo se recuerda `ttl_negativo` segundos.
+    - Las entradas son tuplas y los nombres se internan: miles de trabajadores
+      comparten los mismos nombres y apellidos.
+    - invalidar vale para todos los workers: incrementa un contador por
+      celular (GeneracionesCompartidas, como la cache de conversaciones) que
+      cada entrada guarda al crearse y se compara en cada búsqueda.
+    """
+
+    def __init__(self, refresco=DIRECTORIO_REFRESCO, ttl_negativo=DIRECTORIO_TTL_NEGATIVO, generaciones=None):
+        self.refresco = refresco
+        self.ttl_negativo = ttl_negativo
+        self._generaciones = generaciones or GeneracionesCompartidas(DIRECTORIO_GENERACIONES, CACHE_RANURAS)
+        self._recarga_vista = self._generaciones.actual(TODOS)
+        self.aciertos = 0
+        self.fallos = 0
+        self.recargas = 0
+        self._trabajadores = {}
+        self._negativos = {}
+        self._huella = None
+        self._cargado = False
+        self._cambio = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def iniciar(self):
+        """
+        Arranca la carga inicial y el refresco periódico en este proceso.
+
+        Con gunicorn se llama en post_fork: los hilos no sobreviven al fork,
+        así que nunca se arrancan en el proceso maestro. Si el maestro ya
+        precargó el directorio, el worker lo hereda y el hilo solo refresca.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._cambio = threading.Event()
+            threading.Thread(target=self._bucle, name="directorio-trabajadores", daemon=True).start()
+            self._pid = os.getpid()
+
+    def precargar(self):
+        """
+        Carga el directorio de forma sincrónica, sin hilos ni pool.
+
+        Para el proceso maestro de gunicorn (when_ready): los workers heredan
+        el directorio ya cargado (copy-on-write) en lugar de cargarlo cada uno.
+        """
+        conn = conectar()
+        try:
+            self._cargar_con(conn)
+        finally:
+            conn.close()
+
+    def buscar(self, celular):
+        """Devuelve {cedula, nombres, apellidos, celular} o None si no hay trabajador con ese celular."""
+        conocido, trabajador = self.buscar_en_memoria(celular)
+        if conocido:
+            return trabajador
+
+        try:
+            entrada = self._consultar(celular)
+        except mysql.connector.Error as error:
+            print(f"Error al conectar a la base de datos: {error}")
+            return None
+
+        trabajador = self._como_diccionario(celular, entrada) if entrada else None
+        self.recordar(celular, trabajador)
+        return trabajador
+
+    def buscar_en_memoria(self, celular):
+        """
+        Busca sin ir a la base: devuelve (conocido, trabajador).
+
+        conocido es False si el celular no está en el directorio ni entre los
+        negativos vigentes; quien llama lo consulta como prefiera y lo
+        recuerda con `recordar`.
+        """
+        self.iniciar()
+        self._revisar_recarga()
+        generacion = self._generaciones.actual(celular)
+        entrada = self._trabajadores.get(celular)
+        if entrada is not None:
+            if entrada[3] == generacion:
+                self.aciertos += 1
+                return True, self._como_diccionario(celular, entrada)
+            self._trabajadores.pop(celular, None)
+
+        negativo = self._negativos.get(celular)
+        if negativo is not None and negativo[0] > time.monotonic() and negativo[1] == generacion:
+            self.aciertos += 1
+            return True, None
+
+        self.fallos += 1
+        return False, None
+
+    def recordar(self, celular, trabajador):
+        """Guarda el resultado de una consulta hecha fuera del directorio (None = no existe)."""
+        generacion = self._generaciones.actual(celular)
+        if trabajador is None:
+            if len(self._negativos) >= DIRECTORIO_MAX_NEGATIVOS:
+                self._negativos.clear()
+            self._negativos[celular] = (time.monotonic() + self.ttl_negativo, generacion)
+            return
+        self._negativos.pop(celular, None)
+        self._trabajadores[celular] = self._entrada(
+            trabajador["cedula"], trabajador["nombres"], trabajador["apellidos"], generacion
+        )
+
+    def invalidar(self, celular=None):
+        """
+        Olvida un celular (se vuelve a consultar en la próxima búsqueda) o, sin
+        celular, recarga todo; en todos los workers.
+        """
+        self.iniciar()
+        if celular is None:
+            self._generaciones.incrementar(TODOS)
+            self._revisar_recarga()
+            return
+        self._generaciones.incrementar(celular)
+        self._trabajadores.pop(celular, None)
+        self._negativos.pop(celular, None)
+
+    def _revisar_recarga(self):
+        """Si algún worker pidió la recarga completa, vacía el directorio y lo recarga en el hilo."""
+        recarga = self._generaciones.actual(TODOS)
+        if recarga == self._recarga_vista:
+            return
+        self._recarga_vista = recarga
+        # Hasta que termine la recarga, las búsquedas van a la base
+        self._trabajadores = {}
+        self._negativos = {}
+        self._huella = None
+        self._cambio.set()
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            "cargado": self._cargado,
+            "trabajadores": len(self._trabajadores),
+            "negativos": len(self._negativos),
+            "recargas": self.recargas,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+        }
+
+    @staticmethod
+    def _como_diccionario(celular, entrada):
+        cedula, nombres, apellidos, _ = entrada
+        return {"cedula": cedula, "nombres": nombres, "apellidos": apellidos, "celular": celular}
+
+    @staticmethod
+    def _entrada(cedula, nombres, apellidos, generacion):
+        return (
+            cedula,
+            sys.intern(nombres) if isinstance(nombres, str) else nombres,
+            sys.intern(apellidos) if isinstance(apellidos, str) else apellidos,
+            generacion,
+        )
+
+    def _consultar(self, celular):
+        with conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT cedula, nombres, apellidos
+                FROM trabajador
+                WHERE celular = %s
+            """, (celular,))
+            fila = cursor.fetchone()
+            cursor.fetchall() # descarta filas restantes antes de devolver la conexión
+            cursor.close()
+        return self._entrada(*fila, self._generaciones.actual(celular)) if fila else None
+
+    def _cargar(self):
+        """Recarga el directorio completo si la huella de la tabla cambió."""
+        with conexion() as conn:
+            self._cargar_con(conn)
+
+    def _cargar_con(self, conn):
+        recarga = self._generaciones.actual(TODOS)
+        cursor = conn.cursor()
+        cursor.execute(CONSULTA_HUELLA)
+        huella = tuple(cursor.fetchone())
+        if huella == self._huella:
+            cursor.close()
+            return
+
+        trabajadores = {}
+        cursor.execute("SELECT celular, cedula, nombres, apellidos FROM trabajador WHERE celular IS NOT NULL")
+        while True:
+            filas = cursor.fetchmany(TAMANO_LOTE)
+            if not filas:
+                break
+            for celular, cedula, nombres, apellidos in filas:
+                if celular not in trabajadores:
+                    trabajadores[celular] = self._entrada(
+                        cedula, nombres, apellidos, self._generaciones.actual(celular)
+                    )
+        cursor.close()
+
+        if self._generaciones.actual(TODOS) != recarga:
+            # Se invalidó todo durante la carga: _revisar_recarga pide otra
+            return
+        self._trabajadores = trabajadores
+        self._negativos = {}
+        self._huella = huella
+        self._cargado = True
+        self.recargas += 1
+
+    def _bucle(self):
+        cambio = self._cambio
+        while True:
+            try:
+                self._cargar()
+            except Exception as error:
+                print(f"Error al cargar el directorio de trabajadores: {error}")
+            cambio.wait(self.refresco)
+            cambio.clear()
+
+
+directorio_trabajadores = DirectorioTrabajadores()
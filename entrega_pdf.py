@@ -0,0 +1,111 @@
+import os
+
+from flask import Response, abort, request, send_file
+from werkzeug.http import is_resource_modified, parse_etags
+
+from cache_reportes import CACHE_DIR, huella
+
+
+# Entrega por nginx: la respuesta solo lleva X-Accel-Redirect y nginx envía el
+# archivo desde una location interna (ver instalar_aplicacion.py)
+X_ACCEL_REDIRECT = os.environ.get("LUCIA_X_ACCEL_REDIRECT", "0") == "1"
+X_ACCEL_PREFIJO = os.environ.get("LUCIA_X_ACCEL_PREFIJO", "/interno/reportes/")
+# Cache-Control de los reportes. Con "no-cache" el cliente revalida con el ETag
+# y recibe un 304 sin que se genere nada; p. ej. "public, max-age=300" deja que el proxy_cache de nginx
+# sirva las repeticiones (los extractos tienen datos personales: ojo con "public").
+REPORTE_CACHE_CONTROL = os.environ.get("LUCIA_REPORTE_CACHE_CONTROL", "private, no-cache")
+
+PREFIJO_CACHE = "estracto_sueldo_"
+
+
+def etiqueta_reporte(clave, version, variante=None):
+    """
+    Parte del ETag que identifica los datos de un reporte, sin tocar la cache.
+
+    Es la clave (cédula o rango), la versión de los datos de sueldo_inicial y
+    la variante: lo mismo que el nombre del PDF en la cache. El ETag completo
+    le agrega el SHA-256 del archivo entregado (ver etag_reporte).
+    """
+    return "_".join(str(parte) for parte in (clave, version, variante) if parte)
+
+
+def etiqueta_de_archivo(ruta):
+    """Etiqueta de un PDF de la cache a partir de su nombre, o None si no es de la cache."""
+    nombre = os.path.basename(ruta)
+    if not nombre.startswith(PREFIJO_CACHE) or not nombre.endswith(".pdf"):
+        return None
+    return nombre[len(PREFIJO_CACHE):-len(".pdf")]
+
+
+def etag_reporte(etiqueta, resumen):
+    """ETag fuerte: la etiqueta de los datos y el comienzo del SHA-256 de los bytes."""
+    return f"{etiqueta}.{resumen[:16]}" if etiqueta else resumen[:32]
+
+
+def respuesta_no_modificada(etiqueta):
+    """
+    304 si el cliente ya tiene un PDF de esta versión de los datos; si no, None.
+
+    Se llama antes de generar el PDF, así que solo mira If-None-Match: sirve
+    cualquier ETag con la misma etiqueta, aunque los bytes sean de otra
+    generación (un PDF regenerado tras un desalojo trae los mismos datos).
+    If-Modified-Since no se evalúa acá: la fecha depende del archivo (ver
+    enviar_pdf).
+    """
+    if not etiqueta:
+        return None
+    for etag in parse_etags(request.headers.get("If-None-Match")).as_set(include_weak=True):
+        if etag == etiqueta or etag.startswith(etiqueta + "."):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = REPORTE_CACHE_CONTROL
+            return response
+    return None
+
+
+def enviar_pdf(ruta, nombre_archivo, etiqueta=None):
+    """
+    Devuelve una respuesta que envía el PDF sin cargarlo en memoria.
+
+    - Archivos de la cache con X-Accel-Redirect activo: los envía nginx,
+      que atiende Range e If-Range con el ETag de la aplicación.
+    - En otro caso se usa send_file, que aprovecha wsgi.file_wrapper
+      (sendfile en gunicorn) y responde a Range/If-Range con 206.
+    - El ETag es fuerte (etag_reporte) y Last-Modified es la fecha en que el
+      PDF se publicó en la cache: los dos cambian con cada archivo nuevo, así
+      que una descarga interrumpida se reanuda solo sobre los mismos bytes.
+    """
+    try:
+        tamano = os.path.getsize(ruta)
+    except OSError:
+        abort(500, description="El reporte generado no existe.")
+    if tamano == 0:
+        abort(500, description="El reporte generado está vacío.")
+
+    if etiqueta is None:
+        etiqueta = etiqueta_de_archivo(ruta)
+    no_modificada = respuesta_no_modificada(etiqueta)
+    if no_modificada is not None:
+        return no_modificada
+
+    resumen, fecha = huella(ruta)
+    etag = etag_reporte(etiqueta, resumen)
+    relativa = os.path.relpath(ruta, CACHE_DIR)
+    if X_ACCEL_REDIRECT and not relativa.startswith(".."):
+        # nginx no evalúa If-Modified-Since (if_modified_since off): se hace acá
+        if not is_resource_modified(request.environ, etag=etag, last_modified=fecha, ignore_if_range=True):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.last_modified = fecha
+            response.headers['Cache-Control'] = REPORTE_CACHE_CONTROL
+            return response
+        response = Response(mimetype='application/pdf')
+        response.headers['X-Accel-Redirect'] = X_ACCEL_PREFIJO + relativa
+        response.headers['Content-Disposition'] = f'inline; filename="{nombre_archivo}"'
+        response.set_etag(etag)
+        response.last_modified = fecha
+    else:
+        response = send_file(ruta, mimetype='application/pdf', download_name=nombre_archivo,
+                             conditional=True, etag=etag, last_modified=fecha)
+    response.headers['Cache-Control'] = REPORTE_CACHE_CONTROL
+    return response
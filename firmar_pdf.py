@@ -1,30 +1,50 @@
-from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
-from pyhanko.sign import signers
+import sys
+import time
+
+from servicio_firma import firmar_bytes, firmar_lote, obtener_firmador
+
+'''
+python3 firmar_pdf.py [entrada.pdf] [salida.pdf]
+python3 firmar_pdf.py --benchmark N [entrada.pdf]
+'''
 
 # Ruta al archivo PDF que quieres firmar
 pdf_path = "documento.pdf"
-# Ruta al archivo .p12
-p12_path = "3437941.p12"
-# Contraseña del certificado .p12
-password = b"Galant1998"
-# Nombre del campo de firma (opcional, se puede crear uno si no existe)
-signature_field_name = "Firma1"
+# Ruta del PDF firmado
+signed_path = "documento_firmado.pdf"
+
+
+def benchmark(cantidad, pdf_path):
+    """Mide la carga del certificado y el rendimiento de firmar N documentos."""
+    with open(pdf_path, "rb") as doc:
+        pdf_data = doc.read()
+
+    inicio = time.perf_counter()
+    obtener_firmador()
+    carga = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    firmar_lote([pdf_data] * cantidad)
+    duracion = time.perf_counter() - inicio
 
-with open(pdf_path, "rb") as doc:
-    w = IncrementalPdfFileWriter(doc)
-    signer = signers.SimpleSigner.load_pkcs12(
-        pfx_file=p12_path, passphrase=password
-    )
-    out = signers.sign_pdf(
-        w,
-        signers.PdfSignatureMetadata(field_name=signature_field_name),
-        signer=signer,
-    )
-    with open("documento_firmado.pdf", "wb") as signed_doc:
-        signed_doc.write(out.read())
+    print(f"Carga del certificado: {carga * 1000:.1f} ms (una vez por proceso)")
+    print(f"{cantidad} documentos firmados en {duracion:.3f} s")
+    print(f"{duracion / cantidad * 1000:.1f} ms por documento, {cantidad / duracion:.1f} documentos/s")
 
-print("Documento PDF firmado exitosamente como documento_firmado.pdf")
 
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--benchmark":
+        benchmark(int(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else pdf_path)
+        sys.exit(0)
 
+    if len(sys.argv) > 1:
+        pdf_path = sys.argv[1]
+    if len(sys.argv) > 2:
+        signed_path = sys.argv[2]
 
+    with open(pdf_path, "rb") as doc:
+        signed_data = firmar_bytes(doc.read())
+    with open(signed_path, "wb") as signed_doc:
+        signed_doc.write(signed_data)
 
+    print(f"Documento PDF firmado exitosamente como {signed_path}")
@@ -0,0 +1,109 @@
+import fcntl
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Configuración de la coalescencia de reportes (single-flight)
+BLOQUEOS_DIR = os.environ.get("LUCIA_BLOQUEOS_DIR", os.path.join(BASE_DIR, "datos", "bloqueos"))
+CANTIDAD_BLOQUEOS = 256
+TIMEOUT_BLOQUEO = 120
+INTERVALO_BLOQUEO = 0.05
+
+
+class GeneracionUnica:
+    """
+    Une las peticiones concurrentes que generan el mismo reporte.
+
+    - Dentro del worker, la primera petición para una clave genera y las
+      demás esperan su resultado (o su excepción) sin lanzar otra JVM.
+    - Entre workers, la generación se hace con un flock sobre uno de
+      `CANTIDAD_BLOQUEOS` archivos elegido por la clave; la función que se
+      ejecuta debe volver a mirar la cache, porque otro worker pudo haber
+      terminado el mismo reporte mientras se esperaba el bloqueo.
+    - Si el bloqueo no se obtiene en TIMEOUT_BLOQUEO segundos se genera igual.
+    """
+
+    def __init__(self, directorio=BLOQUEOS_DIR, cantidad=CANTIDAD_BLOQUEOS):
+        self.directorio = directorio
+        self.cantidad = cantidad
+        self.lideres = 0
+        self.compartidas = 0
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _inicializar(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directorio, exist_ok=True)
+            self._en_vuelo = {}
+            self._pid = os.getpid()
+
+    def ejecutar(self, clave, funcion):
+        """Ejecuta funcion() una sola vez para todas las peticiones concurrentes de `clave`."""
+        self._inicializar()
+        with self._lock:
+            futuro = self._en_vuelo.get(clave)
+            lider = futuro is None
+            if lider:
+                futuro = Future()
+                self._en_vuelo[clave] = futuro
+                self.lideres += 1
+            else:
+                self.compartidas += 1
+
+        if not lider:
+            return futuro.result()
+
+        try:
+            with self._bloqueo_entre_procesos(clave):
+                resultado = funcion()
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+
+    def _bloqueo_entre_procesos(self, clave):
+        numero = zlib.crc32(clave.encode("utf-8")) % self.cantidad
+        return _BloqueoArchivo(os.path.join(self.directorio, f"generacion_{numero:03d}.lock"))
+
+    def estadisticas(self):
+        return {"generaciones": self.lideres, "compartidas": self.compartidas}
+
+
+class _BloqueoArchivo:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o664)
+        limite = time.monotonic() + TIMEOUT_BLOQUEO
+        while True:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except BlockingIOError:
+                if time.monotonic() >= limite:
+                    print(f"No se obtuvo el bloqueo {self.ruta} en {TIMEOUT_BLOQUEO} s, se genera igual")
+                    return self
+                time.sleep(INTERVALO_BLOQUEO)
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
+        return False
+
+
+generacion_unica = GeneracionUnica()
@@ -1,5 +1,10 @@
 import os
 import subprocess
+import time
+from datos_reporte import filas_a_csv
+from metricas import etapa, registrar_error_reporte
+from renderizador_jrxml import RenderizadorError, renderizar_estracto
+from servidor_reportes import PoolServidoresReportes, ServidorNoDisponibleError, ServidorReportesError
 
 # Define tu excepción personalizada
 class ReportGenerationError(Exception):
@@ -14,37 +19,135 @@ LIB_PATH = os.path.join(JASPER_DIR, "lib", "*")  # Java maneja el * en -cp
 MAIN_CLASS = "luciareportes.GenerarReporte"
 
 JAVA_WORKING_DIR = JASPER_DIR
+# Ejecutable de Java (benchmark/java_falso.py lo reemplaza en las pruebas de carga)
+JAVA_BIN = os.environ.get("LUCIA_JAVA_BIN", "java")
+
+# "nativo": renderizador Python del jrxml (PyMuPDF), con Java como respaldo
+# "servidor": pool de JVM persistentes (ServidorReportes.java)
+# "subprocess": un proceso java por reporte (modo original)
+MODO_REPORTE = os.environ.get("LUCIA_MODO_REPORTE", "servidor")
+SERVIDOR_FUENTE = os.path.join(JASPER_DIR, "ServidorReportes.java")
+TIMEOUT_REPORTE = 45
+# Antigüedad a partir de la cual un PDF suelto en JAVA_WORKING_DIR se considera huérfano
+HUERFANOS_EDAD_MINIMA = 600
+
+_pool_servidores = PoolServidoresReportes(
+    [JAVA_BIN, "-cp", f"{JAR_PATH}:{LIB_PATH}", SERVIDOR_FUENTE],
+    cwd=JAVA_WORKING_DIR,
+)
+
+
+
+def generar_pdf_bytes(cedula, filas=None, solo_filas=False):
+    """
+    Genera el reporte de la cédula y devuelve el PDF en bytes.
+
+    El renderizador nativo y el servidor Java entregan el PDF en memoria (por
+    el pipe, con su tamaño adelante); solo el modo subprocess pasa por un
+    archivo temporal, que se lee y se borra enseguida.
+
+    Si se pasan las filas de sueldo_inicial, el renderizador nativo y el
+    servidor Java las usan como fuente de datos (CSV) en lugar de consultar
+    MySQL. GenerarReporte (modo subprocess) siempre abre su propia conexión
+    y lee todas las filas de la cédula, así que con solo_filas=True (p. ej.
+    la parte de un solo período) no se usa y se informa el error.
+    """
+    if MODO_REPORTE == "nativo":
+        try:
+            with etapa("nativo"):
+                return renderizar_estracto(cedula, filas)
+        except RenderizadorError as e:
+            print(f"Renderizador nativo no disponible para {cedula}, se usa Java: {e}")
+    if MODO_REPORTE in ("nativo", "servidor"):
+        try:
+            with etapa("java_servidor"):
+                csv = filas_a_csv(filas) if filas is not None else None
+                return _pool_servidores.generar(cedula, TIMEOUT_REPORTE, csv)
+        except ServidorNoDisponibleError as e:
+            print(f"Servidor Java no disponible, se usa subprocess: {e}")
+        except ServidorReportesError as e:
+            registrar_error_reporte("servidor")
+            raise ReportGenerationError(f"Servidor de reportes: {e}") from e
+
+    if solo_filas:
+        registrar_error_reporte("modo")
+        raise ReportGenerationError("El reporte por períodos requiere el servidor Java o el renderizador nativo.")
+
+    generated_pdf_path = _generar_con_subprocess(cedula)
+    try:
+        with etapa("lectura_pdf"):
+            with open(generated_pdf_path, "rb") as f:
+                return f.read()
+    finally:
+        with etapa("limpieza"):
+            _eliminar(generated_pdf_path)
+
+
+def limpiar_reportes_huerfanos(edad_minima=HUERFANOS_EDAD_MINIMA):
+    """
+    Borra los PDFs que Java dejó en JAVA_WORKING_DIR y nadie recogió (caídas,
+    timeouts). Solo toca archivos con más de `edad_minima` segundos, para no
+    borrar uno que se está generando. Devuelve cuántos borró.
+    """
+    borrados = 0
+    limite = time.time() - edad_minima
+    with os.scandir(JAVA_WORKING_DIR) as it:
+        for entrada in it:
+            if not (entrada.name.startswith("estracto_sueldo_") and entrada.name.endswith(".pdf")):
+                continue
+            try:
+                if entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+                    borrados += 1
+            except FileNotFoundError:
+                pass
+    return borrados
+
+
+def _eliminar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
 
 
-
-def generate_and_get_pdf_path(cedula):
+def _generar_con_subprocess(cedula):
     # Función que ejecuta el comando Java para generar el reporte
     classpath = f"{JAR_PATH}:{LIB_PATH}"
-    comando = ["java", "-cp", classpath, MAIN_CLASS, str(cedula)]
+    comando = [JAVA_BIN, "-cp", classpath, MAIN_CLASS, str(cedula)]
     generated_pdf_path = None  # Para guardar la ruta que Java devuelve
 
     try:
-        result = subprocess.run(
-            comando,
-            capture_output=True, 
-            check=True,          
-            timeout=45,          
-            text=True,           
-            encoding='utf-8',    
-            cwd=JAVA_WORKING_DIR 
-        )
+        with etapa("java_subprocess"):
+            result = subprocess.run(
+                comando,
+                capture_output=True, 
+                check=True,          
+                timeout=TIMEOUT_REPORTE,
+                text=True,           
+                encoding='utf-8',    
+                cwd=JAVA_WORKING_DIR 
+            )
 
         generated_pdf_path = result.stdout.strip()
 
         if not generated_pdf_path or not os.path.isabs(generated_pdf_path) or not os.path.exists(generated_pdf_path):
+            registrar_error_reporte("ruta_invalida")
             raise ReportGenerationError("Java no devolvió una ruta válida o el archivo no existe.")
 
         return generated_pdf_path  # Devuelve la ruta del archivo creado
 
+    except ReportGenerationError:
+        raise
+    except subprocess.TimeoutExpired as e:
+        registrar_error_reporte("timeout")
+        raise ReportGenerationError(f"Java no terminó en {TIMEOUT_REPORTE} segundos.") from e
     except subprocess.CalledProcessError as e:
+        registrar_error_reporte("java")
         error_output = e.stderr.strip() if e.stderr else "No stderr output."
         raise ReportGenerationError(f"Java process failed: {error_output}") from e
     except Exception as e:
+        registrar_error_reporte("inesperado")
         raise ReportGenerationError(f"Error inesperado en Java: {e}") from e
 
 
@@ -0,0 +1,117 @@
+import base64
+import binascii
+import os
+from datetime import datetime
+
+from conexion_db import conexion
+
+
+# Por encima de este límite la respuesta se envía en streaming
+LIMITE_STREAMING = int(os.environ.get("LUCIA_HISTORIAL_LIMITE_STREAMING", "1000"))
+# Tamaño máximo de página de la variante con cursor
+MAX_PAGINA = int(os.environ.get("LUCIA_HISTORIAL_MAX_PAGINA", "500"))
+TAMANO_LOTE = 200
+
+SIN_CONVERSACIONES = "No existen conversacines anteriores."
+
+
+class CursorInvalidoError(ValueError):
+    pass
+
+
+def formatear_registro(registro):
+    return (
+        f'- "{registro["pregunta"]}"\n'
+        f'  Respuesta: "{registro["respuesta"]}"'
+    )
+
+
+def formatear_conversaciones(registros):
+    """Arma el texto plano de las conversaciones en una sola pasada."""
+    return "\n\n".join(formatear_registro(registro) for registro in registros)
+
+
+def obtener_recientes(celular, limit):
+    """Las últimas `limit` conversaciones del celular, de la más nueva a la más vieja."""
+    with conexion() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT pregunta, respuesta
+            FROM historial_chat
+            WHERE celular = %s
+            ORDER BY fecha_registro DESC
+            LIMIT %s
+        """, (celular, limit))
+        registros = cursor.fetchall()
+        cursor.close()
+    return registros
+
+
+def iterar_recientes(celular, limit):
+    """Como obtener_recientes, pero leyendo de a TAMANO_LOTE filas para listas grandes."""
+    with conexion() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT pregunta, respuesta
+            FROM historial_chat
+            WHERE celular = %s
+            ORDER BY fecha_registro DESC
+            LIMIT %s
+        """, (celular, limit))
+        while True:
+            registros = cursor.fetchmany(TAMANO_LOTE)
+            if not registros:
+                break
+            yield registros
+        cursor.close()
+
+
+def codificar_cursor(fecha_registro, registro_id):
+    valor = f"{fecha_registro.isoformat()}|{registro_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(valor).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(token):
+    try:
+        relleno = "=" * (-len(token) % 4)
+        fecha, registro_id = base64.urlsafe_b64decode(token + relleno).decode("utf-8").split("|")
+        return datetime.fromisoformat(fecha), int(registro_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise CursorInvalidoError("Cursor inválido") from e
+
+
+def obtener_pagina(celular, limit, cursor_token=None):
+    """
+    Página de conversaciones con paginación por clave (keyset).
+
+    Recorre el índice (celular, fecha_registro) hacia atrás a partir de la
+    última fila de la página anterior, por lo que el costo no depende de
+    cuántas páginas ya se leyeron. Devuelve (registros, cursor_siguiente);
+    cursor_siguiente es None cuando no hay más.
+    """
+    limit = min(limit, MAX_PAGINA)
+    consulta = """
+        SELECT id, pregunta, respuesta, fecha_registro
+        FROM historial_chat
+        WHERE celular = %s
+    """
+    parametros = [celular]
+    if cursor_token:
+        fecha, registro_id = decodificar_cursor(cursor_token)
+        consulta += " AND (fecha_registro < %s OR (fecha_registro = %s AND id < %s))"
+        parametros += [fecha, fecha, registro_id]
+    consulta += " ORDER BY fecha_registro DESC, id DESC LIMIT %s"
+    parametros.append(limit + 1)
+
+    with conexion() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(consulta, tuple(parametros))
+        registros = cursor.fetchall()
+        cursor.close()
+
+    siguiente = None
+    if len(registros) > limit:
+        registros = registros[:limit]
+        ultimo = registros[-1]
+        siguiente = codificar_cursor(ultimo["fecha_registro"], ultimo["id"])
+    return registros, siguiente
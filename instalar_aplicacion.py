@@ -10,6 +10,10 @@ sudo SERVER_NAME="IP" python3 lucia/instalar_aplicacion.py
 
 # Ruta donde se instalará el proyecto
 PROJECT_PATH = Path("/srv/python/lucia")
+# Historial de conversaciones archivado (fuera del proyecto, que se reemplaza en cada despliegue)
+ARCHIVO_HISTORIAL_DIR = Path("/srv/python/lucia-archivo/historial_chat")
+# Cola de trabajos de reportes (también fuera del proyecto, para no perderla al redesplegar)
+TRABAJOS_DIR = Path("/srv/python/lucia-trabajos")
 
 # Obtener nombre del servidor desde variable de entorno
 SERVER_NAME = os.environ.get("SERVER_NAME")
@@ -143,6 +147,129 @@ def install_pip(venv_path):
 
 
 
+# Dimensionamiento de gunicorn (se puede forzar con LUCIA_GUNICORN_WORKERS / LUCIA_GUNICORN_HILOS)
+MEMORIA_WORKER_MB = int(os.environ.get("LUCIA_MEMORIA_WORKER_MB", "200"))
+MEMORIA_JVM_MB = int(os.environ.get("LUCIA_MEMORIA_JVM_MB", "350"))
+JVM_POR_WORKER = int(os.environ.get("LUCIA_SERVIDORES_JAVA", "2"))
+RESERVA_SISTEMA_MB = int(os.environ.get("LUCIA_RESERVA_SISTEMA_MB", "1024"))
+HILOS_POR_WORKER = int(os.environ.get("LUCIA_GUNICORN_HILOS", "4"))
+MAX_REQUESTS = 1000
+MAX_REQUESTS_JITTER = 100
+
+
+def memoria_total_mb():
+    """Memoria total del servidor en MB según /proc/meminfo."""
+    with open("/proc/meminfo") as f:
+        for linea in f:
+            if linea.startswith("MemTotal:"):
+                return int(linea.split()[1]) // 1024
+    raise RuntimeError("No se encontró MemTotal en /proc/meminfo")
+
+
+def dimensionar_gunicorn():
+    """
+    Calcula workers e hilos de gunicorn según CPUs y memoria.
+
+    Cada worker cuenta con su propio proceso Python y sus JVM de reportes
+    (LUCIA_SERVIDORES_JAVA), así que la memoria limita antes que las CPUs en
+    servidores chicos. Se reserva memoria para el sistema y MySQL.
+    """
+    cpus = os.cpu_count() or 1
+    memoria = memoria_total_mb()
+    por_worker = MEMORIA_WORKER_MB + JVM_POR_WORKER * MEMORIA_JVM_MB
+    por_memoria = max(1, (memoria - RESERVA_SISTEMA_MB) // por_worker)
+    por_cpu = 2 * cpus + 1
+
+    workers = int(os.environ.get("LUCIA_GUNICORN_WORKERS", "0")) or min(por_cpu, por_memoria)
+    return {
+        "cpus": cpus,
+        "memoria_mb": memoria,
+        "memoria_por_worker_mb": por_worker,
+        "limite_por_cpu": por_cpu,
+        "limite_por_memoria": por_memoria,
+        "workers": workers,
+        "hilos": HILOS_POR_WORKER,
+        # Reportes esperando turno por worker: siempre queda al menos un hilo para el chat
+        "cola_reportes": max(1, HILOS_POR_WORKER - JVM_POR_WORKER - 1),
+    }
+
+
+def generar_config_gunicorn(config):
+    """Módulo de configuración de gunicorn con los valores calculados en el despliegue."""
+    return f"""# Generado por instalar_aplicacion.py: {config['cpus']} CPUs, {config['memoria_mb']} MB
+# ({config['memoria_por_worker_mb']} MB estimados por worker con sus JVM de reportes)
+
+bind = "unix:{PROJECT_PATH}/lucia.sock"
+
+workers = {config['workers']}
+# gthread: los endpoints de chat esperan sobre todo a MySQL, varios hilos por worker
+worker_class = "gthread"
+threads = {config['hilos']}
+timeout = 300
+graceful_timeout = 30
+
+# Control de admisión de reportes (admision.py): tantas generaciones a la vez
+# como JVM por worker y una cola corta; el resto recibe 503 con Retry-After
+raw_env = [
+    "LUCIA_ADMISION_CAPACIDAD={JVM_POR_WORKER}",
+    "LUCIA_ADMISION_COLA={config['cola_reportes']}",
+]
+
+# La aplicación se carga una vez en el proceso maestro y los workers la
+# heredan con fork (copy-on-write); los pools se recrean por PID.
+preload_app = True
+
+# Reciclar workers de a poco para acotar la memoria sin reiniciarlos todos juntos
+max_requests = {MAX_REQUESTS}
+max_requests_jitter = {MAX_REQUESTS_JITTER}
+
+accesslog = "{PROJECT_PATH}/logs/access.log"
+errorlog = "{PROJECT_PATH}/logs/error.log"
+loglevel = "info"
+
+
+def when_ready(server):
+    # PDFs y temporales que dejó una ejecución anterior interrumpida
+    from reportes import limpiar_archivos_huerfanos
+    borrados = limpiar_archivos_huerfanos()
+    if borrados:
+        server.log.info("%s archivos huérfanos de reportes eliminados", borrados)
+
+    # Carga sincrónica, sin hilos, del directorio de trabajadores y del índice
+    # de respuestas: los workers los heredan ya cargados (copy-on-write)
+    from directorio_trabajadores import directorio_trabajadores
+    from reutilizacion_respuestas import indice_respuestas
+    for nombre, precargar in (("directorio de trabajadores", directorio_trabajadores.precargar),
+                              ("índice de respuestas", indice_respuestas.precargar)):
+        try:
+            precargar()
+        except Exception as error:
+            server.log.warning("No se pudo precargar el %s: %s", nombre, error)
+
+
+def post_fork(server, worker):
+    # Arranca en cada worker el refresco del directorio de trabajadores y del índice de
+    # respuestas, y los hilos de la cola de trabajos, que retoman los pendientes de antes
+    # del reinicio (los hilos se crean acá y no al importar wsgi, que con preload_app
+    # corre en el maestro)
+    from directorio_trabajadores import directorio_trabajadores
+    from reutilizacion_respuestas import indice_respuestas
+    from trabajos_reportes import cola_trabajos
+    directorio_trabajadores.iniciar()
+    indice_respuestas.iniciar()
+    try:
+        cola_trabajos.iniciar()
+    except Exception as error:
+        # Se reintenta en el primer uso de la cola
+        server.log.warning("No se pudo iniciar la cola de trabajos: %s", error)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+"""
+
+
 def main():
     print("🔧 Iniciando despliegue del proyecto Lucia...")
     
@@ -176,7 +303,33 @@ def main():
     run(f"{venv_path}/bin/pip install --upgrade pip")
     run(f"{venv_path}/bin/pip install -r {PROJECT_PATH}/requirements.txt")
 
-    # 4. Crear servicio systemd para Gunicorn
+    # Plantillas de Jasper precompiladas (.jasper): las JVM de reportes no compilan el jrxml al arrancar
+    print("📄 Compilando plantillas de reportes...")
+    run(f"cd {PROJECT_PATH} && {venv_path}/bin/python copiar_jasper.py --solo-compilar")
+
+    # Migraciones de esquema en línea (índices, tablas auxiliares). Las que
+    # bloquean escrituras (particionar historial_chat) no se aplican acá: se
+    # listan como pendientes y se corren con --mantenimiento fuera de horario.
+    print("🗄️ Aplicando migraciones de base de datos...")
+    run(f"cd {PROJECT_PATH} && {venv_path}/bin/python migraciones.py")
+
+    # 4. Configuración de gunicorn según el hardware
+    print("📐 Dimensionando gunicorn...")
+    config = dimensionar_gunicorn()
+    with open(PROJECT_PATH / "gunicorn_conf.py", "w") as f:
+        f.write(generar_config_gunicorn(config))
+    print(f"   CPUs: {config['cpus']} | Memoria: {config['memoria_mb']} MB "
+          f"(~{config['memoria_por_worker_mb']} MB por worker con {JVM_POR_WORKER} JVM)")
+    print(f"   Límite por CPU: {config['limite_por_cpu']} | Límite por memoria: {config['limite_por_memoria']}")
+    print(f"   ➜ workers={config['workers']} threads={config['hilos']} worker_class=gthread "
+          f"preload_app=True max_requests={MAX_REQUESTS}±{MAX_REQUESTS_JITTER}")
+    print(f"   ➜ reportes por worker: {JVM_POR_WORKER} a la vez, cola de {config['cola_reportes']}")
+
+    # Base de la cola de trabajos de reportes, que sobrevive a los despliegues
+    run(f"sudo mkdir -p {TRABAJOS_DIR}")
+    run(f"sudo chown {deploy_user}:www-data {TRABAJOS_DIR}")
+
+    # 5. Crear servicio systemd para Gunicorn
     print("⚙️ Creando archivo de servicio systemd...")
     
     lucia_service = f"""[Unit]
@@ -190,14 +343,19 @@ WorkingDirectory={PROJECT_PATH}
 Environment="PATH=/usr/bin:/bin:/usr/local/bin:{PROJECT_PATH}/venv/bin"
 Environment="PYTHONPATH={PROJECT_PATH}"
 Environment="HOME=/home/{deploy_user}"  # Importante para permisos
-ExecStart={PROJECT_PATH}/venv/bin/gunicorn \
-        --workers 1 \
-        --timeout 300 \
-        --bind unix:{PROJECT_PATH}/lucia.sock \
-        --access-logfile {PROJECT_PATH}/logs/access.log \
-        --error-logfile {PROJECT_PATH}/logs/error.log \
-        --log-level debug \
-        wsgi:app
+Environment="LUCIA_X_ACCEL_REDIRECT=1"
+Environment="PROMETHEUS_MULTIPROC_DIR={PROJECT_PATH}/datos/prometheus"
+Environment="LUCIA_HISTORIAL_ARCHIVO_DIR={ARCHIVO_HISTORIAL_DIR}"
+Environment="LUCIA_TRABAJOS_DB={TRABAJOS_DIR}/trabajos.db"
+# Cache de conversaciones y directorio de trabajadores por worker; los registros y
+# las invalidaciones llegan a todos los workers con contadores compartidos en
+# /run/lucia (tmpfs, se vacía en cada reinicio)
+RuntimeDirectory=lucia
+Environment="LUCIA_CACHE_CONVERSACIONES_BACKEND=memoria"
+Environment="LUCIA_CACHE_CONVERSACIONES_GENERACIONES=/run/lucia/conversaciones.gen"
+Environment="LUCIA_DIRECTORIO_GENERACIONES=/run/lucia/directorio.gen"
+ExecStartPre=/bin/rm -rf {PROJECT_PATH}/datos/prometheus
+ExecStart={PROJECT_PATH}/venv/bin/gunicorn --config {PROJECT_PATH}/gunicorn_conf.py wsgi:app
 Restart=always
 RestartSec=10
 
@@ -210,13 +368,90 @@ WantedBy=multi-user.target
         f.write(lucia_service)
     run("sudo mv /tmp/lucia.service /etc/systemd/system/lucia.service")
 
-    # 5. Habilitar y reiniciar el servicio
+    # 6. Habilitar y reiniciar el servicio
     print("🔁 Activando servicio lucia...")
     run("sudo systemctl daemon-reload")
     run("sudo systemctl enable lucia")
     run("sudo systemctl restart lucia")
 
-    # 6. Configurar Nginx
+    # Pre-renderizado de extractos al cargarse un período nuevo (cada 15 minutos)
+    print("🗓️ Creando timer de pre-renderizado...")
+    prerender_service = f"""[Unit]
+Description=Pre-renderizado de extractos de Lucia
+After=network.target lucia.service
+
+[Service]
+Type=oneshot
+User={deploy_user}
+Group=www-data
+WorkingDirectory={PROJECT_PATH}
+Environment="PYTHONPATH={PROJECT_PATH}"
+Environment="HOME=/home/{deploy_user}"
+Environment="PROMETHEUS_MULTIPROC_DIR={PROJECT_PATH}/datos/prometheus"
+Nice=10
+IOSchedulingClass=idle
+ExecStart={PROJECT_PATH}/venv/bin/python prerenderizado.py
+"""
+    prerender_timer = """[Unit]
+Description=Detecta períodos nuevos y pre-renderiza los extractos de Lucia
+
+[Timer]
+OnBootSec=5min
+OnUnitActiveSec=15min
+
+[Install]
+WantedBy=timers.target
+"""
+    with open("/tmp/lucia-prerender.service", "w") as f:
+        f.write(prerender_service)
+    with open("/tmp/lucia-prerender.timer", "w") as f:
+        f.write(prerender_timer)
+    run("sudo mv /tmp/lucia-prerender.service /etc/systemd/system/lucia-prerender.service")
+    run("sudo mv /tmp/lucia-prerender.timer /etc/systemd/system/lucia-prerender.timer")
+    run("sudo systemctl daemon-reload")
+    run("sudo systemctl enable --now lucia-prerender.timer")
+
+    # Retención de historial_chat: particiones mensuales y archivo de las viejas (diario).
+    # El archivo vive fuera del proyecto, que se borra en cada despliegue.
+    print("🗓️ Creando timer de archivo del historial...")
+    run(f"sudo mkdir -p {ARCHIVO_HISTORIAL_DIR}")
+    run(f"sudo chown {deploy_user}:www-data {ARCHIVO_HISTORIAL_DIR}")
+    archivo_service = f"""[Unit]
+Description=Archivo del historial de conversaciones de Lucia
+After=network.target
+
+[Service]
+Type=oneshot
+User={deploy_user}
+Group=www-data
+WorkingDirectory={PROJECT_PATH}
+Environment="PYTHONPATH={PROJECT_PATH}"
+Environment="HOME=/home/{deploy_user}"
+Environment="LUCIA_HISTORIAL_ARCHIVO_DIR={ARCHIVO_HISTORIAL_DIR}"
+Nice=10
+IOSchedulingClass=idle
+ExecStart={PROJECT_PATH}/venv/bin/python archivo_historial.py
+"""
+    archivo_timer = """[Unit]
+Description=Crea particiones y archiva el historial viejo de Lucia
+
+[Timer]
+OnCalendar=*-*-* 03:30:00
+Persistent=true
+
+[Install]
+WantedBy=timers.target
+"""
+    with open("/tmp/lucia-archivo-historial.service", "w") as f:
+        f.write(archivo_service)
+    with open("/tmp/lucia-archivo-historial.timer", "w") as f:
+        f.write(archivo_timer)
+    run("sudo mv /tmp/lucia-archivo-historial.service /etc/systemd/system/lucia-archivo-historial.service")
+    run("sudo mv /tmp/lucia-archivo-historial.timer /etc/systemd/system/lucia-archivo-historial.timer")
+    run("sudo systemctl daemon-reload")
+    run("sudo systemctl enable --now lucia-archivo-historial.timer")
+
+    # 7. Configurar Nginx
     print("🌐 Configurando Nginx...")
     nginx_conf = f"""server {{
     listen 80;
@@ -226,6 +461,22 @@ WantedBy=multi-user.target
         include proxy_params;
         proxy_pass http://unix:{PROJECT_PATH}/lucia.sock;
     }}
+
+    # PDFs de la cache entregados por nginx vía X-Accel-Redirect
+    location /interno/reportes/ {{
+        internal;
+        alias {PROJECT_PATH}/datos/cache_reportes/;
+        sendfile on;
+        tcp_nopush on;
+        # Se usan el ETag (fuerte: versión de los datos y SHA-256 del PDF) y el
+        # Last-Modified (publicación en la cache) de la aplicación, no los del
+        # archivo, cuya fecha cambia con cada acierto. nginx atiende Range e
+        # If-Range contra ese ETag; If-None-Match ya lo evaluó la aplicación
+        etag off;
+        if_modified_since off;
+        add_header ETag $upstream_http_etag;
+        add_header Last-Modified $upstream_http_last_modified;
+    }}
 }}
 """
     with open("/tmp/lucia", "w") as f:
@@ -0,0 +1,37 @@
+import net.sf.jasperreports.engine.JasperCompileManager;
+
+/**
+ * Compila plantillas .jrxml a .jasper; lo usa copiar_jasper.py al sincronizar.
+ *
+ * Recibe pares de argumentos <entrada.jrxml> <salida.jasper> y responde una
+ * línea por plantilla en stdout:
+ *
+ *   OK <entrada.jrxml>
+ *   ERROR <entrada.jrxml> <mensaje>
+ *
+ * Una plantilla con errores no impide compilar las demás. Se ejecuta en modo
+ * archivo fuente (Java 11+), con el mismo classpath que ServidorReportes:
+ *
+ *   java -cp luciajasper.jar:lib/* CompilarReportes.java reports/estracto_sueldo.jrxml reports/estracto_sueldo.jasper
+ */
+public class CompilarReportes {
+
+    public static void main(String[] args) {
+        if (args.length == 0 || args.length % 2 != 0) {
+            System.err.println("Uso: CompilarReportes <entrada.jrxml> <salida.jasper> [...]");
+            System.exit(2);
+        }
+        int errores = 0;
+        for (int i = 0; i < args.length; i += 2) {
+            try {
+                JasperCompileManager.compileReportToFile(args[i], args[i + 1]);
+                System.out.println("OK " + args[i]);
+            } catch (Exception e) {
+                e.printStackTrace(System.err);
+                System.out.println("ERROR " + args[i] + " " + String.valueOf(e.getMessage()).replace('\n', ' '));
+                errores++;
+            }
+        }
+        System.exit(errores == 0 ? 0 : 1);
+    }
+}
@@ -0,0 +1,201 @@
+import java.io.BufferedInputStream;
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.security.MessageDigest;
+import java.sql.Connection;
+import java.util.HashMap;
+
+import luciareportes.MySqlConnection;
+import net.sf.jasperreports.engine.JasperCompileManager;
+import net.sf.jasperreports.engine.JasperExportManager;
+import net.sf.jasperreports.engine.JasperFillManager;
+import net.sf.jasperreports.engine.JasperPrint;
+import net.sf.jasperreports.engine.JasperReport;
+import net.sf.jasperreports.engine.data.JRCsvDataSource;
+import net.sf.jasperreports.engine.util.JRLoader;
+
+/**
+ * Servidor de reportes de larga duración.
+ *
+ * Carga estracto_sueldo.jasper, que precompila copiar_jasper.py (también
+ * en el despliegue); si no existe, no corresponde al .jrxml actual o no se
+ * puede cargar, compila el .jrxml una sola vez. Lee un pedido por línea
+ * en stdin y responde en stdout:
+ *
+ *   CSV <cedula> <n>  ->  seguido de n bytes de CSV (UTF-8, con encabezado)
+ *                         con las filas del reporte, que ya consultó Python;
+ *                         responde como PDF, sin tocar MySQL
+ *   PDF <cedula>      ->  PDF <cantidad de bytes>, salto de línea y el PDF
+ *                         (sin archivo intermedio)
+ *   <cedula>          ->  OK <ruta absoluta del pdf>  (archivo temporal)
+ *   cualquiera        ->  ERROR <mensaje>
+ *
+ * La conexión JDBC solo se abre con el primer pedido que la necesita (PDF o
+ * la cédula sola) y se mantiene abierta.
+ *
+ * Al terminar de iniciar escribe "LISTO". Se ejecuta en modo archivo fuente
+ * (Java 11+), sin compilación previa:
+ *
+ *   java -cp luciajasper.jar:lib/* ServidorReportes.java
+ */
+public class ServidorReportes {
+
+    private static Connection conn;
+
+    public static void main(String[] args) throws Exception {
+        // stdout queda reservado para el protocolo; cualquier otra salida va a stderr
+        PrintStream protocolo = new PrintStream(new FileOutputStream(java.io.FileDescriptor.out), true, "UTF-8");
+        System.setOut(System.err);
+
+        String reportPathBase = System.getProperty("user.dir");
+        String reportResourcePath = reportPathBase + "/reports";
+        File directorioSalida = new File(reportPathBase);
+
+        JasperReport jasperReport = cargarPlantilla(reportResourcePath + "/estracto_sueldo");
+
+        protocolo.println("LISTO");
+
+        // Entrada en bytes: el pedido CSV trae datos binarios después de la línea
+        InputStream entrada = new BufferedInputStream(System.in, 65536);
+        String linea;
+        while ((linea = leerLinea(entrada)) != null) {
+            linea = linea.trim();
+            if (linea.isEmpty()) {
+                continue;
+            }
+            byte[] csv = null;
+            boolean enBytes = linea.startsWith("PDF ");
+            if (enBytes) {
+                linea = linea.substring(4).trim();
+            } else if (linea.startsWith("CSV ")) {
+                String[] partes = linea.substring(4).trim().split("\\s+");
+                if (partes.length != 2 || !partes[1].matches("\\d{1,9}")) {
+                    // sin el tamaño no se puede seguir leyendo el protocolo
+                    protocolo.println("ERROR Pedido CSV invalido - " + linea);
+                    break;
+                }
+                csv = leerBytes(entrada, Integer.parseInt(partes[1]));
+                enBytes = true;
+                linea = partes[0];
+            }
+            try {
+                int cedula = Integer.parseInt(linea);
+
+                HashMap<String, Object> parameters = new HashMap<>();
+                parameters.put("par_cedula", cedula);
+                parameters.put("report_path", reportResourcePath);
+
+                JasperPrint jasperPrint;
+                if (csv != null) {
+                    JRCsvDataSource datos = new JRCsvDataSource(new ByteArrayInputStream(csv), "UTF-8");
+                    datos.setUseFirstRowAsHeader(true);
+                    jasperPrint = JasperFillManager.fillReport(jasperReport, parameters, datos);
+                } else {
+                    jasperPrint = JasperFillManager.fillReport(jasperReport, parameters, conexion());
+                }
+
+                if (enBytes) {
+                    byte[] pdf = JasperExportManager.exportReportToPdf(jasperPrint);
+                    protocolo.print("PDF " + pdf.length + "\n");
+                    protocolo.write(pdf);
+                    protocolo.flush();
+                    continue;
+                }
+
+                File salida = File.createTempFile(
+                        "estracto_sueldo_" + cedula + "_", ".pdf", directorioSalida);
+                JasperExportManager.exportReportToPdfFile(jasperPrint, salida.getAbsolutePath());
+                protocolo.println("OK " + salida.getAbsolutePath());
+            } catch (NumberFormatException nfe) {
+                protocolo.println("ERROR Cedula invalida - " + linea);
+            } catch (Exception e) {
+                e.printStackTrace(System.err);
+                protocolo.println("ERROR " + String.valueOf(e.getMessage()).replace('\n', ' '));
+            }
+        }
+
+        if (conn != null) {
+            conn.close();
+        }
+    }
+
+    /**
+     * Plantilla compilada (.jasper) si está al día; si no, compila el .jrxml.
+     *
+     * Está al día si el SHA-256 del .jrxml coincide con el que anotó
+     * copiar_jasper.py al compilarla (<plantilla>.jasper.sha256); las fechas
+     * no sirven porque tras un git clone son las del checkout.
+     */
+    private static JasperReport cargarPlantilla(String base) throws Exception {
+        File jrxml = new File(base + ".jrxml");
+        File compilado = new File(base + ".jasper");
+        File hashCompilado = new File(base + ".jasper.sha256");
+        if (compilado.isFile() && hashCompilado.isFile()) {
+            try {
+                String esperado = new String(Files.readAllBytes(hashCompilado.toPath()), StandardCharsets.US_ASCII).trim();
+                if (esperado.equals(sha256(jrxml))) {
+                    return (JasperReport) JRLoader.loadObject(compilado);
+                }
+                System.err.println(compilado + " no corresponde al jrxml actual, se compila el jrxml");
+            } catch (Exception e) {
+                // compilado con otra versión de JasperReports, por ejemplo
+                System.err.println("No se pudo cargar " + compilado + ", se compila el jrxml: " + e.getMessage());
+            }
+        }
+        return JasperCompileManager.compileReport(jrxml.getPath());
+    }
+
+    /** SHA-256 de un archivo en hexadecimal (minúsculas, como hashlib). */
+    private static String sha256(File archivo) throws Exception {
+        byte[] digest = MessageDigest.getInstance("SHA-256").digest(Files.readAllBytes(archivo.toPath()));
+        StringBuilder hexa = new StringBuilder(digest.length * 2);
+        for (byte b : digest) {
+            hexa.append(String.format("%02x", b));
+        }
+        return hexa.toString();
+    }
+
+    /** Lee una línea (UTF-8) hasta el salto de línea; null al cerrarse stdin. */
+    private static String leerLinea(InputStream entrada) throws IOException {
+        ByteArrayOutputStream linea = new ByteArrayOutputStream(64);
+        int b;
+        while ((b = entrada.read()) != -1) {
+            if (b == '\n') {
+                return linea.toString(StandardCharsets.UTF_8.name());
+            }
+            linea.write(b);
+        }
+        return linea.size() > 0 ? linea.toString(StandardCharsets.UTF_8.name()) : null;
+    }
+
+    /** Lee exactamente n bytes de stdin. */
+    private static byte[] leerBytes(InputStream entrada, int n) throws IOException {
+        byte[] datos = entrada.readNBytes(n);
+        if (datos.length != n) {
+            throw new IOException("stdin cerrado a mitad de un pedido CSV");
+        }
+        return datos;
+    }
+
+    /** Devuelve la conexión abierta, reconectando si MySQL la cerró. */
+    private static Connection conexion() throws Exception {
+        if (conn == null || !conn.isValid(2)) {
+            try {
+                if (conn != null) {
+                    conn.close();
+                }
+            } catch (Exception e) {
+                // la conexión ya estaba rota
+            }
+            conn = MySqlConnection.getConnection();
+        }
+        return conn;
+    }
+}
@@ -0,0 +1,198 @@
+import os
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+import fitz
+import mysql.connector
+
+from conexion_db import conexion
+from datos_reporte import DatosReporteError, filas_por_cedulas
+from reportes import obtener_reporte
+
+
+# Configuración de los lotes de reportes
+LOTE_CONCURRENCIA = int(os.environ.get("LUCIA_LOTE_CONCURRENCIA", "2"))
+LOTE_MAX_PENDIENTES = int(os.environ.get("LUCIA_LOTE_MAX_PENDIENTES", "8"))
+LOTE_MAX_CEDULAS = int(os.environ.get("LUCIA_LOTE_MAX_CEDULAS", "2000"))
+LOTE_MAX_CEDULAS_PDF = int(os.environ.get("LUCIA_LOTE_MAX_CEDULAS_PDF", "300"))
+LOTE_TAMANO_PRECARGA = 100
+TAMANO_BLOQUE = 64 * 1024
+
+
+class LoteError(Exception):
+    pass
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _obtener_executor():
+    """Pool de hilos compartido por todos los lotes del worker (se crea tras el fork)."""
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=LOTE_CONCURRENCIA, thread_name_prefix="lote")
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def cedulas_por_departamento(cdpto, cinsti=None):
+    """Cédulas con datos en sueldo_inicial para un departamento (y opcionalmente una institución)."""
+    consulta = "SELECT DISTINCT cedula_id FROM sueldo_inicial WHERE CDPTO = %s"
+    parametros = [cdpto]
+    if cinsti is not None:
+        consulta += " AND CINSTI = %s"
+        parametros.append(cinsti)
+    consulta += " ORDER BY cedula_id"
+
+    try:
+        with conexion() as conn:
+            cursor = conn.cursor()
+            cursor.execute(consulta, tuple(parametros))
+            cedulas = [fila[0] for fila in cursor.fetchall()]
+            cursor.close()
+    except mysql.connector.Error as error:
+        raise LoteError(f"Error de base de datos: {error}") from error
+    return cedulas
+
+
+def validar_cedulas(cedulas, formato):
+    limite = LOTE_MAX_CEDULAS_PDF if formato == "pdf" else LOTE_MAX_CEDULAS
+    if not cedulas:
+        raise LoteError("No hay cédulas para generar")
+    if len(cedulas) > limite:
+        raise LoteError(f"El lote supera el máximo de {limite} cédulas para formato {formato}")
+
+
+def generar_lote(cedulas, ordenado=False, firmado=False):
+    """
+    Genera los reportes en paralelo y produce (cedula, ruta, error) a medida que terminan.
+
+    Nunca hay más de LUCIA_LOTE_MAX_PENDIENTES reportes en vuelo por lote, de
+    modo que un lote grande no acapara el pool ni acumula resultados en memoria.
+    Con ordenado=True los resultados salen en el mismo orden de las cédulas.
+    Las filas de cada reporte se leen por tandas, no una consulta por cédula.
+    """
+    executor = _obtener_executor()
+    restantes = _con_filas(cedulas)
+    en_vuelo = deque()
+
+    def enviar():
+        for cedula, filas in restantes:
+            en_vuelo.append((cedula, executor.submit(obtener_reporte, cedula, firmado, filas, True)))
+            return True
+        return False
+
+    for _ in range(LOTE_MAX_PENDIENTES):
+        if not enviar():
+            break
+
+    while en_vuelo:
+        if ordenado:
+            cedula, futuro = en_vuelo.popleft()
+            futuro.exception()
+        else:
+            wait([f for _, f in en_vuelo], return_when=FIRST_COMPLETED)
+            cedula, futuro = next((c, f) for c, f in en_vuelo if f.done())
+            en_vuelo.remove((cedula, futuro))
+        enviar()
+
+        try:
+            ruta = futuro.result()
+        except Exception as e:
+            yield cedula, None, str(e)
+        else:
+            yield cedula, ruta, None
+
+
+def _con_filas(cedulas):
+    """
+    Produce (cedula, filas) leyendo las filas de LOTE_TAMANO_PRECARGA cédulas por consulta.
+
+    Si la consulta de una tanda falla, sus cédulas salen con filas None y
+    cada reporte consulta las suyas como antes.
+    """
+    iterador = iter(cedulas)
+    while True:
+        tanda = list(islice(iterador, LOTE_TAMANO_PRECARGA))
+        if not tanda:
+            return
+        try:
+            filas = filas_por_cedulas(tanda)
+        except DatosReporteError as error:
+            print(f"No se pudieron precargar las filas del lote: {error}")
+            filas = {}
+        for cedula in tanda:
+            yield cedula, filas.get(int(cedula))
+
+
+class _SalidaZip:
+    """Destino no posicionable para zipfile: acumula bytes hasta que el generador los entrega."""
+
+    def __init__(self):
+        self.pendiente = bytearray()
+
+    def write(self, datos):
+        self.pendiente += datos
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = bytes(self.pendiente)
+        self.pendiente.clear()
+        return datos
+
+
+def zip_en_streaming(cedulas, firmado=False):
+    """Genera un ZIP con un PDF por cédula, emitiendo cada parte apenas está lista."""
+    salida = _SalidaZip()
+    errores = []
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_STORED) as archivo_zip:
+        for cedula, ruta, error in generar_lote(cedulas, firmado=firmado):
+            if error:
+                errores.append(f"{cedula}: {error}")
+                continue
+            with open(ruta, "rb") as pdf, archivo_zip.open(f"estracto_sueldo_{cedula}.pdf", "w") as destino:
+                while True:
+                    bloque = pdf.read(TAMANO_BLOQUE)
+                    if not bloque:
+                        break
+                    destino.write(bloque)
+                    yield salida.vaciar()
+            yield salida.vaciar()
+
+        if errores:
+            archivo_zip.writestr("errores.txt", "\n".join(errores) + "\n")
+    yield salida.vaciar()
+
+
+def pdf_combinado(cedulas):
+    """
+    Une los reportes en un único PDF, en el orden de las cédulas.
+
+    Las partes se agregan a medida que terminan; el documento final solo
+    puede escribirse cuando están todas, por eso este formato tiene un
+    límite de cédulas menor que el ZIP.
+    """
+    documento = fitz.open()
+    errores = []
+    try:
+        for cedula, ruta, error in generar_lote(cedulas, ordenado=True):
+            if error:
+                errores.append(f"{cedula}: {error}")
+                continue
+            with fitz.open(ruta) as parte:
+                documento.insert_pdf(parte)
+        if documento.page_count == 0:
+            raise LoteError("No se pudo generar ningún reporte del lote: " + "; ".join(errores))
+        return documento.tobytes(garbage=3, deflate=True), errores
+    finally:
+        documento.close()
@@ -0,0 +1,97 @@
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modo multiproceso de prometheus_client: cada worker de gunicorn escribe sus
+# métricas en este directorio y /metrics las suma. Debe definirse antes de
+# importar prometheus_client y vaciarse al arrancar el servicio.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(BASE_DIR, "datos", "prometheus"))
+METRICAS_DIR = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+os.makedirs(METRICAS_DIR, exist_ok=True)
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess  # noqa: E402
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+PETICIONES = Histogram(
+    "lucia_peticion_segundos", "Duración de las peticiones HTTP por ruta.",
+    ["ruta", "metodo", "estado"], buckets=BUCKETS,
+)
+ETAPAS = Histogram(
+    "lucia_etapa_segundos", "Duración de cada etapa de la generación de reportes.",
+    ["etapa"], buckets=BUCKETS,
+)
+ERRORES_REPORTE = Counter(
+    "lucia_errores_reporte", "Errores de generación de reportes (ReportGenerationError) por causa.",
+    ["causa"],
+)
+
+COLA_ADMISION = Gauge(
+    "lucia_admision_cola", "Peticiones esperando turno para generar un reporte.",
+    multiprocess_mode="livesum",
+)
+ACTIVAS_ADMISION = Gauge(
+    "lucia_admision_activas", "Reportes generándose en este momento.",
+    multiprocess_mode="livesum",
+)
+ESPERA_ADMISION = Histogram(
+    "lucia_admision_espera_segundos", "Espera hasta obtener turno para generar un reporte.",
+    buckets=BUCKETS,
+)
+RECHAZOS_ADMISION = Counter(
+    "lucia_admision_rechazos", "Peticiones de reporte rechazadas con 503 por sobrecarga, por motivo.",
+    ["motivo"],
+)
+
+
+@contextmanager
+def etapa(nombre):
+    """
+    Mide un bloque como etapa `nombre`: lo registra en el histograma y, dentro
+    de una petición, lo suma a la cabecera Server-Timing de la respuesta.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        ETAPAS.labels(nombre).observe(duracion)
+        if has_request_context():
+            tiempos = g.setdefault("tiempos_etapas", {})
+            tiempos[nombre] = tiempos.get(nombre, 0.0) + duracion
+
+
+def registrar_error_reporte(causa):
+    ERRORES_REPORTE.labels(causa).inc()
+
+
+def iniciar_peticion():
+    g.inicio_peticion = time.perf_counter()
+
+
+def finalizar_peticion(response, ruta, metodo):
+    """Registra la duración de la petición y agrega la cabecera Server-Timing."""
+    inicio = g.pop("inicio_peticion", None)
+    if inicio is None:
+        return response
+    total = time.perf_counter() - inicio
+    PETICIONES.labels(ruta or "sin_ruta", metodo, str(response.status_code)).observe(total)
+
+    tiempos = g.pop("tiempos_etapas", {})
+    partes = [f"{nombre};dur={segundos * 1000:.1f}" for nombre, segundos in tiempos.items()]
+    partes.append(f"total;dur={total * 1000:.1f}")
+    response.headers["Server-Timing"] = ", ".join(partes)
+    return response
+
+
+def exportar():
+    """Métricas de todos los workers en formato de texto de Prometheus."""
+    registro = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registro)
+    return generate_latest(registro), CONTENT_TYPE_LATEST
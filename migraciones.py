@@ -0,0 +1,105 @@
+import sys
+
+import mysql.connector
+
+from archivo_historial import particionado_inicial
+from conexion_db import conectar
+
+'''
+python3 migraciones.py                  # migraciones en línea (las aplica el despliegue)
+python3 migraciones.py --mantenimiento  # también las que bloquean escrituras (ventana de mantenimiento)
+'''
+
+# Migraciones en orden de aplicación: (nombre, [sentencias]). Una sentencia
+# puede ser una función que recibe el cursor y devuelve el SQL, cuando depende
+# de los datos. Nunca modificar una migración ya publicada; agregar una nueva al final.
+MIGRACIONES = [
+    ("0001_indice_historial_celular_fecha", [
+        """
+        ALTER TABLE historial_chat
+            ADD INDEX idx_historial_celular_fecha (celular, fecha_registro),
+            ALGORITHM=INPLACE, LOCK=NONE
+        """,
+    ]),
+    # Particiones mensuales por fecha_registro (ver archivo_historial.py). La
+    # clave primaria debe incluir la columna de partición. Crea ya un mes por
+    # partición, así el timer de archivo_historial.py solo agrega meses vacíos.
+    # Reconstruye la tabla completa (una copia, en un solo ALTER) y bloquea las
+    # escrituras mientras tanto: es de MIGRACIONES_MANTENIMIENTO.
+    ("0002_particionar_historial_chat", [
+        lambda cursor: f"""
+        ALTER TABLE historial_chat
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, fecha_registro)
+            {particionado_inicial(cursor)}
+        """,
+    ]),
+]
+
+
+# Migraciones que copian la tabla y bloquean las escrituras del chat: el
+# despliegue no las aplica; se corren a mano con --mantenimiento en una ventana
+# sin tráfico. Las migraciones posteriores no deben depender de ellas.
+MIGRACIONES_MANTENIMIENTO = {"0002_particionar_historial_chat"}
+
+
+def migraciones_aplicadas(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migraciones (
+            nombre VARCHAR(100) PRIMARY KEY,
+            aplicada TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT nombre FROM schema_migraciones")
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def aplicar_migraciones(mantenimiento=False):
+    """
+    Aplica las migraciones pendientes; devuelve (aplicadas, postergadas).
+
+    Un bloqueo con nombre (GET_LOCK) evita que dos despliegues o workers las
+    ejecuten a la vez. Los índices se crean en línea (INPLACE, LOCK=NONE)
+    para no bloquear las escrituras del chatbot; las de
+    MIGRACIONES_MANTENIMIENTO solo se aplican con mantenimiento=True.
+    """
+    conn = conectar()
+    cursor = conn.cursor()
+    aplicadas = []
+    postergadas = []
+    try:
+        cursor.execute("SELECT GET_LOCK('lucia_migraciones', 300)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("No se pudo obtener el bloqueo de migraciones")
+
+        ya_aplicadas = migraciones_aplicadas(cursor)
+        for nombre, sentencias in MIGRACIONES:
+            if nombre in ya_aplicadas:
+                continue
+            if nombre in MIGRACIONES_MANTENIMIENTO and not mantenimiento:
+                postergadas.append(nombre)
+                continue
+            print(f"Aplicando migración {nombre}...")
+            for sentencia in sentencias:
+                cursor.execute(sentencia(cursor) if callable(sentencia) else sentencia)
+            cursor.execute("INSERT INTO schema_migraciones (nombre) VALUES (%s)", (nombre,))
+            conn.commit()
+            aplicadas.append(nombre)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('lucia_migraciones')")
+        cursor.fetchall()
+        cursor.close()
+        conn.close()
+    return aplicadas, postergadas
+
+
+if __name__ == "__main__":
+    try:
+        aplicadas, postergadas = aplicar_migraciones(mantenimiento="--mantenimiento" in sys.argv)
+    except mysql.connector.Error as err:
+        print(f"❌ Error al aplicar migraciones: {err}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ {len(aplicadas)} migraciones aplicadas." if aplicadas else "✅ Esquema al día.")
+    if postergadas:
+        print(f"⚠️ Pendientes que bloquean escrituras: {', '.join(postergadas)}. "
+              "Aplicarlas en una ventana de mantenimiento con: python3 migraciones.py --mantenimiento")
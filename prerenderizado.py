@@ -0,0 +1,208 @@
+"""
+Pre-renderizado de los extractos cuando se carga un período nuevo en sueldo_inicial.
+
+Pensado para ejecutarse periódicamente (timer de systemd, ver
+instalar_aplicacion.py): si el último período (AA_PLAN/MM_PLAN) ya está
+pre-renderizado termina enseguida; si no, genera el extracto de cada cédula
+de ese período con prioridad baja y concurrencia acotada, y lo deja en la
+cache de reportes para que las rutas lo sirvan sin generar. De paso borra
+los PDFs huérfanos que hayan dejado procesos caídos.
+
+El avance se guarda en datos/prerenderizado.json; si el proceso se
+interrumpe, la próxima ejecución continúa desde la última cédula terminada.
+
+    python prerenderizado.py                  # detectar período y pre-renderizar
+    python prerenderizado.py --forzar         # repetir el período actual desde cero
+    python prerenderizado.py --estado         # mostrar el avance guardado
+"""
+import argparse
+import fcntl
+import json
+import os
+import signal
+import sys
+import time
+
+import mysql.connector
+
+import lotes_reportes
+from conexion_db import conexion
+from reportes import cache_reportes, limpiar_archivos_huerfanos
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Configuración del pre-renderizado
+ESTADO_PATH = os.environ.get("LUCIA_PRERENDER_ESTADO", os.path.join(BASE_DIR, "datos", "prerenderizado.json"))
+PRERENDER_CONCURRENCIA = int(os.environ.get("LUCIA_PRERENDER_CONCURRENCIA", "2"))
+PRERENDER_NICE = int(os.environ.get("LUCIA_PRERENDER_NICE", "10"))
+INTERVALO_PROGRESO = 10
+MAX_ERRORES_GUARDADOS = 100
+TAMANO_ESTIMADO_PDF = 130 * 1024
+
+EN_CURSO = "en_curso"
+TERMINADO = "terminado"
+
+
+def leer_estado():
+    try:
+        with open(ESTADO_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def guardar_estado(estado):
+    os.makedirs(os.path.dirname(ESTADO_PATH), exist_ok=True)
+    temporal = f"{ESTADO_PATH}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, ESTADO_PATH)
+
+
+def ultimo_periodo():
+    """Último período cargado en sueldo_inicial como (año, mes), o None si la tabla está vacía."""
+    with conexion() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(AA_PLAN * 100 + MM_PLAN) FROM sueldo_inicial")
+        valor = cursor.fetchone()[0]
+        cursor.close()
+    if not valor:
+        return None
+    return int(valor) // 100, int(valor) % 100
+
+
+def cedulas_del_periodo(anio, mes, desde=0):
+    """Cédulas con datos en el período, en orden, a partir de `desde` (exclusivo)."""
+    with conexion() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT cedula_id
+            FROM sueldo_inicial
+            WHERE AA_PLAN = %s AND MM_PLAN = %s AND cedula_id > %s
+            ORDER BY cedula_id
+        """, (anio, mes, desde))
+        cedulas = [fila[0] for fila in cursor.fetchall()]
+        cursor.close()
+    return cedulas
+
+
+def prerenderizar(forzar=False):
+    anio, mes = ultimo_periodo() or (None, None)
+    if anio is None:
+        print("sueldo_inicial no tiene datos; nada que pre-renderizar.")
+        return
+    periodo = f"{anio}-{mes:02d}"
+
+    estado = leer_estado()
+    if forzar or estado is None or estado.get("periodo") != periodo:
+        estado = {
+            "periodo": periodo,
+            "estado": EN_CURSO,
+            "total": None,
+            "procesadas": 0,
+            "errores": 0,
+            "ultima_cedula": 0,
+            "ultimos_errores": [],
+            "inicio": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "fin": None,
+            "segundos": 0.0,
+        }
+    elif estado["estado"] == TERMINADO:
+        print(f"El período {periodo} ya está pre-renderizado ({estado['procesadas']} cédulas).")
+        return
+    else:
+        print(f"Continuando el período {periodo} desde la cédula {estado['ultima_cedula']} "
+              f"({estado['procesadas']}/{estado['total']}).")
+
+    cedulas = cedulas_del_periodo(anio, mes, estado["ultima_cedula"])
+    if estado["total"] is None:
+        estado["total"] = len(cedulas)
+    guardar_estado(estado)
+
+    necesario = estado["total"] * TAMANO_ESTIMADO_PDF
+    if necesario > cache_reportes.max_bytes:
+        print(f"⚠️ {estado['total']} extractos ocupan ~{necesario // 2**20} MB y la cache admite "
+              f"{cache_reportes.max_bytes // 2**20} MB (LUCIA_CACHE_MAX_MB): se desalojarán los más viejos.")
+
+    print(f"Pre-renderizando {len(cedulas)} cédulas del período {periodo} "
+          f"con concurrencia {lotes_reportes.LOTE_CONCURRENCIA}...", flush=True)
+    inicio = time.monotonic()
+    segundos_previos = estado["segundos"]
+    ultimo_aviso = inicio
+    procesadas_al_inicio = estado["procesadas"]
+
+    try:
+        for cedula, _, error in lotes_reportes.generar_lote(cedulas, ordenado=True):
+            estado["procesadas"] += 1
+            estado["ultima_cedula"] = cedula
+            if error:
+                estado["errores"] += 1
+                estado["ultimos_errores"] = (estado["ultimos_errores"] + [f"{cedula}: {error}"])[-MAX_ERRORES_GUARDADOS:]
+
+            ahora = time.monotonic()
+            if ahora - ultimo_aviso >= INTERVALO_PROGRESO:
+                ultimo_aviso = ahora
+                estado["segundos"] = round(segundos_previos + ahora - inicio, 1)
+                guardar_estado(estado)
+                _mostrar_progreso(estado, estado["procesadas"] - procesadas_al_inicio, ahora - inicio)
+    finally:
+        # Si se interrumpe (Ctrl+C o systemctl stop) se guarda el avance para continuar
+        estado["segundos"] = round(segundos_previos + time.monotonic() - inicio, 1)
+        guardar_estado(estado)
+
+    estado["estado"] = TERMINADO
+    estado["fin"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    guardar_estado(estado)
+    print(f"✅ Período {periodo}: {estado['procesadas']} extractos en {estado['segundos']} s "
+          f"({estado['errores']} errores).")
+
+
+def _mostrar_progreso(estado, hechas, segundos):
+    velocidad = hechas / segundos if segundos else 0.0
+    restantes = estado["total"] - estado["procesadas"]
+    eta = f"{restantes / velocidad:.0f} s" if velocidad else "?"
+    print(f"{estado['procesadas']}/{estado['total']} ({estado['errores']} errores) "
+          f"{velocidad:.1f} extractos/s, faltan ~{eta}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-renderiza los extractos del último período cargado.")
+    parser.add_argument("--forzar", action="store_true", help="Vuelve a pre-renderizar el período actual desde cero")
+    parser.add_argument("--estado", action="store_true", help="Muestra el avance guardado y termina")
+    parser.add_argument("--concurrencia", type=int, default=PRERENDER_CONCURRENCIA)
+    args = parser.parse_args()
+
+    if args.estado:
+        print(json.dumps(leer_estado(), indent=2, ensure_ascii=False))
+        return
+
+    # Una sola ejecución a la vez (el timer puede dispararse mientras otra sigue)
+    os.makedirs(os.path.dirname(ESTADO_PATH), exist_ok=True)
+    bloqueo = open(f"{ESTADO_PATH}.lock", "w")
+    try:
+        fcntl.flock(bloqueo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print("Ya hay un pre-renderizado en curso.")
+        return
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(143))
+
+    # Prioridad baja; los procesos Java heredan el nice
+    os.nice(PRERENDER_NICE)
+    lotes_reportes.LOTE_CONCURRENCIA = args.concurrencia
+    lotes_reportes.LOTE_MAX_PENDIENTES = 2 * args.concurrencia
+
+    borrados = limpiar_archivos_huerfanos()
+    if borrados:
+        print(f"🧹 {borrados} archivos huérfanos de reportes eliminados.")
+
+    try:
+        prerenderizar(args.forzar)
+    except mysql.connector.Error as err:
+        print(f"❌ Error de base de datos: {err}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
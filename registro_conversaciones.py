@@ -0,0 +1,183 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturoTimeoutError
+
+from conexion_db import POOL_TIMEOUT, conexion
+
+
+# Configuración del registro de conversaciones
+REGISTRO_MAX_LOTE = int(os.environ.get("LUCIA_REGISTRO_MAX_LOTE", "1000"))
+# Group commit para POST /api/conversaciones/registro (desactivado por defecto)
+REGISTRO_AGRUPADO = os.environ.get("LUCIA_REGISTRO_AGRUPADO", "0") == "1"
+REGISTRO_VENTANA_MS = float(os.environ.get("LUCIA_REGISTRO_VENTANA_MS", "5"))
+REGISTRO_MAX_AGRUPADOS = int(os.environ.get("LUCIA_REGISTRO_MAX_AGRUPADOS", "200"))
+TIMEOUT_REGISTRO = POOL_TIMEOUT + 30
+
+CAMPOS_REGISTRO = ("celular", "pregunta", "respuesta")
+
+
+class RegistroError(Exception):
+    pass
+
+
+def validar_registro(data):
+    """Devuelve el mensaje de error de un registro inválido, o None si es válido."""
+    if not isinstance(data, dict):
+        return "Cada registro debe ser un objeto JSON"
+    for campo in CAMPOS_REGISTRO:
+        if campo not in data:
+            return f"El campo '{campo}' es obligatorio"
+    return None
+
+
+# None hasta la primera inserción del proceso; ver _ids_consecutivos
+_consecutivos = None
+
+
+def _ids_consecutivos(cursor):
+    """
+    Si un INSERT de varias filas recibe ids consecutivos a partir de lastrowid.
+
+    InnoDB lo garantiza con innodb_autoinc_lock_mode 0 o 1 y
+    auto_increment_increment = 1. MySQL 8 usa por defecto el modo 2
+    (interleaved), donde un INSERT concurrente de varias filas puede
+    intercalar sus ids con los nuestros. Se consulta una vez por proceso.
+    """
+    global _consecutivos
+    if _consecutivos is None:
+        cursor.execute("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")
+        modo, incremento = cursor.fetchone()
+        _consecutivos = int(modo) in (0, 1) and int(incremento) == 1
+        if not _consecutivos:
+            print(f"⚠️ innodb_autoinc_lock_mode={modo}, auto_increment_increment={incremento}: "
+                  "los registros en lote se insertan fila por fila (un solo commit). "
+                  "Para el INSERT de varias filas configure innodb_autoinc_lock_mode=1.")
+    return _consecutivos
+
+
+def insertar_conversaciones(registros):
+    """
+    Inserta varias conversaciones con un solo commit y devuelve sus ids en orden.
+
+    `registros` es una lista de tuplas (celular, pregunta, respuesta). Con
+    innodb_autoinc_lock_mode 0 o 1 (y auto_increment_increment = 1) se usa un
+    INSERT de varias filas: InnoDB le asigna ids consecutivos y lastrowid es
+    el del primero. Con el modo 2, el predeterminado de MySQL 8, esos ids
+    pueden intercalarse con los de otro INSERT concurrente, así que se
+    inserta fila por fila dentro de la misma transacción y se toma el
+    lastrowid de cada una.
+    """
+    if not registros:
+        return []
+
+    with conexion() as conn:
+        cursor = conn.cursor()
+        if len(registros) == 1 or not _ids_consecutivos(cursor):
+            ids = []
+            for registro in registros:
+                cursor.execute(
+                    "INSERT INTO historial_chat (celular, pregunta, respuesta) VALUES (%s, %s, %s)",
+                    registro,
+                )
+                ids.append(cursor.lastrowid)
+            conn.commit()
+            cursor.close()
+            return ids
+
+        marcadores = ", ".join(["(%s, %s, %s)"] * len(registros))
+        valores = [valor for registro in registros for valor in registro]
+        cursor.execute(
+            f"INSERT INTO historial_chat (celular, pregunta, respuesta) VALUES {marcadores}",
+            valores,
+        )
+        conn.commit()
+        primer_id = cursor.lastrowid
+        cursor.close()
+    return list(range(primer_id, primer_id + len(registros)))
+
+
+class RegistroAgrupado:
+    """
+    Group commit para el registro individual de conversaciones.
+
+    Cada petición deja su fila en una cola y espera. Un hilo del worker junta
+    las filas que llegan durante `ventana_ms` (o hasta `max_agrupados`), las
+    inserta con un solo INSERT y un solo commit, y recién entonces responde a
+    cada petición con su id; la garantía de durabilidad es la misma que con un
+    commit por fila. Si el lote falla se reintenta fila por fila, para que un
+    registro inválido no haga fallar a los demás.
+    """
+
+    def __init__(self, ventana_ms=REGISTRO_VENTANA_MS, max_agrupados=REGISTRO_MAX_AGRUPADOS):
+        self.ventana = ventana_ms / 1000
+        self.max_agrupados = max_agrupados
+        self.lotes = 0
+        self.filas = 0
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _iniciar(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._cola = queue.Queue()
+            threading.Thread(target=self._bucle, name="registro-agrupado", daemon=True).start()
+            self._pid = os.getpid()
+
+    def registrar(self, celular, pregunta, respuesta):
+        """Encola la conversación y devuelve su id una vez confirmada en la base."""
+        self._iniciar()
+        futuro = Future()
+        self._cola.put(((celular, pregunta, respuesta), futuro))
+        try:
+            return futuro.result(timeout=TIMEOUT_REGISTRO)
+        except FuturoTimeoutError as e:
+            raise RegistroError("Tiempo de espera agotado al registrar la conversación.") from e
+
+    def _bucle(self):
+        while True:
+            pendientes = [self._cola.get()]
+            time.sleep(self.ventana)
+            while len(pendientes) < self.max_agrupados:
+                try:
+                    pendientes.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            self._escribir(pendientes)
+
+    def _escribir(self, pendientes):
+        try:
+            ids = insertar_conversaciones([registro for registro, _ in pendientes])
+        except Exception as e:
+            if len(pendientes) == 1:
+                pendientes[0][1].set_exception(e)
+                return
+            for pendiente in pendientes:
+                self._escribir([pendiente])
+            return
+
+        self.lotes += 1
+        self.filas += len(pendientes)
+        for (_, futuro), registro_id in zip(pendientes, ids):
+            futuro.set_result(registro_id)
+
+    def estadisticas(self):
+        return {
+            "lotes": self.lotes,
+            "filas": self.filas,
+            "filas_por_lote": round(self.filas / self.lotes, 2) if self.lotes else 0.0,
+        }
+
+
+registro_agrupado = RegistroAgrupado()
+
+
+def guardar_conversacion(celular, pregunta, respuesta):
+    """Registra una conversación y devuelve su id (con group commit si LUCIA_REGISTRO_AGRUPADO=1)."""
+    if REGISTRO_AGRUPADO:
+        return registro_agrupado.registrar(celular, pregunta, respuesta)
+    return insertar_conversaciones([(celular, pregunta, respuesta)])[0]
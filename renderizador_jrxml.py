@@ -0,0 +1,562 @@
+import os
+import re
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from decimal import Decimal
+from functools import lru_cache
+
+import fitz
+import mysql.connector
+
+from conexion_db import conexion
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORTS_DIR = os.path.join(BASE_DIR, "jasper", "reports")
+JRXML_ESTRACTO = os.path.join(REPORTS_DIR, "estracto_sueldo.jrxml")
+
+# Separador de miles para patrones "#,##0"; Jasper usa el locale por defecto de la JVM
+SEPARADOR_MILES = os.environ.get("LUCIA_SEPARADOR_MILES", ",")
+
+# Fuentes de extensión de Jasper que se incrustan; el resto se exporta como Helvetica
+FUENTES_TTF = {
+    ("DejaVu Sans", False): "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    ("DejaVu Sans", True): "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+}
+
+NS = "{http://jasperreports.sourceforge.net/jasperreports}"
+BANDAS = ("title", "pageHeader", "columnHeader", "detail", "columnFooter",
+          "pageFooter", "lastPageFooter", "summary")
+
+
+class RenderizadorError(Exception):
+    pass
+
+
+# --- Evaluación de expresiones Java ---
+
+class _Cadena(str):
+    """String con la semántica de concatenación de Java ("a" + 1 + null)."""
+
+    def __add__(self, otro):
+        return _Cadena(str.__str__(self) + _a_texto(otro))
+
+    def __radd__(self, otro):
+        return _Cadena(_a_texto(otro) + str.__str__(self))
+
+    def toUpperCase(self):
+        return _Cadena(self.upper())
+
+    def toLowerCase(self):
+        return _Cadena(self.lower())
+
+    def trim(self):
+        return _Cadena(self.strip())
+
+    def toString(self):
+        return self
+
+    def length(self):
+        return len(self)
+
+
+class _Entero(int):
+    def intValue(self):
+        return int(self)
+
+    def longValue(self):
+        return int(self)
+
+    def toString(self):
+        return _Cadena(str(int(self)))
+
+
+def _a_texto(valor):
+    if valor is None:
+        return "null"
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    if isinstance(valor, int):
+        return str(int(valor))
+    return str(valor)
+
+
+def _valor_java(valor):
+    if isinstance(valor, str):
+        return _Cadena(valor)
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return _Entero(valor)
+    return valor
+
+
+_RE_LITERAL = re.compile(r'"(?:\\.|[^"\\])*"')
+_RE_REFERENCIA = re.compile(r'\$([FPV])\{(\w+)\}')
+_RE_ARREGLO = re.compile(r'new\s+[\w.]+\s*\[\s*\]\s*\{')
+
+
+def _traducir_expresion(expresion):
+    """Traduce el subconjunto de Java usado en los jrxml a una expresión Python."""
+    partes = []
+    posicion = 0
+    for literal in _RE_LITERAL.finditer(expresion):
+        partes.append(_traducir_codigo(expresion[posicion:literal.start()]))
+        partes.append(f"_Cadena({literal.group(0)})")
+        posicion = literal.end()
+    partes.append(_traducir_codigo(expresion[posicion:]))
+    return "".join(partes).strip()
+
+
+def _traducir_codigo(codigo):
+    codigo = _RE_REFERENCIA.sub(lambda m: f'{m.group(1)}["{m.group(2)}"]', codigo)
+    codigo = _RE_ARREGLO.sub("[", codigo).replace("}", "]")
+    codigo = re.sub(r"\bnull\b", "None", codigo)
+    codigo = re.sub(r"\btrue\b", "True", codigo)
+    codigo = re.sub(r"\bfalse\b", "False", codigo)
+    return codigo.replace("\n", " ")
+
+
+def _compilar_expresion(expresion):
+    codigo = _traducir_expresion(expresion)
+    try:
+        return compile(codigo, "<jrxml>", "eval")
+    except SyntaxError as e:
+        raise RenderizadorError(f"Expresión no soportada: {expresion.strip()!r}") from e
+
+
+def _evaluar(compilada, F, P, V):
+    entorno = {"__builtins__": {}, "_Cadena": _Cadena, "F": F, "P": P, "V": V}
+    try:
+        return eval(compilada, entorno)
+    except Exception as e:
+        raise RenderizadorError(f"Error al evaluar expresión: {e}") from e
+
+
+def _formatear(valor, patron):
+    if valor is None:
+        return None
+    if patron and isinstance(valor, (int, float, Decimal)):
+        decimales = len(patron.split(".", 1)[1]) if "." in patron else 0
+        texto = f"{valor:,.{decimales}f}" if "," in patron else f"{valor:.{decimales}f}"
+        if SEPARADOR_MILES != ",":
+            texto = texto.replace(",", "\0").replace(".", ",").replace("\0", SEPARADOR_MILES)
+        return texto
+    return _a_texto(valor)
+
+
+def _color(hexa, defecto=(0, 0, 0)):
+    if not hexa:
+        return defecto
+    hexa = hexa.lstrip("#")
+    return tuple(int(hexa[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+# --- Plantilla ---
+
+class Elemento:
+    def __init__(self, nodo):
+        self.tipo = nodo.tag.replace(NS, "")
+        re_ = nodo.find(f"{NS}reportElement")
+        self.x = int(re_.get("x", 0))
+        self.y = int(re_.get("y", 0))
+        self.ancho = int(re_.get("width", 0))
+        self.alto = int(re_.get("height", 0))
+        self.color = _color(re_.get("forecolor"))
+        self.fondo = _color(re_.get("backcolor"), (1, 1, 1))
+        self.patron = nodo.get("pattern")
+        self.en_blanco_si_nulo = nodo.get("isBlankWhenNull") == "true"
+        self.al_final = nodo.get("evaluationTime") == "Report"
+        self.texto = None
+        self.expresion = None
+
+        texto = nodo.find(f"{NS}textElement")
+        fuente = texto.find(f"{NS}font") if texto is not None else None
+        self.alineacion_h = texto.get("textAlignment", "Left") if texto is not None else "Left"
+        self.alineacion_v = texto.get("verticalAlignment", "Top") if texto is not None else "Top"
+        self.fuente = fuente.get("fontName", "SansSerif") if fuente is not None else "SansSerif"
+        self.tamano = float(fuente.get("size", 10)) if fuente is not None else 10.0
+        self.negrita = fuente is not None and fuente.get("isBold") == "true"
+
+        if self.tipo == "staticText":
+            self.texto = nodo.findtext(f"{NS}text", "")
+        elif self.tipo == "textField":
+            self.expresion = _compilar_expresion(nodo.findtext(f"{NS}textFieldExpression", ""))
+        elif self.tipo == "image":
+            self.expresion = _compilar_expresion(nodo.findtext(f"{NS}imageExpression", ""))
+            self.alineacion_h = nodo.get("hAlign", "Left")
+            self.alineacion_v = nodo.get("vAlign", "Top")
+            self.mantener_proporcion = nodo.get("scaleImage", "RetainShape") != "FillFrame"
+
+
+class PlantillaJrxml:
+    """Diseño de un jrxml: página, consulta, parámetros y bandas con sus elementos."""
+
+    SOPORTADOS = ("staticText", "textField", "image", "rectangle", "line")
+
+    def __init__(self, ruta):
+        raiz = ET.parse(ruta).getroot()
+        self.ruta = ruta
+        self.ancho = int(raiz.get("pageWidth", 595))
+        self.alto = int(raiz.get("pageHeight", 842))
+        self.margen_izq = int(raiz.get("leftMargin", 20))
+        self.margen_sup = int(raiz.get("topMargin", 30))
+        self.margen_inf = int(raiz.get("bottomMargin", 30))
+        self.consulta = (raiz.findtext(f"{NS}queryString") or "").strip()
+        self.campos = [c.get("name") for c in raiz.findall(f"{NS}field")]
+        self.parametros = {}
+        for p in raiz.findall(f"{NS}parameter"):
+            defecto = p.findtext(f"{NS}defaultValueExpression")
+            self.parametros[p.get("name")] = _compilar_expresion(defecto) if defecto else None
+
+        self.bandas = {}
+        for nombre in BANDAS:
+            nodo = raiz.find(f"{NS}{nombre}/{NS}band")
+            if nodo is None:
+                continue
+            elementos = []
+            for hijo in nodo:
+                tipo = hijo.tag.replace(NS, "")
+                if tipo not in self.SOPORTADOS:
+                    raise RenderizadorError(f"Elemento '{tipo}' no soportado en la banda {nombre}")
+                elementos.append(Elemento(hijo))
+            self.bandas[nombre] = (int(nodo.get("height", 0)), elementos)
+
+    def alto_banda(self, nombre):
+        return self.bandas.get(nombre, (0, []))[0]
+
+    def consulta_sql(self, parametros):
+        """Convierte $P{x} de la consulta en marcadores %s con sus valores."""
+        valores = []
+
+        def reemplazar(m):
+            valores.append(parametros.get(m.group(2)))
+            return "%s"
+
+        return _RE_REFERENCIA.sub(reemplazar, self.consulta), tuple(valores)
+
+
+# --- Renderizado ---
+
+class _Documento:
+    def __init__(self, plantilla, P):
+        self.plantilla = plantilla
+        self.P = P
+        self.V = {"PAGE_NUMBER": 0, "REPORT_COUNT": 0}
+        self.doc = fitz.open()
+        self.pagina = None
+        self.escritores = {}
+        self.diferidos = []
+        self.imagenes = {}
+
+    def nueva_pagina(self):
+        self.cerrar_pagina()
+        self.V["PAGE_NUMBER"] += 1
+        self.pagina = self.doc.new_page(width=self.plantilla.ancho, height=self.plantilla.alto)
+        return self.plantilla.margen_sup
+
+    def cerrar_pagina(self):
+        if self.pagina is None:
+            return
+        for color, escritor in self.escritores.items():
+            escritor.write_text(self.pagina, color=color)
+        self.escritores = {}
+
+    def dibujar_banda(self, nombre, y, F):
+        alto, elementos = self.plantilla.bandas.get(nombre, (0, []))
+        for elemento in elementos:
+            if elemento.al_final:
+                self.diferidos.append((self.pagina.number, elemento, y, F))
+            else:
+                self.dibujar(self.pagina, elemento, y, F, self.V)
+        return y + alto
+
+    def dibujar_diferidos(self):
+        self.cerrar_pagina()
+        for numero, elemento, y, F in self.diferidos:
+            self.pagina = self.doc[numero]
+            self.dibujar(self.pagina, elemento, y, F, self.V)
+            self.cerrar_pagina()
+
+    def dibujar(self, pagina, elemento, y, F, V):
+        x0 = self.plantilla.margen_izq + elemento.x
+        y0 = y + elemento.y
+        rect = fitz.Rect(x0, y0, x0 + elemento.ancho, y0 + elemento.alto)
+
+        if elemento.tipo == "rectangle":
+            pagina.draw_rect(rect, color=elemento.color, fill=elemento.fondo, width=1)
+        elif elemento.tipo == "line":
+            pagina.draw_line(rect.tl, rect.br, color=elemento.color, width=1)
+        elif elemento.tipo == "image":
+            self._dibujar_imagen(pagina, elemento, rect, _evaluar(elemento.expresion, F, self.P, V))
+        elif elemento.tipo == "staticText":
+            self._dibujar_texto(elemento, rect, elemento.texto)
+        else:
+            valor = _evaluar(elemento.expresion, F, self.P, V)
+            if valor is None:
+                # Como Jasper: sin isBlankWhenNull="true" un nulo se imprime "null"
+                texto = "" if elemento.en_blanco_si_nulo else "null"
+            else:
+                texto = _formatear(valor, elemento.patron)
+            self._dibujar_texto(elemento, rect, texto or "")
+
+    def _dibujar_texto(self, elemento, rect, texto):
+        if not texto:
+            return
+        fuente = _fuente(elemento.fuente, elemento.negrita)
+        tamano = elemento.tamano
+        alto_linea = tamano * (fuente.ascender - fuente.descender)
+        lineas = _ajustar_lineas(texto, elemento.fuente, elemento.negrita, tamano, rect.width)
+        lineas = lineas[:max(1, int(rect.height // alto_linea))]
+
+        alto_total = alto_linea * len(lineas)
+        if elemento.alineacion_v == "Middle":
+            top = rect.y0 + (rect.height - alto_total) / 2
+        elif elemento.alineacion_v == "Bottom":
+            top = rect.y1 - alto_total
+        else:
+            top = rect.y0
+
+        escritor = self.escritores.get(elemento.color)
+        if escritor is None:
+            escritor = self.escritores[elemento.color] = fitz.TextWriter(self.pagina.rect)
+        for i, linea in enumerate(lineas):
+            ancho = _ancho_texto(elemento.fuente, elemento.negrita, linea, tamano)
+            if elemento.alineacion_h == "Center":
+                x = rect.x0 + (rect.width - ancho) / 2
+            elif elemento.alineacion_h == "Right":
+                x = rect.x1 - ancho
+            else:
+                x = rect.x0
+            base = top + i * alto_linea + fuente.ascender * tamano
+            escritor.append((x, base), linea, font=fuente, fontsize=tamano)
+
+    def _dibujar_imagen(self, pagina, elemento, rect, ruta):
+        ruta = str(ruta)
+        if ruta not in self.imagenes:
+            if not os.path.exists(ruta):
+                raise RenderizadorError(f"No existe la imagen {ruta}")
+            self.imagenes[ruta] = [0, _dimensiones_imagen(ruta)]
+        xref, (ancho, alto) = self.imagenes[ruta]
+
+        if elemento.mantener_proporcion and ancho and alto:
+            escala = min(rect.width / ancho, rect.height / alto)
+            w, h = ancho * escala, alto * escala
+            x = {"Center": rect.x0 + (rect.width - w) / 2, "Right": rect.x1 - w}.get(elemento.alineacion_h, rect.x0)
+            y = {"Middle": rect.y0 + (rect.height - h) / 2, "Bottom": rect.y1 - h}.get(elemento.alineacion_v, rect.y0)
+            rect = fitz.Rect(x, y, x + w, y + h)
+
+        if xref:
+            pagina.insert_image(rect, xref=xref, keep_proportion=False)
+        else:
+            self.imagenes[ruta][0] = pagina.insert_image(rect, filename=ruta, keep_proportion=False)
+
+
+_fuentes = {}
+_dimensiones = {}
+_lock_recursos = threading.Lock()
+
+
+def _fuente(nombre, negrita):
+    clave = (nombre, negrita)
+    if clave not in _fuentes:
+        with _lock_recursos:
+            archivo = FUENTES_TTF.get(clave)
+            if archivo and os.path.exists(archivo):
+                _fuentes[clave] = fitz.Font(fontfile=archivo)
+            else:
+                _fuentes[clave] = fitz.Font("hebo" if negrita else "helv")
+    return _fuentes[clave]
+
+
+@lru_cache(maxsize=65536)
+def _ancho_texto(nombre, negrita, texto, tamano):
+    return _fuente(nombre, negrita).text_length(texto, fontsize=tamano)
+
+
+def _dimensiones_imagen(ruta):
+    if ruta not in _dimensiones:
+        pixmap = fitz.Pixmap(ruta)
+        _dimensiones[ruta] = (pixmap.width, pixmap.height)
+    return _dimensiones[ruta]
+
+
+def _ajustar_lineas(texto, nombre, negrita, tamano, ancho):
+    """Corta el texto en líneas que entran en el ancho, respetando saltos de línea."""
+    lineas = []
+    for parrafo in texto.split("\n"):
+        actual = ""
+        for palabra in parrafo.split(" "):
+            candidata = f"{actual} {palabra}" if actual else palabra
+            if actual and _ancho_texto(nombre, negrita, candidata, tamano) > ancho:
+                lineas.append(actual)
+                actual = palabra
+            else:
+                actual = candidata
+        lineas.append(actual)
+    return lineas
+
+
+def renderizar(plantilla, filas, parametros=None):
+    """
+    Llena la plantilla con las filas y devuelve el PDF en bytes.
+
+    Sigue el orden de bandas de JasperReports: title en la primera página,
+    pageHeader y columnHeader en cada página, detail por fila, pageFooter al
+    pie de cada página, summary y lastPageFooter en la última.
+    """
+    P = {nombre: None for nombre in plantilla.parametros}
+    for nombre, defecto in plantilla.parametros.items():
+        if defecto is not None:
+            P[nombre] = _evaluar(defecto, {}, P, {})
+    P.update(parametros or {})
+
+    if not filas:
+        # Jasper (whenNoDataType=NoPages) no genera páginas; se deja el caso al motor Java
+        raise RenderizadorError("La consulta no devolvió filas")
+
+    documento = _Documento(plantilla, P)
+    filas = [{k: _valor_java(v) for k, v in fila.items()} for fila in filas]
+    F = filas[0]
+
+    pie = plantilla.alto_banda("pageFooter")
+    limite = plantilla.alto - plantilla.margen_inf - pie
+
+    def iniciar_pagina(F):
+        y = documento.nueva_pagina()
+        if documento.V["PAGE_NUMBER"] == 1:
+            y = documento.dibujar_banda("title", y, F)
+        y = documento.dibujar_banda("pageHeader", y, F)
+        return documento.dibujar_banda("columnHeader", y, F)
+
+    def cerrar_con_pie(nombre, F):
+        documento.dibujar_banda(nombre, plantilla.alto - plantilla.margen_inf - plantilla.alto_banda(nombre), F)
+
+    y = iniciar_pagina(F)
+    for F in filas:
+        documento.V["REPORT_COUNT"] += 1
+        if y + plantilla.alto_banda("detail") > limite:
+            cerrar_con_pie("pageFooter", F)
+            y = iniciar_pagina(F)
+        y = documento.dibujar_banda("detail", y, F)
+
+    y = documento.dibujar_banda("columnFooter", y, F)
+    ultimo_pie = "lastPageFooter" if "lastPageFooter" in plantilla.bandas else "pageFooter"
+    fin = plantilla.alto - plantilla.margen_inf - plantilla.alto_banda(ultimo_pie)
+    if y + plantilla.alto_banda("summary") > fin:
+        cerrar_con_pie("pageFooter", F)
+        y = iniciar_pagina(F)
+    documento.dibujar_banda("summary", y, F)
+    cerrar_con_pie(ultimo_pie, F)
+
+    documento.dibujar_diferidos()
+    # Incrustar solo los glifos usados: el PDF pasa de ~500 KB a ~100 KB y se escribe más rápido
+    documento.doc.subset_fonts()
+    datos = documento.doc.tobytes(garbage=1, deflate=True)
+    documento.doc.close()
+    return datos
+
+
+# --- Reporte de extracto de sueldo ---
+
+_plantillas = {}
+
+
+def cargar_plantilla(ruta=JRXML_ESTRACTO):
+    """Devuelve la plantilla parseada, recargándola si el jrxml cambió en disco."""
+    modificado = os.path.getmtime(ruta)
+    cacheada = _plantillas.get(ruta)
+    if cacheada is None or cacheada[0] != modificado:
+        with _lock_recursos:
+            cacheada = _plantillas[ruta] = (modificado, PlantillaJrxml(ruta))
+    return cacheada[1]
+
+
+def obtener_filas(plantilla, parametros):
+    """Ejecuta la consulta del jrxml con los parámetros dados."""
+    sql, valores = plantilla.consulta_sql(parametros)
+    try:
+        with conexion() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql, valores)
+            filas = cursor.fetchall()
+            cursor.close()
+    except mysql.connector.Error as error:
+        raise RenderizadorError(f"Error de base de datos: {error}") from error
+    return filas
+
+
+def renderizar_estracto(cedula, filas=None):
+    """Genera el extracto de sueldo de la cédula sin pasar por la JVM (con las filas dadas o consultándolas)."""
+    plantilla = cargar_plantilla()
+    parametros = {"par_cedula": int(cedula), "report_path": REPORTS_DIR}
+    if filas is None:
+        filas = obtener_filas(plantilla, parametros)
+    return renderizar(plantilla, filas, parametros)
+
+
+# --- Comparación con JasperReports ---
+
+def comparar_pdfs(pdf_java, pdf_nativo, tolerancia=2.0):
+    """
+    Compara dos PDFs (bytes) palabra por palabra: mismo texto en cada página y
+    posición dentro de `tolerancia` puntos. Devuelve la lista de diferencias.
+    """
+    with fitz.open(stream=pdf_java, filetype="pdf") as java, fitz.open(stream=pdf_nativo, filetype="pdf") as nativo:
+        diferencias = []
+        if java.page_count != nativo.page_count:
+            diferencias.append(f"páginas: java={java.page_count} nativo={nativo.page_count}")
+        for numero, (pj, pn) in enumerate(zip(java, nativo), start=1):
+            palabras_nativo = [(w[4], w[0], w[1]) for w in pn.get_text("words")]
+            for x0, y0, _, _, palabra, *_ in pj.get_text("words"):
+                cercanas = [p for p in palabras_nativo
+                            if p[0] == palabra and abs(p[1] - x0) <= tolerancia and abs(p[2] - y0) <= tolerancia]
+                if cercanas:
+                    palabras_nativo.remove(cercanas[0])
+                else:
+                    diferencias.append(f"página {numero}: falta {palabra!r} en ({x0:.1f}, {y0:.1f})")
+            for palabra, x0, y0 in palabras_nativo:
+                diferencias.append(f"página {numero}: sobra {palabra!r} en ({x0:.1f}, {y0:.1f})")
+        return diferencias
+
+
+def comparar_con_jasper(cedula, tolerancia=2.0):
+    """
+    Genera el extracto con Java y con el renderizador nativo y compara las
+    palabras de cada página y su posición. Devuelve la lista de diferencias.
+    """
+    from generar_pdf import _generar_con_subprocess
+
+    ruta_java = _generar_con_subprocess(cedula)
+    try:
+        with open(ruta_java, "rb") as f:
+            pdf_java = f.read()
+    finally:
+        os.remove(ruta_java)
+    return comparar_pdfs(pdf_java, renderizar_estracto(cedula), tolerancia)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python renderizador_jrxml.py <cedula> [--comparar] [--repeticiones N]", file=sys.stderr)
+        sys.exit(2)
+
+    cedula = int(sys.argv[1])
+    if "--comparar" in sys.argv:
+        diferencias = comparar_con_jasper(cedula)
+        for diferencia in diferencias:
+            print(diferencia)
+        print("✅ Salida idéntica a Jasper" if not diferencias else f"❌ {len(diferencias)} diferencias")
+        sys.exit(1 if diferencias else 0)
+
+    repeticiones = int(sys.argv[sys.argv.index("--repeticiones") + 1]) if "--repeticiones" in sys.argv else 1
+    plantilla = cargar_plantilla()
+    parametros = {"par_cedula": cedula, "report_path": REPORTS_DIR}
+    filas = obtener_filas(plantilla, parametros)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        pdf = renderizar(plantilla, filas, parametros)
+    duracion = time.perf_counter() - inicio
+    with open(f"estracto_sueldo_{cedula}.pdf", "wb") as f:
+        f.write(pdf)
+    print(f"{repeticiones} reportes en {duracion:.3f} s ({repeticiones / duracion:.1f} reportes/s)")
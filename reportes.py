@@ -0,0 +1,208 @@
+import os
+import re
+
+import fitz
+
+from admision import control_admision
+from cache_reportes import CacheReportes
+from datos_reporte import DatosReporteError, filas_por_cedula, version_de_filas
+from generacion_unica import generacion_unica
+from generar_pdf import (HUERFANOS_EDAD_MINIMA, ReportGenerationError, generar_pdf_bytes,
+                         limpiar_reportes_huerfanos)
+from metricas import etapa, registrar_error_reporte
+from servicio_firma import FirmaError, firmar_bytes
+
+
+cache_reportes = CacheReportes()
+
+# Máximo de meses de un extracto por rango (?desde=AAAA-MM&hasta=AAAA-MM)
+REPORTE_MAX_PERIODOS = int(os.environ.get("LUCIA_REPORTE_MAX_PERIODOS", "24"))
+_PERIODO = re.compile(r"(\d{4})-(\d{2})")
+
+
+class PeriodoSinDatosError(Exception):
+    pass
+
+
+def interpretar_rango(desde, hasta):
+    """
+    Convierte "AAAA-MM" a AAAAMM y valida el rango; si falta un extremo se usa el otro.
+
+    Lanza ValueError con un mensaje para el cliente si el rango no es válido.
+    """
+    periodos = []
+    for texto in (desde or hasta, hasta or desde):
+        coincidencia = _PERIODO.fullmatch(texto or "")
+        if not coincidencia or not 1 <= int(coincidencia.group(2)) <= 12:
+            raise ValueError("Los períodos deben tener el formato AAAA-MM")
+        periodos.append(int(coincidencia.group(1)) * 100 + int(coincidencia.group(2)))
+    inicio, fin = periodos
+    meses = (fin // 100 - inicio // 100) * 12 + fin % 100 - inicio % 100 + 1
+    if meses < 1:
+        raise ValueError("'desde' no puede ser posterior a 'hasta'")
+    if meses > REPORTE_MAX_PERIODOS:
+        raise ValueError(f"El rango no puede superar {REPORTE_MAX_PERIODOS} meses")
+    return inicio, fin
+
+
+def obtener_filas(cedula):
+    """Filas del extracto de la cédula, con la conexión compartida del pool."""
+    try:
+        with etapa("db_filas"):
+            return filas_por_cedula(cedula)
+    except DatosReporteError as error:
+        registrar_error_reporte("db")
+        raise ReportGenerationError(f"No se pudieron obtener los datos del reporte: {error}") from error
+
+
+def obtener_reporte(cedula, firmado=False, filas=None, en_lote=False):
+    """
+    Devuelve la ruta del PDF de la cédula, desde la cache o generándolo.
+
+    Las filas de sueldo_inicial se leen una sola vez (o llegan ya leídas en
+    `filas`, p. ej. desde la consulta por celular o un lote); con ellas se
+    calcula la versión de la cache y se llena el reporte, sin que Java abra
+    su propia conexión.
+
+    Con firmado=True se firma el PDF sin firmar (también cacheado) y se
+    guarda como una variante de la misma versión de datos. Las peticiones
+    concurrentes por la misma cédula y versión comparten una sola generación.
+
+    La generación pasa por el control de admisión: con el worker saturado
+    lanza SobrecargaError (503), salvo en lotes y trabajos (en_lote=True),
+    que esperan su turno.
+    """
+    if filas is None:
+        filas = obtener_filas(cedula)
+    version = version_de_filas(filas)
+    if firmado:
+        return _obtener_firmado(cedula, version, lambda: _obtener_sin_firmar(cedula, version, filas, en_lote))
+    return _obtener_sin_firmar(cedula, version, filas, en_lote)
+
+
+def periodos_del_rango(cedula, filas, desde, hasta):
+    """
+    Filas de los períodos desde..hasta (AAAAMM, según AA_PLAN/MM_PLAN), sin generar nada.
+
+    Devuelve (clave, version, por_periodo): la clave y la versión del
+    documento del rango en la cache y las filas agrupadas por período.
+    """
+    por_periodo = {}
+    for fila in filas:
+        if fila["AA_PLAN"] is None or fila["MM_PLAN"] is None:
+            continue
+        periodo = int(fila["AA_PLAN"]) * 100 + int(fila["MM_PLAN"])
+        if desde <= periodo <= hasta:
+            por_periodo.setdefault(periodo, []).append(fila)
+    if not por_periodo:
+        raise PeriodoSinDatosError(f"La cédula {cedula} no tiene datos entre {desde} y {hasta}")
+
+    clave = f"{cedula}-{desde}-{hasta}"
+    version = version_de_filas([fila for periodo in sorted(por_periodo) for fila in por_periodo[periodo]])
+    return clave, version, por_periodo
+
+
+def obtener_reporte_periodos(cedula, desde, hasta, firmado=False, filas=None):
+    """
+    Extracto de los períodos desde..hasta (AAAAMM, según AA_PLAN/MM_PLAN) en un solo PDF.
+
+    Cada período se genera con sus propias filas y se guarda en la cache
+    como una parte (clave "<cedula>-<AAAAMM>"); el documento del rango se
+    arma uniendo las partes con PyMuPDF y también queda en la cache. Al
+    cargarse un mes nuevo solo se genera esa parte y se vuelven a unir.
+    """
+    if filas is None:
+        filas = obtener_filas(cedula)
+    clave, version, por_periodo = periodos_del_rango(cedula, filas, desde, hasta)
+
+    def sin_firmar():
+        with etapa("cache"):
+            ruta = cache_reportes.obtener(clave, version)
+        if ruta:
+            return ruta
+        partes = [_obtener_parte(cedula, periodo, por_periodo[periodo]) for periodo in sorted(por_periodo)]
+        return generacion_unica.ejecutar(f"{clave}_{version}", lambda: _unir_y_guardar(clave, version, partes))
+
+    if firmado:
+        return _obtener_firmado(clave, version, sin_firmar)
+    return sin_firmar()
+
+
+def _obtener_parte(cedula, periodo, filas):
+    clave = f"{cedula}-{periodo}"
+    return _obtener_sin_firmar(cedula, version_de_filas(filas), filas, False, clave)
+
+
+def _obtener_firmado(clave, version, obtener_sin_firmar):
+    with etapa("cache"):
+        ruta = cache_reportes.obtener(clave, version, "firmado")
+    if ruta:
+        return ruta
+    ruta_sin_firmar = obtener_sin_firmar()
+    return generacion_unica.ejecutar(
+        f"{clave}_{version}_firmado", lambda: _firmar_y_guardar(clave, version, ruta_sin_firmar)
+    )
+
+
+def _obtener_sin_firmar(cedula, version, filas, en_lote, clave=None):
+    # `clave` identifica el PDF en la cache cuando no es el extracto completo (una parte por período)
+    clave = clave or cedula
+    with etapa("cache"):
+        ruta = cache_reportes.obtener(clave, version)
+    if ruta:
+        return ruta
+    return generacion_unica.ejecutar(
+        f"{clave}_{version}", lambda: _generar_y_guardar(cedula, version, filas, en_lote, clave)
+    )
+
+
+def _generar_y_guardar(cedula, version, filas, en_lote, clave):
+    # Otro worker pudo haberlo generado mientras se esperaba el bloqueo
+    ruta = cache_reportes.obtener(clave, version)
+    if ruta:
+        return ruta
+
+    with control_admision.turno(sin_limite=en_lote):
+        pdf = generar_pdf_bytes(cedula, filas, solo_filas=clave != cedula)
+    with etapa("cache_guardar"):
+        return cache_reportes.guardar_bytes(clave, version, pdf)
+
+
+def _unir_y_guardar(clave, version, partes):
+    ruta = cache_reportes.obtener(clave, version)
+    if ruta:
+        return ruta
+
+    with etapa("unir"):
+        documento = fitz.open()
+        try:
+            for parte in partes:
+                with fitz.open(parte) as pdf:
+                    documento.insert_pdf(pdf)
+            pdf = documento.tobytes(garbage=3, deflate=True)
+        finally:
+            documento.close()
+    with etapa("cache_guardar"):
+        return cache_reportes.guardar_bytes(clave, version, pdf)
+
+
+def _firmar_y_guardar(clave, version, ruta_sin_firmar):
+    ruta = cache_reportes.obtener(clave, version, "firmado")
+    if ruta:
+        return ruta
+
+    with open(ruta_sin_firmar, "rb") as f:
+        pdf_data = f.read()
+    try:
+        with etapa("firma"):
+            pdf_firmado = firmar_bytes(pdf_data)
+    except FirmaError as e:
+        registrar_error_reporte("firma")
+        raise ReportGenerationError(str(e)) from e
+    with etapa("cache_guardar"):
+        return cache_reportes.guardar_bytes(clave, version, pdf_firmado, "firmado")
+
+
+def limpiar_archivos_huerfanos(edad_minima=HUERFANOS_EDAD_MINIMA):
+    """PDFs de Java y temporales de la cache abandonados por procesos caídos; devuelve cuántos borró."""
+    return limpiar_reportes_huerfanos(edad_minima) + cache_reportes.limpiar_temporales(edad_minima)
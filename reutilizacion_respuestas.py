@@ -0,0 +1,242 @@
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import mysql.connector
+
+from conexion_db import conectar, conexion
+
+
+# Configuración de la reutilización de respuestas
+REUTILIZACION_UMBRAL = float(os.environ.get("LUCIA_REUTILIZACION_UMBRAL", "0.85"))
+REUTILIZACION_MAX_PREGUNTAS = int(os.environ.get("LUCIA_REUTILIZACION_MAX_PREGUNTAS", "20000"))
+REUTILIZACION_REFRESCO = int(os.environ.get("LUCIA_REUTILIZACION_REFRESCO", "60"))
+MIN_LONGITUD = 8
+TAMANO_LOTE = 5000
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9ñ]+")
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes ni signos, con los espacios colapsados ("¿Cuándo cobramos?" → "cuando cobramos")."""
+    texto = texto.lower().replace("ñ", "\0")
+    texto = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(" ", texto.replace("\0", "ñ")).strip()
+
+
+def trigramas(normalizada):
+    """Trigramas de caracteres del texto normalizado, con un espacio de borde."""
+    texto = f" {normalizada} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class _Entrada:
+    __slots__ = ("pregunta", "respuesta", "normalizada", "trigramas")
+
+    def __init__(self, pregunta, respuesta, normalizada, trigramas):
+        self.pregunta = pregunta
+        self.respuesta = respuesta
+        self.normalizada = normalizada
+        self.trigramas = trigramas
+
+
+class IndiceRespuestas:
+    """
+    Índice en memoria de preguntas ya respondidas en historial_chat.
+
+    - Las preguntas se normalizan (minúsculas, sin tildes ni signos) y se
+      indexan por trigramas de caracteres en un índice invertido; la
+      similitud es el coeficiente de Dice entre los trigramas.
+    - Una búsqueda solo recorre las listas de los trigramas menos frecuentes
+      de la pregunta (filtro por prefijo): un candidato que no comparte
+      ninguno de ellos no puede llegar al umbral.
+    - Para cada pregunta normalizada se guarda la respuesta más reciente, y
+      se conservan las últimas `max_preguntas` preguntas distintas.
+    - Se carga en el proceso maestro (precargar) o en un hilo al iniciar cada
+      worker; después se suman las conversaciones que registra el worker
+      (agregar) y, cada `refresco` segundos, las que registraron los demás
+      (id mayor al último leído).
+    """
+
+    def __init__(self, max_preguntas=REUTILIZACION_MAX_PREGUNTAS, refresco=REUTILIZACION_REFRESCO):
+        self.max_preguntas = max_preguntas
+        self.refresco = refresco
+        self.busquedas = 0
+        self.aciertos = 0
+        self._entradas = OrderedDict()
+        self._por_texto = {}
+        self._listas = {}
+        self._siguiente = 0
+        self._ultimo_id = 0
+        self._cargado = False
+        self._lock = threading.Lock()
+        self._lock_inicio = threading.Lock()
+        self._pid = None
+
+    def iniciar(self):
+        """Arranca la carga y el refresco periódico en este proceso (una vez por PID)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock_inicio:
+            if self._pid == os.getpid():
+                return
+            # El lock del índice pudo haber quedado tomado por el hilo del proceso padre al hacer fork
+            self._lock = threading.Lock()
+            threading.Thread(target=self._bucle, name="reutilizacion-respuestas", daemon=True).start()
+            self._pid = os.getpid()
+
+    def precargar(self):
+        """
+        Carga inicial sincrónica, sin hilos ni pool, para el proceso maestro de
+        gunicorn (when_ready); los workers la heredan y solo leen lo nuevo.
+        """
+        conn = conectar()
+        try:
+            self._cargar_con(conn)
+        finally:
+            conn.close()
+
+    def buscar(self, pregunta, umbral=REUTILIZACION_UMBRAL):
+        """
+        Respuesta previa a una pregunta parecida, como {pregunta, respuesta, similitud}.
+
+        Devuelve None si ninguna pregunta indexada alcanza el umbral.
+        """
+        self.iniciar()
+        self.busquedas += 1
+        normalizada = normalizar(pregunta)
+        if len(normalizada) < MIN_LONGITUD:
+            return None
+
+        with self._lock:
+            numero = self._por_texto.get(normalizada)
+            if numero is not None:
+                mejor, similitud = self._entradas[numero], 1.0
+            else:
+                mejor, similitud = self._buscar_parecida(trigramas(normalizada), umbral)
+        if mejor is None:
+            return None
+        self.aciertos += 1
+        return {"pregunta": mejor.pregunta, "respuesta": mejor.respuesta, "similitud": round(similitud, 4)}
+
+    def _buscar_parecida(self, consulta, umbral):
+        # Dice = 2·c / (|q| + |e|) >= umbral exige c >= umbral·|q| / (2 - umbral) trigramas en común
+        minimo = max(1, math.ceil(umbral * len(consulta) / (2 - umbral)))
+        listas = sorted((self._listas[t] for t in consulta if t in self._listas), key=len)
+        if len(listas) < minimo:
+            return None, 0.0
+
+        candidatos = set()
+        for lista in listas[:len(listas) - minimo + 1]:
+            candidatos.update(lista)
+
+        # Y el tamaño del candidato debe estar entre |q|·u/(2-u) y |q|·(2-u)/u
+        menor, mayor = len(consulta) * umbral / (2 - umbral), len(consulta) * (2 - umbral) / umbral
+        mejor, similitud = None, 0.0
+        for numero in candidatos:
+            entrada = self._entradas[numero]
+            if not menor <= len(entrada.trigramas) <= mayor:
+                continue
+            comunes = len(consulta & entrada.trigramas)
+            valor = 2 * comunes / (len(consulta) + len(entrada.trigramas))
+            if valor >= umbral and valor > similitud:
+                mejor, similitud = entrada, valor
+        return mejor, similitud
+
+    def agregar(self, pregunta, respuesta):
+        """Indexa una conversación recién registrada (reemplaza la respuesta si la pregunta ya estaba)."""
+        self.iniciar()
+        with self._lock:
+            self._agregar(pregunta, respuesta)
+
+    def _agregar(self, pregunta, respuesta):
+        if not isinstance(pregunta, str) or not isinstance(respuesta, str) or not respuesta:
+            return
+        normalizada = normalizar(pregunta)
+        if len(normalizada) < MIN_LONGITUD:
+            return
+
+        numero = self._por_texto.get(normalizada)
+        if numero is not None:
+            entrada = self._entradas[numero]
+            entrada.pregunta, entrada.respuesta = pregunta, respuesta
+            self._entradas.move_to_end(numero)
+            return
+
+        numero = self._siguiente
+        self._siguiente += 1
+        entrada = _Entrada(pregunta, respuesta, normalizada, frozenset(trigramas(normalizada)))
+        self._entradas[numero] = entrada
+        self._por_texto[normalizada] = numero
+        for trigrama in entrada.trigramas:
+            self._listas.setdefault(trigrama, set()).add(numero)
+
+        while len(self._entradas) > self.max_preguntas:
+            viejo, entrada = self._entradas.popitem(last=False)
+            del self._por_texto[entrada.normalizada]
+            for trigrama in entrada.trigramas:
+                lista = self._listas[trigrama]
+                lista.discard(viejo)
+                if not lista:
+                    del self._listas[trigrama]
+
+    def estadisticas(self):
+        return {
+            "cargado": self._cargado,
+            "preguntas": len(self._entradas),
+            "trigramas": len(self._listas),
+            "ultimo_id": self._ultimo_id,
+            "busquedas": self.busquedas,
+            "aciertos": self.aciertos,
+            "tasa_aciertos": round(self.aciertos / self.busquedas, 4) if self.busquedas else 0.0,
+        }
+
+    def _cargar(self):
+        """Primera vez: las últimas `max_preguntas` conversaciones; después, solo las nuevas."""
+        with conexion() as conn:
+            self._cargar_con(conn)
+
+    def _cargar_con(self, conn):
+        cursor = conn.cursor()
+        if not self._cargado:
+            cursor.execute("""
+                SELECT id, pregunta, respuesta
+                FROM historial_chat
+                ORDER BY id DESC
+                LIMIT %s
+            """, (self.max_preguntas,))
+            filas = cursor.fetchall()[::-1]
+        else:
+            cursor.execute("""
+                SELECT id, pregunta, respuesta
+                FROM historial_chat
+                WHERE id > %s
+                ORDER BY id
+            """, (self._ultimo_id,))
+            filas = cursor.fetchall()
+        cursor.close()
+
+        for inicio in range(0, len(filas), TAMANO_LOTE):
+            with self._lock:
+                for registro_id, pregunta, respuesta in filas[inicio:inicio + TAMANO_LOTE]:
+                    self._agregar(pregunta, respuesta)
+        if filas:
+            self._ultimo_id = max(self._ultimo_id, filas[-1][0])
+        self._cargado = True
+
+    def _bucle(self):
+        evento = threading.Event()
+        while True:
+            try:
+                self._cargar()
+            except mysql.connector.Error as error:
+                print(f"Error al cargar el índice de respuestas: {error}")
+            except Exception as error:
+                print(f"Error inesperado en el índice de respuestas: {error}")
+            evento.wait(self.refresco)
+
+
+indice_respuestas = IndiceRespuestas()
@@ -0,0 +1,97 @@
+import io
+import os
+import threading
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.padding import PKCS1v15
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
+from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign import signers
+from pyhanko.sign.general import get_pyca_cryptography_hash
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Configuración del certificado de firma
+P12_PATH = os.environ.get("LUCIA_FIRMA_P12", os.path.join(BASE_DIR, "3437941.p12"))
+P12_PASSWORD = os.environ.get("LUCIA_FIRMA_PASSWORD", "Galant1998").encode("utf-8")
+CAMPO_FIRMA = os.environ.get("LUCIA_FIRMA_CAMPO", "Firma1")
+
+
+class FirmaError(Exception):
+    pass
+
+
+class _FirmanteConClave(signers.SimpleSigner):
+    """
+    SimpleSigner que deserializa la clave privada una sola vez.
+
+    SimpleSigner.sign_raw vuelve a cargar la clave DER en cada firma, lo que
+    cuesta más que la firma RSA en sí.
+    """
+
+    def __init__(self, base):
+        super().__init__(
+            signing_cert=base.signing_cert,
+            signing_key=base.signing_key,
+            cert_registry=base.cert_registry,
+        )
+        self._clave = serialization.load_der_private_key(self.signing_key.dump(), password=None)
+
+    def sign_raw(self, data, digest_algorithm):
+        mecanismo = self.get_signature_mechanism_for_digest(digest_algorithm).signature_algo
+        if mecanismo == 'rsassa_pkcs1v15' and isinstance(self._clave, RSAPrivateKey):
+            return self._clave.sign(data, PKCS1v15(), get_pyca_cryptography_hash(digest_algorithm))
+        return super().sign_raw(data, digest_algorithm)
+
+
+_firmador = None
+_bytes_reservados = None
+_lock = threading.Lock()
+
+
+def obtener_firmador():
+    """
+    Devuelve el PdfSigner del proceso.
+
+    El .p12 se lee y se descifra una sola vez; la clave y la cadena de
+    certificados quedan en memoria y se reutilizan en cada firma.
+    """
+    global _firmador
+    if _firmador is None:
+        with _lock:
+            if _firmador is None:
+                try:
+                    signer = signers.SimpleSigner.load_pkcs12(pfx_file=P12_PATH, passphrase=P12_PASSWORD)
+                except (OSError, ValueError) as e:
+                    raise FirmaError(f"No se pudo cargar el certificado {P12_PATH}: {e}") from e
+                if signer is None:
+                    raise FirmaError(f"No se pudo cargar el certificado {P12_PATH}")
+                _firmador = signers.PdfSigner(
+                    signers.PdfSignatureMetadata(field_name=CAMPO_FIRMA),
+                    signer=_FirmanteConClave(signer),
+                )
+    return _firmador
+
+
+def firmar_bytes(pdf_data):
+    """Firma un PDF en memoria con una revisión incremental y devuelve los bytes firmados."""
+    global _bytes_reservados
+    firmador = obtener_firmador()
+    try:
+        writer = IncrementalPdfFileWriter(io.BytesIO(pdf_data))
+        # La primera firma deja que pyHanko estime el tamaño del CMS (firmando
+        # un documento de prueba); las siguientes reutilizan ese tamaño.
+        salida = firmador.sign_pdf(writer, output=io.BytesIO(), bytes_reserved=_bytes_reservados)
+        if _bytes_reservados is None:
+            rango = PdfFileReader(salida).embedded_signatures[-1].byte_range
+            _bytes_reservados = rango[2] - rango[1] - 2
+    except Exception as e:
+        raise FirmaError(f"No se pudo firmar el PDF: {e}") from e
+    return salida.getvalue()
+
+
+def firmar_lote(documentos):
+    """Firma una lista de PDFs (bytes) con el mismo firmador; devuelve la lista firmada."""
+    return [firmar_bytes(pdf_data) for pdf_data in documentos]
@@ -0,0 +1,204 @@
+import os
+import queue
+import selectors
+import subprocess
+import threading
+import time
+
+
+# Configuración del pool de servidores Java
+TAMANO_POOL = int(os.environ.get("LUCIA_SERVIDORES_JAVA", "2"))
+MAX_PETICIONES_POR_PROCESO = int(os.environ.get("LUCIA_SERVIDOR_MAX_PETICIONES", "500"))
+TIMEOUT_ARRANQUE = 60
+TIMEOUT_ESPERA_PROCESO = 60
+# Segundos sin intentar lanzar otra JVM después de un arranque fallido
+ESPERA_REINTENTO = int(os.environ.get("LUCIA_SERVIDOR_ESPERA_REINTENTO", "300"))
+
+
+class ServidorReportesError(Exception):
+    pass
+
+
+class ServidorNoDisponibleError(ServidorReportesError):
+    """El proceso Java no pudo iniciarse (java ausente, error de compilación, BD caída...)."""
+    pass
+
+
+class ProcesoReportes:
+    """Un proceso Java ServidorReportes con la plantilla compilada y la conexión abierta."""
+
+    def __init__(self, comando, cwd):
+        self.peticiones = 0
+        self._buffer = b""
+        try:
+            self.proceso = subprocess.Popen(
+                comando,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=cwd,
+            )
+        except OSError as e:
+            raise ServidorNoDisponibleError(f"No se pudo ejecutar Java: {e}") from e
+        try:
+            self._leer_linea(time.monotonic() + TIMEOUT_ARRANQUE, esperado=b"LISTO")
+        except ServidorReportesError as e:
+            raise ServidorNoDisponibleError(str(e)) from e
+
+    def vivo(self):
+        return self.proceso.poll() is None
+
+    def generar(self, cedula, timeout, csv=None):
+        """
+        Pide el reporte de una cédula y devuelve el PDF en bytes, leído directo del pipe.
+
+        Con `csv` (bytes) el reporte se llena con esos datos y Java no consulta MySQL.
+        """
+        self.peticiones += 1
+        if csv is None:
+            pedido = f"PDF {int(cedula)}\n".encode("utf-8")
+        else:
+            pedido = f"CSV {int(cedula)} {len(csv)}\n".encode("utf-8") + csv
+        try:
+            self.proceso.stdin.write(pedido)
+            self.proceso.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.terminar()
+            raise ServidorReportesError(f"El servidor Java no acepta peticiones: {e}") from e
+
+        limite = time.monotonic() + timeout
+        linea = self._leer_linea(limite)
+        if linea.startswith("PDF "):
+            try:
+                tamano = int(linea[4:])
+            except ValueError:
+                tamano = -1
+            if tamano > 0:
+                return self._leer_bytes(tamano, limite)
+        if linea.startswith("ERROR "):
+            raise ServidorReportesError(linea[6:])
+        self.terminar()
+        raise ServidorReportesError(f"Respuesta inesperada del servidor Java: {linea!r}")
+
+    def terminar(self):
+        if self.vivo():
+            self.proceso.kill()
+        try:
+            self.proceso.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        for flujo in (self.proceso.stdin, self.proceso.stdout):
+            try:
+                flujo.close()
+            except OSError:
+                pass
+
+    def _leer_linea(self, limite, esperado=None):
+        """Lee una línea de stdout respetando el tiempo límite; mata el proceso si se vence."""
+        self._leer_hasta(lambda: b"\n" in self._buffer, limite)
+        linea, self._buffer = self._buffer.split(b"\n", 1)
+        linea = linea.decode("utf-8").strip()
+        if esperado is not None and linea != esperado.decode("utf-8"):
+            self.terminar()
+            raise ServidorReportesError(f"El servidor Java no se inició correctamente: {linea!r}")
+        return linea
+
+    def _leer_bytes(self, tamano, limite):
+        self._leer_hasta(lambda: len(self._buffer) >= tamano, limite)
+        datos, self._buffer = self._buffer[:tamano], self._buffer[tamano:]
+        return datos
+
+    def _leer_hasta(self, completo, limite):
+        fd = self.proceso.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while not completo():
+                restante = limite - time.monotonic()
+                if restante <= 0 or not selector.select(restante):
+                    self.terminar()
+                    raise ServidorReportesError("Tiempo de espera agotado en el servidor Java.")
+                datos = os.read(fd, 262144)
+                if not datos:
+                    self.terminar()
+                    raise ServidorReportesError("El servidor Java terminó inesperadamente.")
+                self._buffer += datos
+
+
+class PoolServidoresReportes:
+    """
+    Pool de procesos Java de larga duración.
+
+    Los procesos se crean de forma perezosa y por PID, para que cada worker de
+    gunicorn tenga los suyos aunque la aplicación se haya cargado antes del fork.
+    Un proceso que falla, se cuelga o alcanza el máximo de peticiones se descarta
+    y se reemplaza en la siguiente petición.
+
+    Si un proceso no arranca (classpath roto, sin JDK), durante ESPERA_REINTENTO
+    segundos no se lanzan otros: se responde ServidorNoDisponibleError enseguida,
+    en lugar de esperar TIMEOUT_ARRANQUE en cada petición.
+    """
+
+    def __init__(self, comando, cwd, tamano=TAMANO_POOL):
+        self.comando = comando
+        self.cwd = cwd
+        self.tamano = tamano
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _inicializar(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._libres = queue.LifoQueue()
+            self._permisos = threading.BoundedSemaphore(self.tamano)
+            self._suspendido_hasta = 0.0
+            self._pid = os.getpid()
+
+    def generar(self, cedula, timeout, csv=None):
+        self._inicializar()
+        if not self._permisos.acquire(timeout=TIMEOUT_ESPERA_PROCESO):
+            raise ServidorReportesError("No hay servidores Java libres.")
+        try:
+            proceso = self._obtener_proceso()
+            try:
+                return proceso.generar(cedula, timeout, csv)
+            finally:
+                self._devolver_proceso(proceso)
+        finally:
+            self._permisos.release()
+
+    def cerrar(self):
+        if self._pid != os.getpid():
+            return
+        while True:
+            try:
+                self._libres.get_nowait().terminar()
+            except queue.Empty:
+                break
+
+    def _obtener_proceso(self):
+        while True:
+            try:
+                proceso = self._libres.get_nowait()
+            except queue.Empty:
+                return self._lanzar_proceso()
+            if proceso.vivo():
+                return proceso
+            proceso.terminar()
+
+    def _lanzar_proceso(self):
+        restante = self._suspendido_hasta - time.monotonic()
+        if restante > 0:
+            raise ServidorNoDisponibleError(f"Arranque fallido reciente; se reintenta en {restante:.0f} s.")
+        try:
+            return ProcesoReportes(self.comando, self.cwd)
+        except ServidorNoDisponibleError:
+            self._suspendido_hasta = time.monotonic() + ESPERA_REINTENTO
+            raise
+
+    def _devolver_proceso(self, proceso):
+        if proceso.vivo() and proceso.peticiones < MAX_PETICIONES_POR_PROCESO:
+            self._libres.put(proceso)
+        else:
+            proceso.terminar()
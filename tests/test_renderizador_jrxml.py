@@ -0,0 +1,71 @@
+"""
+El renderizador nativo contra JasperReports con las mismas filas.
+
+La comparación con Java necesita un JDK (`java` en el PATH) y jasper/lib;
+si no están, esa prueba se omite. Las filas llegan a ServidorReportes como
+CSV (pedido "CSV"), así que no hace falta MySQL.
+"""
+import os
+import shutil
+
+import fitz
+import pytest
+
+from datos_reporte import COLUMNAS, filas_a_csv
+from generar_pdf import JAR_PATH, JAVA_WORKING_DIR, LIB_PATH, SERVIDOR_FUENTE
+from renderizador_jrxml import comparar_pdfs, renderizar_estracto
+from servidor_reportes import ProcesoReportes, ServidorNoDisponibleError
+
+CEDULA = 1234567
+
+
+def _fila(numero, **valores):
+    # Montos menores a 1000: el separador de miles depende del locale de la JVM
+    fila = {columna: 0 for columna in COLUMNAS}
+    fila.update(
+        id=numero, cedula_id=CEDULA, CNIVEL=1, CINSTI=2, CDPTO=3, AA_PLAN=2025, MM_PLAN=numero,
+        DIGITO_ID="1", APEL_NOMB="PEREZ GOMEZ JUAN", CATEGO_PSP="L33", CANT_RUBRO=1, TURNO="M",
+        TIPO_RUBRO="A", CCARGO=10, PRESUP_ACT=850, DEVENG_ACT=840, DCTO_JUB=135, CAPOR_IPS=75,
+        STATUS_CRG=1, CCORRES=1, id_presup="111", visible=1, aa_pago=2025, mm_pago=numero,
+        capor_bnt=0, linea=numero, orden=numero, dto_3506=0,
+    )
+    fila.update(valores)
+    return fila
+
+
+FILAS = [_fila(numero) for numero in (1, 2, 3)]
+
+
+def _palabras(pdf):
+    with fitz.open(stream=pdf, filetype="pdf") as documento:
+        return [palabra[4] for pagina in documento for palabra in pagina.get_text("words")]
+
+
+def test_nulo_sin_is_blank_when_null_se_imprime_null():
+    # CATEGO_PSP no tiene isBlankWhenNull: Jasper imprime "null"
+    pdf = renderizar_estracto(CEDULA, [_fila(1, CATEGO_PSP=None)])
+    assert "null" in _palabras(pdf)
+
+
+def test_nulo_con_is_blank_when_null_queda_en_blanco():
+    # PRESUP_ACT tiene isBlankWhenNull="true"
+    con_valor = _palabras(renderizar_estracto(CEDULA, [_fila(1, PRESUP_ACT=777)]))
+    sin_valor = _palabras(renderizar_estracto(CEDULA, [_fila(1, PRESUP_ACT=None)]))
+    assert "777" in con_valor
+    assert "777" not in sin_valor and "null" not in sin_valor
+
+
+@pytest.mark.skipif(shutil.which("java") is None, reason="Java no está instalado")
+@pytest.mark.skipif(not os.path.isdir(os.path.dirname(LIB_PATH)), reason="Falta jasper/lib")
+def test_igual_a_jasper():
+    try:
+        proceso = ProcesoReportes(["java", "-cp", f"{JAR_PATH}:{LIB_PATH}", SERVIDOR_FUENTE], cwd=JAVA_WORKING_DIR)
+    except ServidorNoDisponibleError as e:
+        pytest.skip(f"ServidorReportes no arrancó: {e}")
+    try:
+        pdf_java = proceso.generar(CEDULA, 120, csv=filas_a_csv(FILAS))
+    finally:
+        proceso.terminar()
+
+    diferencias = comparar_pdfs(pdf_java, renderizar_estracto(CEDULA, FILAS), tolerancia=2.0)
+    assert diferencias == []
@@ -0,0 +1,247 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from reportes import obtener_reporte
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Configuración de la cola de trabajos de reportes. La base vive fuera del
+# proyecto (al lado), que se reemplaza en cada despliegue
+TRABAJOS_DB = os.environ.get(
+    "LUCIA_TRABAJOS_DB", os.path.join(os.path.dirname(BASE_DIR), "lucia-trabajos", "trabajos.db")
+)
+TRABAJOS_HILOS = int(os.environ.get("LUCIA_TRABAJOS_HILOS", "2"))
+TRABAJOS_MAX_PENDIENTES = int(os.environ.get("LUCIA_TRABAJOS_MAX_PENDIENTES", "200"))
+TRABAJOS_RETENCION_HORAS = int(os.environ.get("LUCIA_TRABAJOS_RETENCION_HORAS", "24"))
+INTERVALO_SONDEO = 1.0
+INTERVALO_RECUPERACION = 60
+
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+TERMINADO = "terminado"
+ERROR = "error"
+
+
+class ColaLlenaError(Exception):
+    pass
+
+
+def _conectar():
+    conn = sqlite3.connect(TRABAJOS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _crear_tablas():
+    os.makedirs(os.path.dirname(TRABAJOS_DB), exist_ok=True)
+    conn = _conectar()
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id TEXT PRIMARY KEY,
+                cedula INTEGER NOT NULL,
+                estado TEXT NOT NULL,
+                ruta TEXT,
+                error TEXT,
+                pid INTEGER,
+                creado REAL NOT NULL,
+                actualizado REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, creado)")
+    finally:
+        conn.close()
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ColaTrabajos:
+    """
+    Cola persistente de trabajos de reporte sobre SQLite.
+
+    Cada worker de gunicorn arranca sus propios hilos en post_fork (iniciar),
+    así los trabajos pendientes de antes de un reinicio se procesan sin
+    esperar a que alguien use la API. Los hilos toman trabajos pendientes de
+    forma atómica (BEGIN IMMEDIATE), así que varios procesos pueden compartir
+    la misma base. Los trabajos que quedaron en_proceso de un proceso que ya
+    no existe (reinicio o caída), o de este mismo proceso sin un hilo que los
+    atienda (no se pudo registrar el resultado), vuelven a pendiente: al
+    iniciar y cada INTERVALO_RECUPERACION segundos.
+    """
+
+    def __init__(self, hilos=TRABAJOS_HILOS, max_pendientes=TRABAJOS_MAX_PENDIENTES):
+        self.hilos = hilos
+        self.max_pendientes = max_pendientes
+        self._pid = None
+        self._lock = threading.Lock()
+        self._aviso = threading.Condition()
+
+    def iniciar(self):
+        """Crea las tablas, recupera los huérfanos y arranca los hilos de este proceso."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._en_curso = set()
+            _crear_tablas()
+            self._recuperar_huerfanos()
+            self._proxima_recuperacion = time.monotonic() + INTERVALO_RECUPERACION
+            for numero in range(self.hilos):
+                threading.Thread(target=self._bucle, name=f"trabajos-{numero}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def encolar(self, cedula):
+        """Crea un trabajo pendiente y devuelve su id."""
+        self.iniciar()
+        ahora = time.time()
+        trabajo_id = uuid.uuid4().hex
+        conn = _conectar()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            pendientes = conn.execute(
+                "SELECT COUNT(*) FROM trabajos WHERE estado IN (?, ?)", (PENDIENTE, EN_PROCESO)
+            ).fetchone()[0]
+            if pendientes >= self.max_pendientes:
+                conn.execute("ROLLBACK")
+                raise ColaLlenaError(f"La cola de reportes está llena ({pendientes} trabajos)")
+            conn.execute(
+                "INSERT INTO trabajos (id, cedula, estado, creado, actualizado) VALUES (?, ?, ?, ?, ?)",
+                (trabajo_id, int(cedula), PENDIENTE, ahora, ahora),
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+        with self._aviso:
+            self._aviso.notify()
+        return trabajo_id
+
+    def obtener(self, trabajo_id):
+        """Devuelve el trabajo como diccionario, o None si no existe."""
+        self.iniciar()
+        conn = _conectar()
+        try:
+            fila = conn.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        finally:
+            conn.close()
+        if fila is None:
+            return None
+        trabajo = dict(fila)
+        if trabajo["estado"] == PENDIENTE:
+            trabajo["posicion"] = self._posicion(trabajo["creado"])
+        return trabajo
+
+    def _posicion(self, creado):
+        conn = _conectar()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM trabajos WHERE estado = ? AND creado < ?", (PENDIENTE, creado)
+            ).fetchone()[0] + 1
+        finally:
+            conn.close()
+
+    def _recuperar_huerfanos(self):
+        conn = _conectar()
+        try:
+            for fila in conn.execute("SELECT id, pid FROM trabajos WHERE estado = ?", (EN_PROCESO,)).fetchall():
+                propio = fila["pid"] == os.getpid()
+                if (not fila["pid"] or (propio and fila["id"] not in self._en_curso)
+                        or (not propio and not _proceso_vivo(fila["pid"]))):
+                    conn.execute(
+                        "UPDATE trabajos SET estado = ?, pid = NULL, actualizado = ? WHERE id = ? AND estado = ?",
+                        (PENDIENTE, time.time(), fila["id"], EN_PROCESO),
+                    )
+            conn.execute(
+                "DELETE FROM trabajos WHERE estado IN (?, ?) AND actualizado < ?",
+                (TERMINADO, ERROR, time.time() - TRABAJOS_RETENCION_HORAS * 3600),
+            )
+        finally:
+            conn.close()
+
+    def _tomar(self):
+        conn = _conectar()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            fila = conn.execute(
+                "SELECT id, cedula FROM trabajos WHERE estado = ? ORDER BY creado LIMIT 1", (PENDIENTE,)
+            ).fetchone()
+            if fila is None:
+                conn.execute("ROLLBACK")
+                return None
+            # Antes del COMMIT: la recuperación no debe verlo en_proceso sin hilo
+            self._en_curso.add(fila["id"])
+            try:
+                conn.execute(
+                    "UPDATE trabajos SET estado = ?, pid = ?, actualizado = ? WHERE id = ?",
+                    (EN_PROCESO, os.getpid(), time.time(), fila["id"]),
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._en_curso.discard(fila["id"])
+                raise
+            return fila["id"], fila["cedula"]
+        finally:
+            conn.close()
+
+    def _terminar(self, trabajo_id, estado, ruta=None, error=None):
+        conn = _conectar()
+        try:
+            conn.execute(
+                "UPDATE trabajos SET estado = ?, ruta = ?, error = ?, actualizado = ? WHERE id = ?",
+                (estado, ruta, error, time.time(), trabajo_id),
+            )
+        finally:
+            conn.close()
+
+    def _recuperar_si_corresponde(self):
+        # Un solo hilo por worker hace la recuperación en cada intervalo
+        with self._lock:
+            if time.monotonic() < self._proxima_recuperacion:
+                return
+            self._proxima_recuperacion = time.monotonic() + INTERVALO_RECUPERACION
+        self._recuperar_huerfanos()
+
+    def _bucle(self):
+        while True:
+            try:
+                self._recuperar_si_corresponde()
+                trabajo = self._tomar()
+            except sqlite3.Error as e:
+                print(f"Error en la cola de trabajos: {e}")
+                trabajo = None
+
+            if trabajo is None:
+                with self._aviso:
+                    self._aviso.wait(INTERVALO_SONDEO)
+                continue
+
+            trabajo_id, cedula = trabajo
+            try:
+                try:
+                    ruta = obtener_reporte(cedula, en_lote=True)
+                except Exception as e:
+                    self._terminar(trabajo_id, ERROR, error=str(e))
+                else:
+                    self._terminar(trabajo_id, TERMINADO, ruta=ruta)
+            except sqlite3.Error as e:
+                # Queda en_proceso sin hilo: la próxima recuperación lo vuelve a pendiente
+                print(f"Error en la cola de trabajos al terminar {trabajo_id}: {e}")
+            finally:
+                self._en_curso.discard(trabajo_id)
+
+
+cola_trabajos = ColaTrabajos()